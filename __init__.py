@@ -43,7 +43,7 @@ Polygonal shapes, MIDI, MP3/WAVE, Flow Logic
     TickNode, WaveGeneratorNode,
     GraphWaveNode,
     ConversionNode, CalcUnaryOPNode, CalcBinaryOPNode, ValueNode
-    TransformNode, BlendNode, PixelSplitNode, PixelMergeNode, MergeNode, CropNode, ColorTheoryNode,
+    TransformNode, BlendNode, LayerNode, CompositeNode, PixelSplitNode, PixelMergeNode, MergeNode, CropNode, ColorTheoryNode,
     ConstantNode, ShapeNode, TextNode, GLSLNode,
     StreamReaderNode, StreamWriterNode, MIDIMessageNode, MIDIReaderNode, MIDIFilterEZNode, MIDIFilterNode,
     DelayNode, HoldValueNode, ComparisonNode, SelectNode
@@ -57,9 +57,12 @@ import time
 import json
 import shutil
 import inspect
+import threading
 import importlib
 from pathlib import Path
-from typing import Any, Optional, Tuple, Union
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple, Union
 
 try:
     from server import PromptServer
@@ -67,11 +70,13 @@ try:
 except:
     pass
 
+import cv2
 import torch
 import numpy as np
 from loguru import logger
 
 from Jovimetrix.sup.lexicon import Lexicon
+from Jovimetrix.sup.cache import RESULT_CACHE, cache_key
 
 NODE_CLASS_MAPPINGS = {}
 NODE_DISPLAY_NAME_MAPPINGS = {}
@@ -92,6 +97,12 @@ JOV_GLSL = ROOT / 'res' / 'glsl'
 JOV_LOG_LEVEL = os.getenv("JOV_LOG_LEVEL", "WARNING")
 logger.configure(handlers=[{"sink": sys.stdout, "level": JOV_LOG_LEVEL}])
 
+# worker threads for the per-frame batch executor; 1 runs everything inline
+JOV_WORKERS = os.cpu_count() or 1
+try: JOV_WORKERS = int(os.getenv("JOV_WORKERS", JOV_WORKERS))
+except: pass
+JOV_WORKERS = max(1, JOV_WORKERS)
+
 # =============================================================================
 # === TYPE SHORTCUTS ===
 # =============================================================================
@@ -132,6 +143,60 @@ class Singleton(type):
 # === CORE NODES ===
 # =============================================================================
 
+class JOVBatchPool:
+    """Shared bounded thread pool behind JOVBaseNode.batch_map."""
+    _pool: Optional[ThreadPoolExecutor] = None
+    _lock = threading.Lock()
+    _local = threading.local()
+    # callers running work on the pool and the cv2/torch thread counts from
+    # before the first of them came in
+    _users = 0
+    _threads: Optional[tuple[int, int]] = None
+
+    @classmethod
+    def pool(cls) -> ThreadPoolExecutor:
+        with cls._lock:
+            if cls._pool is None:
+                cls._pool = ThreadPoolExecutor(max_workers=JOV_WORKERS,
+                                               thread_name_prefix="jovimetrix")
+            return cls._pool
+
+    @classmethod
+    def worker(cls) -> bool:
+        """True when called from inside a pool task."""
+        return getattr(cls._local, "active", False)
+
+    @classmethod
+    def enter(cls, inner: int) -> None:
+        """Give cv2 and torch inner threads each while a caller runs work on the pool.
+
+        The counts are process wide, so they are saved when the first caller
+        enters and only put back when the last one leaves.
+        """
+        with cls._lock:
+            if cls._users == 0:
+                cls._threads = (cv2.getNumThreads(), torch.get_num_threads())
+            cls._users += 1
+            cv2.setNumThreads(inner)
+            torch.set_num_threads(inner)
+
+    @classmethod
+    def leave(cls) -> None:
+        with cls._lock:
+            cls._users -= 1
+            if cls._users == 0:
+                cv2.setNumThreads(cls._threads[0])
+                torch.set_num_threads(cls._threads[1])
+                cls._threads = None
+
+    @classmethod
+    def call(cls, func: Callable, param: tuple) -> Any:
+        cls._local.active = True
+        try:
+            return func(*param)
+        finally:
+            cls._local.active = False
+
 class JOVBaseNode:
     @classmethod
     def INPUT_TYPES(cls) -> dict:
@@ -140,6 +205,68 @@ class JOVBaseNode:
     RETURN_TYPES = ()
     OUTPUT_NODE = False
     FUNCTION = "run"
+    # fan the per-frame work in batch_map out over the shared thread pool
+    BATCH_THREADED = True
+    # memoize per-frame results in the shared content addressed result cache
+    BATCH_CACHE = False
+
+    def batch_cached(self, params: list[tuple], func: Callable[[list[tuple]], list[Any]]) -> list[Any]:
+        """Per-frame memo around func, which maps a list of params to one result each.
+
+        Each entry keys on the node class plus a content hash of its tensors
+        and the rest of its parameters. func only sees the entries that
+        missed; results come back in input order.
+        """
+        if not self.BATCH_CACHE or RESULT_CACHE.budget == 0:
+            return func(params)
+
+        keys = [(self.__class__.__name__, cache_key(param)) for param in params]
+        result = [RESULT_CACHE.get(key) for key in keys]
+        if len(miss := [idx for idx, r in enumerate(result) if r is None]):
+            fresh = func([params[idx] for idx in miss])
+            for idx, data in zip(miss, fresh):
+                result[idx] = data
+                RESULT_CACHE.put(keys[idx], data)
+        return result
+
+    def batch_map(self, func: Callable, params: list[tuple], pbar: Any=None) -> list[Any]:
+        """Call func(*param) for every entry in params; results keep input order.
+
+        Work runs on the shared pool when the node allows it, there is more
+        than one entry and we are not already inside a pool task. Only the
+        calling thread touches the progress bar. cv2 and torch get the cores
+        left per worker while the pool runs, so the two do not oversubscribe.
+        """
+        workers = min(JOV_WORKERS, len(params))
+        if workers < 2 or not self.BATCH_THREADED or JOVBatchPool.worker():
+            result = []
+            for idx, param in enumerate(params):
+                result.append(func(*param))
+                if pbar is not None:
+                    pbar.update_absolute(idx)
+            return result
+
+        JOVBatchPool.enter(max(1, (os.cpu_count() or 1) // workers))
+        pool = JOVBatchPool.pool()
+        # keep a bounded window in flight so finished frames do not pile up
+        pending = deque()
+        result = []
+        try:
+            for param in params:
+                pending.append(pool.submit(JOVBatchPool.call, func, param))
+                if len(pending) >= workers * 2:
+                    result.append(pending.popleft().result())
+                    if pbar is not None:
+                        pbar.update_absolute(len(result))
+            while len(pending):
+                result.append(pending.popleft().result())
+                if pbar is not None:
+                    pbar.update_absolute(len(result))
+        finally:
+            for future in pending:
+                future.cancel()
+            JOVBatchPool.leave()
+        return result
 
 class JOVImageSimple(JOVBaseNode):
     RETURN_TYPES = ("IMAGE", )
@@ -201,6 +328,15 @@ try:
         # logger.debug(ComfyAPIMessage.MESSAGE[did])
         return web.json_response()
 
+    @PromptServer.instance.routes.get("/jovimetrix/cache")
+    async def jovimetrix_cache(request) -> Any:
+        return web.json_response(RESULT_CACHE.stats())
+
+    @PromptServer.instance.routes.post("/jovimetrix/cache/clear")
+    async def jovimetrix_cache_clear(request) -> Any:
+        RESULT_CACHE.clear()
+        return web.json_response(RESULT_CACHE.stats())
+
     @PromptServer.instance.routes.get("/jovimetrix/config")
     async def jovimetrix_config(request) -> Any:
         global JOV_CONFIG
@@ -7,6 +7,7 @@ from enum import Enum
 
 import cv2
 import torch
+import numpy as np
 from loguru import logger
 
 import comfy
@@ -14,9 +15,13 @@ import comfy
 from Jovimetrix import JOV_HELP_URL, MIN_IMAGE_SIZE, WILDCARD, JOVImageMultiple, JOVImageSimple
 from Jovimetrix.sup.lexicon import Lexicon
 from Jovimetrix.sup.util import zip_longest_fill, parse_tuple, parse_number, EnumTupleType
-from Jovimetrix.sup.image import EnumCBDefiency, EnumCBSimulator, EnumScaleMode, batch_extract, channel_count, \
-    channel_solid, color_match_histogram, color_match_lut, color_match_reinhard, cv2tensor, \
-    cv2tensor_full, image_color_blind, image_histogram, image_histogram_normalize, image_scalefit, tensor2cv, image_equalize, image_levels, pixel_eval, \
+from Jovimetrix.sup.lut import ColorPipeline, lut_apply, lut_load_cube, pipeline_apply
+from Jovimetrix.sup.palette import palette_build
+from Jovimetrix.sup.tile import tile_apply, tile_wanted
+from Jovimetrix.sup.image import IMAGE_BATCH_CHUNK, BatchWriter, EnumCBDefiency, EnumCBSimulator, batch_extract, channel_count, \
+    channel_constant, channel_solid, color_lab, color_lab_cdf, color_lab_stats, color_match_histogram, \
+    color_match_lut, color_match_reinhard, cv2tensor, \
+    image_color_blind, image_histogram, image_histogram_normalize, tensor2cv, image_equalize, image_levels, pixel_eval, \
     image_posterize, image_pixelate, image_quantize, image_sharpen, \
     image_threshold, image_blend, image_invert, morph_edge_detect, \
     morph_emboss, image_contrast, image_hsv, image_gamma, \
@@ -35,12 +40,32 @@ class EnumColorMatchMap(Enum):
     USER_MAP = 0
     PRESET_MAP = 10
 
+def color_match(pA: np.ndarray, pB: np.ndarray, mode: str, cmap: str, colormap: str,
+                num_colors: int, source: np.ndarray=None) -> np.ndarray:
+    """Match one frame; source stands in for its own statistics when smoothing."""
+    source = None if source is None else [source]
+    match EnumColorMatchMode[mode]:
+        case EnumColorMatchMode.LUT:
+            if EnumColorMatchMap[cmap] == EnumColorMatchMap.PRESET_MAP:
+                pB = None
+            colormap = EnumColorMap[colormap]
+            pA = color_match_lut(pA, colormap.value, pB, num_colors)
+        case EnumColorMatchMode.HISTOGRAM:
+            pA = color_match_histogram(pA, pB, source)
+        case EnumColorMatchMode.REINHARD:
+            pA = color_match_reinhard(pA, pB, source)
+    return pA
+
 # =============================================================================
 
 class AdjustNode(JOVImageMultiple):
     NAME = "ADJUST (JOV) 🕸️"
     CATEGORY = JOV_CATEGORY
     DESCRIPTION = "Blur, Sharpen, Emboss, Levels, HSV, Edge detection."
+    # per-pixel operations that process a run of same sized frames as one batch
+    TONE = [EnumAdjustOP.INVERT, EnumAdjustOP.LEVELS, EnumAdjustOP.HSV, EnumAdjustOP.POSTERIZE,
+            EnumAdjustOP.PIXELATE]
+    BATCH_CACHE = True
 
     @classmethod
     def INPUT_TYPES(cls) -> dict:
@@ -64,7 +89,8 @@ class AdjustNode(JOVImageMultiple):
                                         "precision": 4, "round": 0.00001}),
             Lexicon.MATTE: ("VEC4", {"default": (0, 0, 0, 255), "step": 1,
                                         "label": [Lexicon.R, Lexicon.G, Lexicon.B, Lexicon.A], "rgb": True}),
-            Lexicon.INVERT: ("BOOLEAN", {"default": False, "tooltip": "Invert the mask input"})
+            Lexicon.INVERT: ("BOOLEAN", {"default": False, "tooltip": "Invert the mask input"}),
+            Lexicon.SHARED: ("BOOLEAN", {"default": False})
         }}
         return Lexicon._parse(d, JOV_HELP_URL + "/ADJUST#-adjust")
 
@@ -83,17 +109,89 @@ class AdjustNode(JOVImageMultiple):
         gamma = parse_number(Lexicon.GAMMA, kw, EnumTupleType.FLOAT, [1], clip_min=0, clip_max=1)
         matte = parse_tuple(Lexicon.MATTE, kw, default=(0, 0, 0, 255), clip_min=0, clip_max=255)
         invert = kw.get(Lexicon.INVERT, [False])
+        shared = kw.get(Lexicon.SHARED, [False])
         params = [tuple(x) for x in zip_longest_fill(pA, mask, op, radius, amt, lohi,
-                                                     lmh, hsv, contrast, gamma, matte, invert)]
-        images = []
-        pbar = comfy.utils.ProgressBar(len(params))
-        for idx, (pA, mask, o, r, a, lohi, lmh, hsv, con, gamma, matte, invert) in enumerate(params):
+                                                     lmh, hsv, contrast, gamma, matte, invert, shared)]
+        # QUANTIZE frames that share fit one palette per level count over all of
+        # them; the palette stands in for the flag so the frame cache keys on it
+        fit = {}
+        for idx, param in enumerate(params):
+            if param[-1] == True and param[0] is not None and EnumAdjustOP[param[2]] == EnumAdjustOP.QUANTIZE:
+                fit.setdefault(int(param[4]), []).append(idx)
+        for levels, idx in fit.items():
+            palette = palette_build([tensor2cv(params[i][0]) for i in idx], max(2, levels))
+            for i in idx:
+                params[i] = params[i][:-1] + (palette,)
+        writer = BatchWriter(len(params))
+
+        def finish(pA, img_new, mask, matte, invert) -> tuple[torch.Tensor, ...]:
+            if (cc := channel_count(pA)[0]) == 4:
+                alpha = pA[:,:,3]
+            if mask is not None:
+                mask = tensor2cv(mask, chan=EnumImageType.GRAYSCALE)
+            else:
+                mask = channel_constant(MIN_IMAGE_SIZE, MIN_IMAGE_SIZE, chan=EnumImageType.GRAYSCALE)
+            if not invert:
+                mask = 255 - mask
+
+            if (wh := pA.shape[:2]) != mask.shape[:2]:
+                mask = cv2.resize(mask, wh[::-1])
+            pA = image_blend(pA, img_new, mask)
+            if cc == 4:
+                pA[:,:,3] = alpha
+            matte = pixel_eval(matte, EnumImageType.BGRA)
+            return writer.put(pA, matte)
+
+        def tone(run) -> list[tuple[torch.Tensor, ...]]:
+            # the tone operations run once for the whole run of same sized frames
+            frames = [tensor2cv(p[0]) for p in run]
+            stack = np.stack(frames)
+            a = [p[4] for p in run]
+            match EnumAdjustOP[run[0][2]]:
+                case EnumAdjustOP.INVERT:
+                    stack = image_invert(stack, a)
+
+                case EnumAdjustOP.LEVELS:
+                    l, m, h = zip(*[p[6] for p in run])
+                    stack = image_levels(stack, l, h, m, [p[9] for p in run])
+
+                case EnumAdjustOP.HSV:
+                    # one 3D LUT pass for hue, saturation, value and a gamma
+                    # that follows directly; contrast reads the frame mean
+                    pipes = [ColorPipeline().add(image_hsv, *p[7]) for p in run]
+                    if run[0][8] == 0 and run[0][9] != 0:
+                        for pipe, p in zip(pipes, run):
+                            pipe.add(image_gamma, p[9])
+                    stack = pipeline_apply(stack, pipes)
+                    if run[0][8] != 0:
+                        stack = image_contrast(stack, [1 - p[8] for p in run])
+                        if run[0][9] != 0:
+                            stack = image_gamma(stack, [p[9] for p in run])
+
+                case EnumAdjustOP.POSTERIZE:
+                    stack = image_posterize(stack, [int(x) for x in a])
+
+                case EnumAdjustOP.PIXELATE:
+                    stack = image_pixelate(stack, a[0] / 255.)
+
+            return [finish(pA, img_new, mask, matte, invert)
+                    for pA, img_new, (_, mask, *_, matte, invert, _) in zip(frames, stack, run)]
+
+        def process(key, run) -> list[tuple[torch.Tensor, ...]]:
+            if key is not None:
+                return tone(run)
+
+            pA, mask, o, r, a, lohi, lmh, hsv, con, gamma, matte, invert, palette = run[0]
             if pA is not None:
                 pA = tensor2cv(pA)
             else:
                 pA = channel_solid(MIN_IMAGE_SIZE, MIN_IMAGE_SIZE, chan=EnumImageType.BGRA)
-            if (cc := channel_count(pA)[0]) == 4:
-                alpha = pA[:,:,3]
+
+            def neighbour(func, halo: int, *arg, **kw) -> np.ndarray:
+                # very large frames run in tiles that overlap by the op's reach
+                if tile_wanted(pA):
+                    return tile_apply(pA, func, halo, *arg, **kw)
+                return func(pA, *arg, **kw)
 
             match EnumAdjustOP[o]:
                 case EnumAdjustOP.INVERT:
@@ -117,34 +215,34 @@ class AdjustNode(JOVImageMultiple):
                     img_new = morph_edge_detect(pA, low=lo, high=hi)
 
                 case EnumAdjustOP.BLUR:
-                    img_new = cv2.blur(pA, (r, r))
+                    img_new = neighbour(cv2.blur, r, (r, r))
 
                 case EnumAdjustOP.STACK_BLUR:
                     r = min(r, 1399)
                     if r % 2 == 0:
                         r += 1
-                    img_new = cv2.stackBlur(pA, (r, r))
+                    img_new = neighbour(cv2.stackBlur, r, (r, r))
 
                 case EnumAdjustOP.GAUSSIAN_BLUR:
                     r = min(r, 999)
                     if r % 2 == 0:
                         r += 1
-                    img_new = cv2.GaussianBlur(pA, (r, r), sigmaX=float(a))
+                    img_new = neighbour(cv2.GaussianBlur, r, (r, r), sigmaX=float(a))
 
                 case EnumAdjustOP.MEDIAN_BLUR:
                     r = min(r, 357)
                     if r % 2 == 0:
                         r += 1
-                    img_new = cv2.medianBlur(pA, r)
+                    img_new = neighbour(cv2.medianBlur, r, r)
 
                 case EnumAdjustOP.SHARPEN:
                     r = min(r, 511)
                     if r % 2 == 0:
                         r += 1
-                    img_new = image_sharpen(pA, kernel_size=r, amount=a)
+                    img_new = neighbour(image_sharpen, r, kernel_size=r, amount=a)
 
                 case EnumAdjustOP.EMBOSS:
-                    img_new = morph_emboss(pA, a, r)
+                    img_new = neighbour(morph_emboss, 2, a, r)
 
                 case EnumAdjustOP.EQUALIZE:
                     img_new = image_equalize(pA)
@@ -153,47 +251,57 @@ class AdjustNode(JOVImageMultiple):
                     img_new = image_pixelate(pA, a / 255.)
 
                 case EnumAdjustOP.QUANTIZE:
-                    img_new = image_quantize(pA, int(a))
+                    palette = palette if isinstance(palette, np.ndarray) else None
+                    img_new = image_quantize(pA, int(a), palette=palette)
 
                 case EnumAdjustOP.POSTERIZE:
                     img_new = image_posterize(pA, int(a))
 
                 case EnumAdjustOP.OUTLINE:
-                    img_new = cv2.morphologyEx(pA, cv2.MORPH_GRADIENT, (r, r))
+                    img_new = neighbour(cv2.morphologyEx, r, cv2.MORPH_GRADIENT, (r, r))
 
                 case EnumAdjustOP.DILATE:
-                    img_new = cv2.dilate(pA, (r, r), iterations=int(a))
+                    img_new = neighbour(cv2.dilate, r * max(1, int(a)), (r, r), iterations=int(a))
 
                 case EnumAdjustOP.ERODE:
-                    img_new = cv2.erode(pA, (r, r), iterations=int(a))
+                    img_new = neighbour(cv2.erode, r * max(1, int(a)), (r, r), iterations=int(a))
 
                 case EnumAdjustOP.OPEN:
-                    img_new = cv2.morphologyEx(pA, cv2.MORPH_OPEN, (r, r), iterations=int(a))
+                    img_new = neighbour(cv2.morphologyEx, 2 * r * max(1, int(a)), cv2.MORPH_OPEN, (r, r), iterations=int(a))
 
                 case EnumAdjustOP.CLOSE:
-                    img_new = cv2.morphologyEx(pA, cv2.MORPH_CLOSE, (r, r), iterations=int(a))
-
-            if mask is not None:
-                mask = tensor2cv(mask, chan=EnumImageType.GRAYSCALE)
-            else:
-                mask = channel_solid(MIN_IMAGE_SIZE, MIN_IMAGE_SIZE, chan=EnumImageType.GRAYSCALE)
-            if not invert:
-                mask = 255 - mask
-
-            if (wh := pA.shape[:2]) != mask.shape[:2]:
-                mask = cv2.resize(mask, wh[::-1])
-            pA = image_blend(pA, img_new, mask)
-            if cc == 4:
-                pA[:,:,3] = alpha
-            matte = pixel_eval(matte, EnumImageType.BGRA)
-            images.append(cv2tensor_full(pA, matte))
-            pbar.update_absolute(idx)
+                    img_new = neighbour(cv2.morphologyEx, 2 * r * max(1, int(a)), cv2.MORPH_CLOSE, (r, r), iterations=int(a))
+
+            return [finish(pA, img_new, mask, matte, invert)]
+
+        def compute(params) -> list[tuple[torch.Tensor, ...]]:
+            # tone operations on same sized frames are grouped into one batched run
+            runs = []
+            for param in params:
+                pA, o, con, gamma = param[0], EnumAdjustOP[param[2]], param[8], param[9]
+                key = None
+                if o in self.TONE and isinstance(pA, torch.Tensor):
+                    key = (o, tuple(pA.shape), con != 0, gamma != 0)
+                    if o == EnumAdjustOP.PIXELATE:
+                        # one block size per run
+                        key += (param[4],)
+                if key is not None and len(runs) and runs[-1][0] == key and \
+                    np.prod(pA.shape[1:3]) * (len(runs[-1][1]) + 1) <= IMAGE_BATCH_CHUNK:
+                    runs[-1][1].append(param)
+                else:
+                    runs.append((key, [param]))
+            pbar = comfy.utils.ProgressBar(len(runs))
+            images = self.batch_map(process, runs, pbar)
+            return [img for run in images for img in run]
+
+        images = self.batch_cached(params, compute)
         return list(zip(*images))
 
 class ColorMatchNode(JOVImageMultiple):
     NAME = "COLOR MATCH (JOV) 💞"
     CATEGORY = CATEGORY = JOV_CATEGORY
     DESCRIPTION = "Project the colors of one image  onto another or use a pre-defined color target."
+    BATCH_CACHE = True
 
     @classmethod
     def INPUT_TYPES(cls) -> dict:
@@ -214,6 +322,7 @@ class ColorMatchNode(JOVImageMultiple):
                                             "tooltip": "Invert the color match output"}),
             Lexicon.MATTE: ("VEC4", {"default": (0, 0, 0, 255), "step": 1,
                                         "label": [Lexicon.R, Lexicon.G, Lexicon.B, Lexicon.A], "rgb": True}),
+            Lexicon.SMOOTH: ("FLOAT", {"default": 0, "min": 0, "max": 1, "step": 0.01}),
         }}
         return Lexicon._parse(d, JOV_HELP_URL + "/ADJUST#-color-match")
 
@@ -229,41 +338,54 @@ class ColorMatchNode(JOVImageMultiple):
         flip = kw.get(Lexicon.FLIP, [False])
         invert = kw.get(Lexicon.INVERT, [False])
         matte = parse_tuple(Lexicon.MATTE, kw, default=(0, 0, 0, 255), clip_min=0, clip_max=255)
+        smooth = parse_number(Lexicon.SMOOTH, kw, EnumTupleType.FLOAT, [0], clip_min=0, clip_max=1)
         params = [tuple(x) for x in zip_longest_fill(pA, pB, colormap, colormatch_mode,
-                                                     colormatch_map, num_colors, flip, invert, matte)]
-        images = []
-        pbar = comfy.utils.ProgressBar(len(params))
-        for idx, (pA, pB, colormap, mode, cmap, num_colors, flip, invert, matte) in enumerate(params):
-            if flip == True:
-                pA, pB = pB, pA
-            if pA is None:
-                pA = channel_solid(MIN_IMAGE_SIZE, MIN_IMAGE_SIZE, chan=EnumImageType.BGRA)
-            else:
-                pA = tensor2cv(pA)
-            h, w = pA.shape[:2]
-            if pB is None:
-                pB = channel_solid(w, h, chan=EnumImageType.BGRA)
-            else:
-                pB = tensor2cv(pB)
+                                                     colormatch_map, num_colors, flip, invert, matte, smooth)]
+        # smoothed source statistics hang on the frames before, so they are run
+        # up front and stand in for the amount so the frame cache keys on them
+        running = None
+        for idx, (pA, pB, _, mode, _, _, flip, _, _, amount) in enumerate(params):
             mode = EnumColorMatchMode[mode]
-            match mode:
-                case EnumColorMatchMode.LUT:
-                    cmap = EnumColorMatchMap[cmap]
-                    if cmap == EnumColorMatchMap.PRESET_MAP:
-                        pB = None
-                    colormap = EnumColorMap[colormap]
-                    pA = color_match_lut(pA, colormap.value, pB, num_colors)
-                case EnumColorMatchMode.HISTOGRAM:
-                    pB = image_scalefit(pB, w, h, EnumScaleMode.CROP, (0,0,0,0))
-                    pB = image_scalefit(pB, w, h, EnumScaleMode.MATTE, (0,0,0,0))
-                    pA = color_match_histogram(pA, pB)
-                case EnumColorMatchMode.REINHARD:
-                    pA = color_match_reinhard(pA, pB)
-            if invert == True:
-                pA = image_invert(pA, 1)
-            matte = pixel_eval(matte, EnumImageType.BGRA)
-            images.append(cv2tensor_full(pA, matte))
-            pbar.update_absolute(idx)
+            if flip == True:
+                pA = pB
+            if amount == 0 or pA is None or mode == EnumColorMatchMode.LUT:
+                running = None
+                continue
+            lab = color_lab(tensor2cv(pA))
+            stats = color_lab_cdf(lab) if mode == EnumColorMatchMode.HISTOGRAM else color_lab_stats(lab)
+            if running is not None and running[0] == mode:
+                stats = running[1] * amount + stats * (1 - amount)
+            running = (mode, stats)
+            params[idx] = params[idx][:-1] + (stats,)
+        pbar = comfy.utils.ProgressBar(len(params))
+        writer = BatchWriter(len(params))
+
+        def compute(params) -> list[tuple[torch.Tensor, ...]]:
+            frames = []
+            for pA, pB, colormap, mode, cmap, num_colors, flip, invert, matte, source in params:
+                if flip == True:
+                    pA, pB = pB, pA
+                if pA is None:
+                    pA = channel_solid(MIN_IMAGE_SIZE, MIN_IMAGE_SIZE, chan=EnumImageType.BGRA)
+                else:
+                    pA = tensor2cv(pA)
+                h, w = pA.shape[:2]
+                if pB is None:
+                    pB = channel_solid(w, h, chan=EnumImageType.BGRA)
+                else:
+                    pB = tensor2cv(pB)
+                source = source if isinstance(source, np.ndarray) else None
+                frames.append((pA, pB, mode, cmap, colormap, num_colors, source))
+
+            images = []
+            for pA, (_, _, _, _, _, _, _, invert, matte, _) in zip(self.batch_map(color_match, frames, pbar), params):
+                if invert == True:
+                    pA = image_invert(pA, 1)
+                matte = pixel_eval(matte, EnumImageType.BGRA)
+                images.append(writer.put(pA, matte))
+            return images
+
+        images = self.batch_cached(params, compute)
         return list(zip(*images))
 
 class ThresholdNode(JOVImageMultiple):
@@ -295,21 +417,32 @@ class ThresholdNode(JOVImageMultiple):
         block = kw.get(Lexicon.SIZE, [3])
         invert = kw.get(Lexicon.INVERT, [False])
         params = [tuple(x) for x in zip_longest_fill(pA, mode, adapt, threshold, block, invert)]
-        images = []
-        pbar = comfy.utils.ProgressBar(len(params))
-        for idx, (pA, mode, adapt, th, block, invert) in enumerate(params):
-            if pA is None:
-                pA = channel_solid(MIN_IMAGE_SIZE, MIN_IMAGE_SIZE)
+        # same sized frames with matching settings threshold as one batch
+        runs = []
+        for param in params:
+            pA, mode, adapt, _, block, invert = param
+            key = (mode, adapt, block, invert, tuple(pA.shape) if pA is not None else None)
+            if len(runs) and runs[-1][0] == key and pA is not None and \
+                np.prod(pA.shape[1:3]) * (len(runs[-1][1]) + 1) <= IMAGE_BATCH_CHUNK:
+                runs[-1][1].append(param)
             else:
-                pA = tensor2cv(pA)
+                runs.append((key, [param]))
+        pbar = comfy.utils.ProgressBar(len(runs))
+        writer = BatchWriter(len(params))
+
+        def process(key, run) -> list[tuple[torch.Tensor, ...]]:
+            _, mode, adapt, _, block, invert = run[0]
+            stack = np.stack([channel_solid(MIN_IMAGE_SIZE, MIN_IMAGE_SIZE) if p[0] is None
+                              else tensor2cv(p[0]) for p in run])
             mode = EnumThreshold[mode]
             adapt = EnumThresholdAdapt[adapt]
-            pA = image_threshold(pA, th, mode, adapt, block)
+            stack = image_threshold(stack, [p[3] for p in run], mode, adapt, block)
             if invert == True:
-                pA = image_invert(pA, 1)
-            images.append(cv2tensor_full(pA))
-            pbar.update_absolute(idx)
-        return list(zip(*images))
+                stack = image_invert(stack, 1)
+            return [writer.put(img) for img in stack]
+
+        images = self.batch_map(process, runs, pbar)
+        return list(zip(*[img for run in images for img in run]))
 
 class ColorBlindNode(JOVImageMultiple):
     NAME = "COLOR BLIND (JOV) 👁‍🗨"
@@ -322,9 +455,9 @@ class ColorBlindNode(JOVImageMultiple):
         "required": {},
         "optional": {
             Lexicon.PIXEL_A: (WILDCARD, {}),
-            Lexicon.COLORMATCH_MODE: (EnumCBDefiency._member_names_,
+            Lexicon.DEFIENCY: (EnumCBDefiency._member_names_,
                                         {"default": EnumCBDefiency.PROTAN.name}),
-            Lexicon.COLORMATCH_MAP: (EnumCBSimulator._member_names_,
+            Lexicon.SIMULATOR: (EnumCBSimulator._member_names_,
                                         {"default": EnumCBSimulator.AUTOSELECT.name}),
             Lexicon.VALUE: ("FLOAT", {"default": 1, "min": 0, "max": 1, "step": 0.001}),
         }}
@@ -335,16 +468,75 @@ class ColorBlindNode(JOVImageMultiple):
         pA = [None] if pA is None else batch_extract(pA)
         defiency = kw.get(Lexicon.DEFIENCY, [EnumCBDefiency.PROTAN.name])
         simulator = kw.get(Lexicon.SIMULATOR, [EnumCBSimulator.AUTOSELECT.name])
-        severity = kw.get(Lexicon.SIMULATOR, [1])
+        severity = parse_number(Lexicon.VALUE, kw, EnumTupleType.FLOAT, [1], clip_min=0, clip_max=1)
         params = [tuple(x) for x in zip_longest_fill(pA, defiency, simulator, severity)]
-        images = []
+
+        # runs of same sized frames with one setting go through as one batch
+        runs = []
+        for pA, defiency, simulator, severity in params:
+            pA = channel_solid(MIN_IMAGE_SIZE, MIN_IMAGE_SIZE, chan=EnumImageType.BGRA) \
+                if pA is None else tensor2cv(pA)
+            key = (EnumCBDefiency[defiency], EnumCBSimulator[simulator], severity, pA.shape)
+            if len(runs) and runs[-1][0] == key and \
+                np.prod(pA.shape[:2]) * (len(runs[-1][1]) + 1) <= IMAGE_BATCH_CHUNK:
+                runs[-1][1].append(pA)
+            else:
+                runs.append((key, [pA]))
+
+        def process(key, frames) -> np.ndarray:
+            stack = np.stack(frames)
+            if stack.ndim == 3:
+                stack = stack[..., None]
+            return image_color_blind(stack, *key[:3])
+
+        pbar = comfy.utils.ProgressBar(len(runs))
+        writer = BatchWriter(len(params))
+        images = [writer.put(pA) for stack in self.batch_map(process, runs, pbar) for pA in stack]
+        return list(zip(*images))
+
+class ColorLUTNode(JOVImageMultiple):
+    NAME = "COLOR LUT (JOV) 🧊"
+    CATEGORY = JOV_CATEGORY
+    DESCRIPTION = "Grade an input through a 3D .cube lookup table in a single pass."
+
+    @classmethod
+    def INPUT_TYPES(cls) -> dict:
+        d = {
+        "required": {},
+        "optional": {
+            Lexicon.PIXEL: (WILDCARD, {}),
+            Lexicon.FILEN: ("STRING", {"default": "", "tooltip": "Path to a 3D .cube file"}),
+            Lexicon.MATTE: ("VEC4", {"default": (0, 0, 0, 255), "step": 1,
+                                     "label": [Lexicon.R, Lexicon.G, Lexicon.B, Lexicon.A], "rgb": True})
+        }}
+        return Lexicon._parse(d, JOV_HELP_URL + "/ADJUST#-color-lut")
+
+    def run(self, **kw) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        pA = kw.get(Lexicon.PIXEL, None)
+        pA = [None] if pA is None else batch_extract(pA)
+        path = kw.get(Lexicon.FILEN, [""])
+        matte = parse_tuple(Lexicon.MATTE, kw, default=(0, 0, 0, 255), clip_min=0, clip_max=255)
+        params = [tuple(x) for x in zip_longest_fill(pA, path, matte)]
         pbar = comfy.utils.ProgressBar(len(params))
-        for idx, (pA, defiency, simulator, severity) in enumerate(params):
+        writer = BatchWriter(len(params))
+        luts = {}
+        for fname in set(p[1] for p in params):
+            if not fname:
+                continue
+            try:
+                luts[fname] = lut_load_cube(fname)
+            except (OSError, ValueError) as e:
+                logger.error(e)
+
+        def process(pA, path, matte) -> tuple[torch.Tensor, ...]:
             if pA is None:
                 pA = channel_solid(MIN_IMAGE_SIZE, MIN_IMAGE_SIZE, chan=EnumImageType.BGRA)
             else:
                 pA = tensor2cv(pA)
-            pA = image_color_blind(pA, defiency, simulator, severity)
-            images.append(cv2tensor_full(pA))
-            pbar.update_absolute(idx)
+            if (lut := luts.get(path, None)) is not None:
+                pA = lut_apply(pA, lut)
+            matte = pixel_eval(matte, EnumImageType.BGRA)
+            return writer.put(pA, matte)
+
+        images = self.batch_map(process, params, pbar)
         return list(zip(*images))
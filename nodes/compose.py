@@ -5,25 +5,26 @@ Composition
 
 import cv2
 import torch
+import numpy as np
 from enum import Enum
 from loguru import logger
 
 import comfy
 
-from Jovimetrix import TYPE_PIXEL, JOVImageMultiple, JOV_HELP_URL, WILDCARD, MIN_IMAGE_SIZE
+from Jovimetrix import TYPE_PIXEL, JOVBaseNode, JOVImageMultiple, JOV_HELP_URL, WILDCARD, MIN_IMAGE_SIZE
 from Jovimetrix.sup.lexicon import Lexicon
 from Jovimetrix.sup.util import parse_number, parse_tuple, zip_longest_fill, EnumTupleType
-from Jovimetrix.sup.image import batch_extract, channel_merge, \
+from Jovimetrix.sup.image import BatchWriter, batch_extract, channel_merge, \
     channel_solid, channel_swap, cv2tensor_full, \
-    image_crop, image_crop_center, image_crop_polygonal, image_grayscale, \
+    image_composite, image_crop, image_crop_center, image_crop_polygonal, image_grayscale, \
     image_mask, image_mask_add, image_matte, image_rotate, image_scale, image_transform, \
     image_translate, image_split, pixel_eval, tensor2cv, \
     image_edge_wrap, image_scalefit, cv2tensor, \
-    image_stack, image_mirror, image_blend, \
+    image_stack, image_mirror, image_blend_prep, blend_array, \
     color_theory, remap_fisheye, remap_perspective, remap_polar, \
     remap_sphere, image_invert, \
     EnumImageType, EnumColorTheory, EnumProjection, \
-    EnumScaleMode, EnumInterpolation, EnumBlendType, \
+    EnumScaleMode, EnumInterpolation, EnumBlendType, BLEND_CHUNK, \
     EnumEdge, EnumMirrorMode, EnumOrientation, EnumPixelSwap
 
 # =============================================================================
@@ -86,17 +87,15 @@ class TransformNode(JOVImageMultiple):
         sample = kw.get(Lexicon.SAMPLE, [EnumInterpolation.LANCZOS4])
         matte = parse_tuple(Lexicon.MATTE, kw, default=(0, 0, 0, 255), clip_min=0, clip_max=255)
         params = [tuple(x) for x in zip_longest_fill(pA, offset, angle, size, edge, tile_xy, mirror, mirror_pivot, proj, strength, tltr, blbr, mode, wihi, sample, matte)]
-        images = []
         pbar = comfy.utils.ProgressBar(len(params))
-        for idx, (pA, offset, angle, size, edge, tile_xy, mirror, mirror_pivot, proj, strength, tltr, blbr, mode, wihi, sample, matte) in enumerate(params):
+        writer = BatchWriter(len(params))
+
+        def process(pA, offset, angle, size, edge, tile_xy, mirror, mirror_pivot, proj, strength, tltr, blbr, mode, wihi, sample, matte) -> tuple[torch.Tensor, ...]:
             matte = pixel_eval(matte, EnumImageType.BGRA)
             if pA is None:
                 pA = channel_solid(MIN_IMAGE_SIZE, MIN_IMAGE_SIZE, matte, EnumImageType.BGRA)
-                pA = cv2tensor_full(pA, matte)
-                images.append(pA)
-                pbar.update_absolute(idx)
                 logger.debug("Should not be here")
-                continue
+                return writer.put(pA, matte)
 
             pA = tensor2cv(pA)
             h, w = pA.shape[:2]
@@ -138,8 +137,9 @@ class TransformNode(JOVImageMultiple):
                 w, h = wihi
                 pA = image_scalefit(pA, w, h, mode, sample, matte)
 
-            images.append(cv2tensor_full(pA, matte))
-            pbar.update_absolute(idx)
+            return writer.put(pA, matte)
+
+        images = self.batch_map(process, params, pbar)
         return list(zip(*images))
 
 class BlendNode(JOVImageMultiple):
@@ -147,6 +147,7 @@ class BlendNode(JOVImageMultiple):
     CATEGORY = JOV_CATEGORY
     DESCRIPTION = "Applies selected operation to 2 inputs with optional mask using a linear blend (alpha)."
     SORT = 10
+    BATCH_CACHE = True
 
     @classmethod
     def INPUT_TYPES(cls) -> dict:
@@ -183,44 +184,182 @@ class BlendNode(JOVImageMultiple):
         matte = parse_tuple(Lexicon.MATTE, kw, default=(0, 0, 0), clip_min=0, clip_max=255)
         invert = kw.get(Lexicon.INVERT, [False])
         params = [tuple(x) for x in zip_longest_fill(pA, pB, mask, func, alpha, flip, mode, wihi, sample, matte, invert)]
-        images = []
-        pbar = comfy.utils.ProgressBar(len(params))
-        for idx, (pA, pB, mask, func, alpha, flip, mode, wihi, sample, matte, invert) in enumerate(params):
+        def compute(params) -> list[tuple[torch.Tensor, ...]]:
+            images = []
+            pending = []
+            pbar = comfy.utils.ProgressBar(len(params))
+            writer = BatchWriter(len(params))
+
+            def flush() -> None:
+                # one vectorized blend for the whole run of same sized frames
+                lower = np.stack([p[0] for p in pending])
+                upper = np.stack([p[1] for p in pending])
+                blend = blend_array(lower, upper, pending[0][2], [p[3] for p in pending])
+                for img, (_, _, _, _, mode, wihi, sample, matte) in zip(blend, pending):
+                    mode = EnumScaleMode[mode]
+                    if mode != EnumScaleMode.NONE:
+                        w, h = wihi
+                        sample = EnumInterpolation[sample]
+                        img = image_scalefit(img, w, h, mode, sample, matte)
+                    images.append(writer.put(img, matte))
+                    pbar.update_absolute(len(images))
+                pending.clear()
+
+            for idx, (pA, pB, mask, func, alpha, flip, mode, wihi, sample, matte, invert) in enumerate(params):
+
+                if flip:
+                    pA, pB = pB, pA
+
+                if pB is None:
+                    pB = channel_solid(MIN_IMAGE_SIZE, MIN_IMAGE_SIZE, (0,0,0,255), EnumImageType.BGRA)
+                else:
+                    pB = tensor2cv(pB)
+
+                matte = pixel_eval(matte, EnumImageType.BGRA)
+                if pA is None:
+                    h, w = pB.shape[:2]
+                    pA = channel_solid(w, h, matte, chan=EnumImageType.BGRA)
+                else:
+                    pA = tensor2cv(pA)
+                    pA = image_matte(pA, matte)
+
+                if mask is None:
+                    mask = image_mask(pB)
+                else:
+                    mask = tensor2cv(mask, EnumImageType.GRAYSCALE)
+
+                if invert:
+                    mask = 255 - mask
+
+                func = EnumBlendType[func]
+                pA, pB = image_blend_prep(pA, pB, mask)
+                if len(pending) > 0:
+                    h, w = pA.shape[:2]
+                    if pending[0][2] != func or pending[0][0].shape != pA.shape or \
+                        (len(pending) + 1) * w * h > BLEND_CHUNK:
+                        flush()
+                pending.append((pA, pB, func, alpha, mode, wihi, sample, matte))
+
+            if len(pending) > 0:
+                flush()
+            return images
+
+        images = self.batch_cached(params, compute)
+        return list(zip(*images))
 
-            if flip:
-                pA, pB = pB, pA
+class LayerNode(JOVBaseNode):
+    NAME = "LAYER (JOV) 🧅"
+    CATEGORY = JOV_CATEGORY
+    DESCRIPTION = "Package an image with its blend mode, opacity, mask and offset for the Composite node."
+    RETURN_TYPES = ("JLAYER",)
+    RETURN_NAMES = (Lexicon.LAYER,)
+    OUTPUT_IS_LIST = (True,)
+    SORT = 12
 
-            if pB is None:
-                pB = channel_solid(MIN_IMAGE_SIZE, MIN_IMAGE_SIZE, (0,0,0,255), EnumImageType.BGRA)
-            else:
-                pB = tensor2cv(pB)
+    @classmethod
+    def INPUT_TYPES(cls) -> dict:
+        d = {
+        "required": {},
+        "optional": {
+            Lexicon.PIXEL: (WILDCARD, {}),
+            Lexicon.MASK: (WILDCARD, {"tooltip": "Optional Mask for the layer. If empty, will use the ALPHA of the image."}),
+            Lexicon.FUNC: (EnumBlendType._member_names_, {"default": EnumBlendType.NORMAL.name, "tooltip": "Blending Operation"}),
+            Lexicon.A: ("FLOAT", {"default": 1, "min": 0, "max": 1, "step": 0.01, "tooltip": "Opacity of the layer"}),
+            Lexicon.XY: ("VEC2", {"default": (0, 0,), "step": 0.01, "precision": 4, "round": 0.00001, "label": [Lexicon.X, Lexicon.Y]}),
+            Lexicon.INVERT: ("BOOLEAN", {"default": False, "tooltip": "Invert the mask input"}),
+        }}
+        return Lexicon._parse(d, JOV_HELP_URL + "/COMPOSE#-layer")
 
-            matte = pixel_eval(matte, EnumImageType.BGRA)
-            if pA is None:
-                h, w = pB.shape[:2]
-                pA = channel_solid(w, h, matte, chan=EnumImageType.BGRA)
-            else:
-                pA = tensor2cv(pA)
-                pA = image_matte(pA, matte)
+    def run(self, **kw) -> tuple[list[dict]]:
+        pA = kw.get(Lexicon.PIXEL, None)
+        pA = [None] if pA is None else batch_extract(pA)
+        mask = kw.get(Lexicon.MASK, None)
+        mask = [None] if mask is None else batch_extract(mask)
+        func = kw.get(Lexicon.FUNC, [EnumBlendType.NORMAL.name])
+        alpha = kw.get(Lexicon.A, [1])
+        offset = parse_tuple(Lexicon.XY, kw, typ=EnumTupleType.FLOAT, default=(0., 0.,))
+        invert = kw.get(Lexicon.INVERT, [False])
+        params = [tuple(x) for x in zip_longest_fill(pA, mask, func, alpha, offset, invert)]
+        layers = []
+        for pA, mask, func, alpha, offset, invert in params:
+            # the frames are converted once, inside the composite
+            layers.append({"image": pA, "mask": mask, "func": func, "alpha": alpha,
+                           "offset": offset, "invert": invert})
+        return (layers,)
+
+class CompositeNode(JOVImageMultiple):
+    NAME = "COMPOSITE (JOV) 🥞"
+    CATEGORY = JOV_CATEGORY
+    DESCRIPTION = "Composite any number of layers, each with its own blend mode, opacity, mask and offset, in a single pass."
+    SORT = 15
 
-            if mask is None:
-                mask = image_mask(pB)
-            else:
-                mask = tensor2cv(mask, EnumImageType.GRAYSCALE)
+    @classmethod
+    def INPUT_TYPES(cls) -> dict:
+        d = {
+        "required": {},
+        "optional": {
+            Lexicon.AUTOSIZE: ("BOOLEAN", {"default": True, "tooltip": "Use the size of the bottom layer for the canvas"}),
+            Lexicon.WH: ("VEC2", {"default": (MIN_IMAGE_SIZE, MIN_IMAGE_SIZE), "step": 1, "label": [Lexicon.W, Lexicon.H]}),
+            Lexicon.PREMULTIPLY: ("BOOLEAN", {"default": False}),
+            Lexicon.MATTE: ("VEC4", {"default": (0, 0, 0, 0), "step": 1, "label": [Lexicon.R, Lexicon.G, Lexicon.B, Lexicon.A], "rgb": True})
+        }}
+        return Lexicon._parse(d, JOV_HELP_URL + "/COMPOSE#-composite")
 
-            if invert:
-                mask = 255 - mask
+    def run(self, **kw) -> tuple[torch.Tensor, torch.Tensor]:
+        layers = []
+        idx = 1
+        while 1:
+            who = f"{Lexicon.LAYER}_{idx}"
+            if (val := kw.get(who, None)) is None:
+                break
+            frames = []
+            for v in val:
+                if isinstance(v, dict):
+                    frames.append(v)
+                elif isinstance(v, torch.Tensor):
+                    # plain images are NORMAL layers at full opacity
+                    frames.extend([{"image": x} for x in batch_extract([v])])
+            if len(frames) > 0:
+                layers.append(frames)
+            idx += 1
 
-            func = EnumBlendType[func]
-            img = image_blend(pA, pB, mask, func, alpha)
-            mode = EnumScaleMode[mode]
-            if mode != EnumScaleMode.NONE:
-                w, h = wihi
-                sample = EnumInterpolation[sample]
-                img = image_scalefit(img, w, h, mode, sample, matte)
-            img = cv2tensor_full(img, matte)
-            images.append(img)
-            pbar.update_absolute(idx)
+        if len(layers) == 0:
+            # the outputs still carry one matte frame per entry
+            logger.warning("no layers to composite")
+
+        autosize = kw.get(Lexicon.AUTOSIZE, [True])
+        wihi = parse_tuple(Lexicon.WH, kw, default=(MIN_IMAGE_SIZE, MIN_IMAGE_SIZE,), clip_min=1)
+        premultiply = kw.get(Lexicon.PREMULTIPLY, [False])
+        matte = parse_tuple(Lexicon.MATTE, kw, default=(0, 0, 0, 0), clip_min=0, clip_max=255)
+        params = [tuple(x) for x in zip_longest_fill(autosize, wihi, premultiply, matte, *layers)]
+        writer = BatchWriter(len(params))
+
+        def process(autosize, wihi, premultiply, matte, *stack) -> tuple[torch.Tensor, ...]:
+            matte = pixel_eval(matte, EnumImageType.BGRA)
+            frame = []
+            for layer in stack:
+                if (img := layer.get("image", None)) is None:
+                    continue
+                img = tensor2cv(img)
+                mask = layer.get("mask", None)
+                if mask is not None:
+                    mask = tensor2cv(mask, EnumImageType.GRAYSCALE)
+                if layer.get("invert", False):
+                    if mask is None:
+                        mask = image_mask(img)
+                    mask = 255 - mask
+                func = EnumBlendType[layer.get("func", EnumBlendType.NORMAL.name)]
+                frame.append((img, mask, func, layer.get("alpha", 1), layer.get("offset", (0, 0))))
+
+            # without a layer image the canvas is the matte at the given size
+            w, h = wihi
+            if autosize and len(frame):
+                h, w = frame[0][0].shape[:2]
+            img = image_composite(frame, w, h, matte, premultiply)
+            return writer.put(img, matte)
+
+        pbar = comfy.utils.ProgressBar(len(params))
+        images = self.batch_map(process, params, pbar)
         return list(zip(*images))
 
 class PixelSplitNode(JOVImageMultiple):
@@ -285,6 +424,7 @@ class PixelMergeNode(JOVImageMultiple):
         params = [tuple(x) for x in zip_longest_fill(R, G, B, A, matte)]
         images = []
         pbar = comfy.utils.ProgressBar(len(params))
+        writer = BatchWriter(len(params))
         for idx, (r, g, b, a, matte) in enumerate(params):
             r = tensor2cv(r, chan=EnumImageType.GRAYSCALE)
             g = tensor2cv(g, chan=EnumImageType.GRAYSCALE)
@@ -292,8 +432,7 @@ class PixelMergeNode(JOVImageMultiple):
             mask = tensor2cv(a, chan=EnumImageType.GRAYSCALE)
             img = channel_merge([b, g, r, mask])
             # logger.debug(img.shape)
-            img = cv2tensor_full(img, matte)
-            images.append(img)
+            images.append(writer.put(img, matte))
             pbar.update_absolute(idx)
         data = list(zip(*images))
         return data
@@ -337,9 +476,10 @@ class PixelSwapNode(JOVImageMultiple):
         a = kw.get(Lexicon.A, [0])
         params = [tuple(x) for x in zip_longest_fill(pA, pB, r, swap_r, g, swap_g,
                                                      b, swap_b, a, swap_a)]
-        images = []
         pbar = comfy.utils.ProgressBar(len(params))
-        for idx, (pA, pB, r, swap_r, g, swap_g, b, swap_b, a, swap_a) in enumerate(params):
+        writer = BatchWriter(len(params))
+
+        def process(pA, pB, r, swap_r, g, swap_g, b, swap_b, a, swap_a) -> tuple[torch.Tensor, ...]:
             if pA is None:
                 pA = channel_solid(MIN_IMAGE_SIZE, MIN_IMAGE_SIZE, chan=EnumImageType.BGRA)
             else:
@@ -358,8 +498,9 @@ class PixelSwapNode(JOVImageMultiple):
                 swap = EnumPixelSwap[swap]
                 if swap != EnumPixelSwap.PASSTHRU:
                     pA[:,:,i] = channel_swap(pB, swap, matte)
-            images.append(cv2tensor_full(pA))
-            pbar.update_absolute(idx)
+            return writer.put(pA)
+
+        images = self.batch_map(process, params, pbar)
         data = list(zip(*images))
         return data
 
@@ -447,9 +588,10 @@ class CropNode(JOVImageMultiple):
         blbr = parse_tuple(Lexicon.BLBR, kw, EnumTupleType.FLOAT, (1, 0, 1, 1,), 0, 1)
         color = parse_tuple(Lexicon.RGB, kw, default=(0, 0, 0,), clip_min=0, clip_max=255)
         params = [tuple(x) for x in zip_longest_fill(pA, func, xy, wihi, tltr, blbr, color)]
-        images = []
         pbar = comfy.utils.ProgressBar(len(params))
-        for idx, (pA, func, xy, wihi, tltr, blbr, color) in enumerate(params):
+        writer = BatchWriter(len(params))
+
+        def process(pA, func, xy, wihi, tltr, blbr, color) -> tuple[torch.Tensor, ...]:
             width, height = wihi
             if pA is not None:
                 pA = tensor2cv(pA)
@@ -466,8 +608,9 @@ class CropNode(JOVImageMultiple):
                 pA = image_crop(pA, width, height, xy)
             else:
                 pA = image_crop_center(pA, width, height)
-            images.append(cv2tensor_full(pA, color))
-            pbar.update_absolute(idx)
+            return writer.put(pA, color)
+
+        images = self.batch_map(process, params, pbar)
         return list(zip(*images))
 
 class ColorTheoryNode(JOVImageMultiple):
@@ -20,12 +20,12 @@ from Jovimetrix.sup.lexicon import Lexicon
 
 from Jovimetrix.sup.util import parse_tuple, zip_longest_fill, EnumTupleType
 
-from Jovimetrix.sup.image import batch_extract, channel_solid, cv2tensor_full, \
-    image_grayscale, image_invert, image_mask_add, image_rotate, image_stereogram, image_transform, \
-    image_translate, pil2cv, pixel_eval, tensor2cv, shape_ellipse, shape_polygon, \
-    shape_quad, EnumEdge, EnumImageType
+from Jovimetrix.sup.image import BatchWriter, batch_extract, channel_constant, channel_solid, cv2tensor_full, \
+    image_grayscale, image_invert, image_mask_add, image_stereogram, image_transform, \
+    pil2cv, pixel_eval, tensor2cv, shape_ellipse, shape_polygon, \
+    shape_quad, EnumEdge, EnumImageType, EnumInterpolation
 
-from Jovimetrix.sup.text import font_all, font_all_names, text_autosize, text_draw, \
+from Jovimetrix.sup.text import font_all, font_all_names, text_autosize, text_draw, text_font, \
     EnumAlignment, EnumJustify, EnumShapes
 
 # =============================================================================
@@ -65,14 +65,15 @@ class ConstantNode(JOVImageMultiple):
         images = []
         params = [tuple(x) for x in zip_longest_fill(pA, wihi, matte)]
         pbar = comfy.utils.ProgressBar(len(params))
+        writer = BatchWriter(len(params))
         for idx, (pA, wihi, matte) in enumerate(params):
             width, height = wihi
             matte = pixel_eval(matte, EnumImageType.BGRA)
             if pA is None:
-                pA = channel_solid(width, height, matte, EnumImageType.BGRA)
+                pA = channel_constant(width, height, matte, EnumImageType.BGRA)
             else:
                 pA = tensor2cv(pA)
-            images.append(cv2tensor_full(pA, matte))
+            images.append(writer.put(pA, matte))
             pbar.update_absolute(idx)
         return list(zip(*images))
 
@@ -121,6 +122,7 @@ class ShapeNode(JOVImageMultiple):
                                                      size, wihi, color, matte)]
         images = []
         pbar = comfy.utils.ProgressBar(len(params))
+        writer = BatchWriter(len(params))
         for idx, (shape, sides, offset, angle, edge, size, wihi, color, matte) in enumerate(params):
             width, height = wihi
             sizeX, sizeY = size
@@ -154,7 +156,7 @@ class ShapeNode(JOVImageMultiple):
             pA = image_mask_add(pA, mask)
             pA = image_transform(pA, offset, angle, size, edge=edge)
             matte = pixel_eval(matte, EnumImageType.BGRA)
-            images.append(cv2tensor_full(pA, matte))
+            images.append(writer.put(pA, matte))
             pbar.update_absolute(idx)
         return list(zip(*images))
 
@@ -246,22 +248,20 @@ class TextNode(JOVImageMultiple):
                     w /= len(full_text) * 1.25 # kerning?
                     font_size = (w + h) * 0.5
                 font_size *= 10
-                font = ImageFont.truetype(font_name, font_size)
+                font = text_font(font_name, font_size)
                 for ch in full_text:
                     img = text_draw(ch, font, width, height, align, justify, color=color)
-                    img = image_rotate(img, angle, edge=edge)
-                    img = image_translate(img, pos, edge=edge)
+                    img = image_transform(img, pos, angle, sample=EnumInterpolation.LINEAR, edge=edge)
                     if invert:
                         img = image_invert(img, 1)
                     images.append(cv2tensor_full(img, matte))
             else:
                 if autosize:
                     full_text, font_size = text_autosize(full_text, font_name, wm, hm, columns)[:2]
-                font = ImageFont.truetype(font_name, font_size)
+                font = text_font(font_name, font_size)
                 img = text_draw(full_text, font, width, height, align, justify,
                                 margin, line_spacing, color)
-                img = image_rotate(img, angle, edge=edge)
-                img = image_translate(img, pos, edge=edge)
+                img = image_transform(img, pos, angle, sample=EnumInterpolation.LINEAR, edge=edge)
                 if invert:
                     img = image_invert(img, 1)
                 images.append(cv2tensor_full(img, matte))
@@ -291,7 +291,9 @@ class StereogramNode(JOVImageSimple):
     def run(self, **kw) -> tuple[torch.Tensor, torch.Tensor]:
         pA = kw.get(Lexicon.PIXEL, None)
         pA = [None] if pA is None else batch_extract(pA)
-        depth = kw.get(Lexicon.DEPTH, [None])
+        depth = kw.get(Lexicon.DEPTH, None)
+        # a batch of depth frames animates the stereogram
+        depth = [None] if depth is None else batch_extract(depth)
         divisions = kw.get(Lexicon.TILE, [8])
         noise = kw.get(Lexicon.NOISE, [0.33])
         gamma = kw.get(Lexicon.GAMMA, [0.33])
@@ -25,13 +25,14 @@ from folder_paths import get_output_directory
 from server import PromptServer
 import nodes
 
-from Jovimetrix import JOV_HELP_URL, ComfyAPIMessage, JOVBaseNode, TimedOutException, \
-    WILDCARD, ROOT, MIN_IMAGE_SIZE
+from Jovimetrix import JOV_HELP_URL, ComfyAPIMessage, JOVBaseNode, JOVImageSimple, \
+    TimedOutException, WILDCARD, ROOT, MIN_IMAGE_SIZE
 
 from Jovimetrix.sup.lexicon import Lexicon
 from Jovimetrix.sup.util import path_next, parse_tuple, zip_longest_fill
-from Jovimetrix.sup.image import batch_extract, cv2tensor, cv2tensor_full, image_convert, pil2cv, \
-    tensor2pil, tensor2cv, pil2tensor, image_load, image_formats, image_diff
+from Jovimetrix.sup.image import batch_extract, channel_constant, channel_solid, cv2tensor, cv2tensor_full, \
+    pil2cv, tensor2pil, tensor2cv, pil2tensor, image_load, image_formats, image_diff, image_histogram, \
+    image_histogram_accumulate, image_histogram_render, EnumImageType
 
 # =============================================================================
 
@@ -527,26 +528,82 @@ class ImageDiffNode(JOVBaseNode):
             Lexicon.PIXEL_A: (WILDCARD, {}),
             Lexicon.PIXEL_B: (WILDCARD, {}),
             Lexicon.THRESHOLD: ("FLOAT", {"default": 0.5, "min": 0, "max": 1, "step": 0.01}),
+            Lexicon.FAST: ("BOOLEAN", {"default": False}),
+            Lexicon.SCORE: ("BOOLEAN", {"default": False}),
         }}
         return Lexicon._parse(d, JOV_HELP_URL + "/UTILITY#-image-diff")
 
     def run(self, **kw) -> tuple[Any, Any]:
-        a = kw.get(Lexicon.PIXEL_A, [None])
-        b = kw.get(Lexicon.PIXEL_B, [None])
+        a = kw.get(Lexicon.PIXEL_A, None)
+        a = [None] if a is None else batch_extract(a)
+        b = kw.get(Lexicon.PIXEL_B, None)
+        b = [None] if b is None else batch_extract(b)
         th = kw.get(Lexicon.THRESHOLD, [0])
-        results = []
-        params = [tuple(x) for x in zip_longest_fill(a, b, th)]
+        fast = kw.get(Lexicon.FAST, [False])
+        score = kw.get(Lexicon.SCORE, [False])
+        params = [tuple(x) for x in zip_longest_fill(a, b, th, fast, score)]
         pbar = comfy.utils.ProgressBar(len(params))
-        for idx, (a, b, th) in enumerate(params):
-            a = tensor2cv(a)
-            b = tensor2cv(b)
-            a, b, d, t, s = image_diff(a, b, int(th * 255))
-            d = image_convert(d, 1)
-            t = image_convert(t, 1)
-            results.append([cv2tensor(a), cv2tensor(b), cv2tensor(d), cv2tensor(t), s])
-            pbar.update_absolute(idx)
+
+        def process(a, b, th, fast, score) -> list[Any]:
+            pA = channel_solid(MIN_IMAGE_SIZE, MIN_IMAGE_SIZE) if a is None else tensor2cv(a)
+            pB = channel_solid(MIN_IMAGE_SIZE, MIN_IMAGE_SIZE) if b is None else tensor2cv(b)
+            pA, pB, d, t, s = image_diff(pA, pB, int(th * 255), fast=fast, score=score)
+            if score:
+                # the pair passes through untouched with empty masks
+                h, w = pA.shape[:2]
+                mask = cv2tensor(channel_constant(w, h, chan=EnumImageType.GRAYSCALE))
+                return [cv2tensor(pA) if a is None else a, cv2tensor(pB) if b is None else b, mask, mask, s]
+            return [cv2tensor(pA), cv2tensor(pB), cv2tensor(d), cv2tensor(t), s]
+
+        results = self.batch_map(process, params, pbar)
         return list(zip(*results))
 
+class HistogramNode(JOVImageSimple):
+    NAME = "HISTOGRAM (JOV) 👁‍🗨"
+    CATEGORY = JOV_CATEGORY
+    DESCRIPTION = "Per-channel histogram of each frame, or a running total over the sequence."
+    SORT = 95
+
+    @classmethod
+    def INPUT_TYPES(cls) -> dict:
+        d = {
+        "required": {},
+        "optional": {
+            Lexicon.PIXEL_A: (WILDCARD, {}),
+            Lexicon.ACCUMULATE: ("BOOLEAN", {"default": False}),
+            Lexicon.RESET: ("BOOLEAN", {"default": False}),
+            Lexicon.WH: ("VEC2", {"default": (MIN_IMAGE_SIZE, MIN_IMAGE_SIZE), "step": 1, "label": [Lexicon.W, Lexicon.H]})
+        }}
+        return Lexicon._parse(d, JOV_HELP_URL + "/UTILITY#-histogram")
+
+    def __init__(self, *arg, **kw) -> None:
+        super().__init__(*arg, **kw)
+        # the running total carries over between executions, so a queue
+        # feeding one frame per run still builds up the whole sequence
+        self.__running = None
+
+    def run(self, **kw) -> tuple[torch.Tensor]:
+        pA = kw.get(Lexicon.PIXEL_A, None)
+        pA = [None] if pA is None else batch_extract(pA)
+        accumulate = kw.get(Lexicon.ACCUMULATE, [False])
+        if kw.get(Lexicon.RESET, [False])[0]:
+            self.__running = None
+        wihi = parse_tuple(Lexicon.WH, kw, default=(MIN_IMAGE_SIZE, MIN_IMAGE_SIZE), clip_min=1)
+        params = [tuple(x) for x in zip_longest_fill(pA, accumulate, wihi)]
+        images = []
+        pbar = comfy.utils.ProgressBar(len(params))
+        for idx, (pA, accumulate, wihi) in enumerate(params):
+            pA = tensor2cv(pA, chan=EnumImageType.BGR)
+            histogram = image_histogram(pA)
+            if accumulate:
+                if self.__running is not None and self.__running.shape != histogram.shape:
+                    self.__running = None
+                histogram = image_histogram_accumulate(histogram[None], self.__running)[0]
+                self.__running = histogram
+            images.append((cv2tensor(image_histogram_render(histogram, *wihi)),))
+            pbar.update_absolute(idx)
+        return list(zip(*images))
+
 """
 class BatchMakeNode(JOVBaseNode):
     NAME = "BATCH MAKE (JOV) 📚"
@@ -568,32 +625,4 @@ class BatchMakeNode(JOVBaseNode):
     def run(self, **kw) -> tuple[Any, Any]:
         data = [x for x in range(0, 360, 5)]
         return data, data,
-
-
-class HistogramNode(JOVImageSimple):
-    NAME = "HISTOGRAM (JOV) 👁‍🗨"
-    CATEGORY = CATEGORY = JOV_CATEGORY
-    DESCRIPTION = "Histogram"
-
-    @classmethod
-    def INPUT_TYPES(cls) -> dict:
-        d = {
-        "required": {},
-        "optional": {
-            Lexicon.PIXEL_A: (WILDCARD, {}),
-        }}
-        return Lexicon._parse(d, JOV_HELP_URL + "/ADJUST#-histogram")
-
-    def run(self, **kw) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
-        pA = kw.get(Lexicon.PIXEL_A, None)
-        pA = [None] if pA is None else batch_extract(pA)
-        params = [tuple(x) for x in zip_longest_fill(pA,)]
-        images = []
-        pbar = comfy.utils.ProgressBar(len(params))
-        for idx, (pA, ) in enumerate(params):
-            pA = image_histogram(pA)
-            pA = image_histogram_normalize(pA)
-            images.append(cv2tensor(pA))
-            pbar.update_absolute(idx)
-        return list(zip(*images))
-"""
\ No newline at end of file
+"""
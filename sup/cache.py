@@ -0,0 +1,194 @@
+"""
+Jovimetrix - http://www.github.com/amorano/jovimetrix
+Content addressed result cache
+"""
+
+import os
+import hashlib
+import threading
+import weakref
+import functools
+from collections import OrderedDict
+from enum import Enum
+from typing import Any, Callable
+
+import torch
+import numpy as np
+
+# =============================================================================
+
+# parameter sets kept by each prepare step
+PREPARE_SIZE = 64
+
+# megabytes of node results held by the result cache; 0 turns it off
+JOV_CACHE_SIZE = 1024
+try: JOV_CACHE_SIZE = int(os.getenv("JOV_CACHE_SIZE", JOV_CACHE_SIZE))
+except: pass
+JOV_CACHE_SIZE = max(0, JOV_CACHE_SIZE)
+
+# =============================================================================
+
+class DigestMemo:
+    """Digest of each live tensor, so an unchanged input is only read once.
+
+    Entries are keyed on the object and its in-place version counter and go
+    away with the tensor.
+    """
+    _memo: dict[int, tuple[weakref.ref, int, bytes]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, tensor: torch.Tensor) -> bytes:
+        key = id(tensor)
+        with cls._lock:
+            if (entry := cls._memo.get(key)) is not None:
+                ref, version, digest = entry
+                if ref() is tensor and version == tensor._version:
+                    return digest
+
+        digest = tensor_digest(tensor)
+        try:
+            ref = weakref.ref(tensor, lambda _, key=key: cls._memo.pop(key, None))
+        except TypeError:
+            return digest
+        with cls._lock:
+            cls._memo[key] = (ref, tensor._version, digest)
+        return digest
+
+def tensor_digest(data: torch.Tensor|np.ndarray) -> bytes:
+    """SHA1 of the raw bytes, shape and dtype of a tensor or array."""
+    cache = getattr(data, "cv", None)
+    if cache is not None:
+        # a cached uint8 frame is the same picture in a quarter of the bytes
+        data = cache[0] if len(cache) == 1 else np.stack(cache)
+    elif isinstance(data, torch.Tensor):
+        data = data.detach().cpu().as_subclass(torch.Tensor).numpy()
+    shape = data.shape
+    # a broadcast constant keys on its one pixel, not the frame it spans
+    data = data[tuple(slice(None) if x else slice(0, 1) for x in data.strides)]
+    data = np.ascontiguousarray(data)
+    sha = hashlib.sha1(memoryview(data).cast('B'))
+    sha.update(f"{shape}{data.shape}{data.dtype}".encode())
+    return sha.digest()
+
+def cache_key(data: Any) -> Any:
+    """Hashable key of nested parameters; tensors and arrays key on content."""
+    if isinstance(data, torch.Tensor):
+        return ('T', DigestMemo.get(data))
+    if isinstance(data, np.ndarray):
+        return ('N', tensor_digest(data))
+    if isinstance(data, (list, tuple)):
+        return tuple(cache_key(x) for x in data)
+    if isinstance(data, dict):
+        return tuple((k, cache_key(v)) for k, v in sorted(data.items()))
+    if isinstance(data, Enum):
+        return (type(data).__name__, data.name)
+    if isinstance(data, (bool, int, float)):
+        # 1, 1.0 and True hash alike but mean different things to an op
+        return (type(data).__name__, data)
+    try:
+        hash(data)
+        return data
+    except TypeError:
+        return repr(data)
+
+def cache_size(data: Any) -> int:
+    """Bytes held by the tensors and arrays in a result."""
+    if isinstance(data, torch.Tensor):
+        return data.nelement() * data.element_size()
+    if isinstance(data, np.ndarray):
+        return data.nbytes
+    if isinstance(data, (list, tuple)):
+        return sum(cache_size(x) for x in data)
+    return 0
+
+class ResultCache:
+    """LRU of node results held under a byte budget."""
+    def __init__(self, budget: int) -> None:
+        self.__budget = budget
+        self.__data = OrderedDict()
+        self.__size = 0
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def budget(self) -> int:
+        return self.__budget
+
+    def get(self, key: Any) -> Any:
+        with self.__lock:
+            if (entry := self.__data.get(key)) is None:
+                self.misses += 1
+                return None
+            self.__data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Any, value: Any) -> None:
+        size = cache_size(value)
+        if size > self.__budget:
+            return
+        with self.__lock:
+            if (entry := self.__data.pop(key, None)) is not None:
+                self.__size -= entry[1]
+            self.__data[key] = (value, size)
+            self.__size += size
+            while self.__size > self.__budget:
+                _, (_, old) = self.__data.popitem(last=False)
+                self.__size -= old
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__data.clear()
+            self.__size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        with self.__lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.__data),
+                "bytes": self.__size,
+                "budget": self.__budget
+            }
+
+RESULT_CACHE = ResultCache(JOV_CACHE_SIZE * 1024 ** 2)
+
+# =============================================================================
+# === PREPARE ===
+# =============================================================================
+
+def prepare(func: Callable) -> Callable:
+    """Cache the parameter-only setup of an operation per unique parameter set.
+
+    An op splits into a prepare step, which builds what it needs from its
+    parameters alone (a lookup table, a kernel, a simulator), and the apply
+    step that runs it on each frame. Decorate the prepare step and a batch
+    with broadcast parameters builds it once instead of once per frame.
+    Arguments key like cache_key, so lists and arrays are fine. Results are
+    shared; arrays come back read-only.
+    """
+    memo = OrderedDict()
+    lock = threading.Lock()
+
+    @functools.wraps(func)
+    def wrapper(*arg, **kw) -> Any:
+        key = cache_key((arg, kw))
+        with lock:
+            if key in memo:
+                memo.move_to_end(key)
+                return memo[key]
+        result = func(*arg, **kw)
+        if isinstance(result, np.ndarray):
+            result.flags.writeable = False
+        with lock:
+            memo[key] = result
+            if len(memo) > PREPARE_SIZE:
+                memo.popitem(last=False)
+        return result
+
+    wrapper.cache_clear = memo.clear
+    return wrapper
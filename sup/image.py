@@ -4,29 +4,30 @@ Image Support
 """
 
 import math
+import itertools
 import base64
 import urllib
 import requests
+import threading
 from enum import Enum
 from io import BytesIO
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 
 import cv2
 import torch
 import numpy as np
-import scipy as sp
-from daltonlens import simulate
-from sklearn.cluster import MiniBatchKMeans
+from daltonlens import convert, simulate
 
-from skimage import exposure
-from skimage.metrics import structural_similarity as ssim
 from PIL import Image, ImageDraw, ImageOps
-from blendmodes.blend import blendLayers, BlendType
+from blendmodes.blend import BlendType
 
 from loguru import logger
 
 from Jovimetrix import TYPE_IMAGE, TYPE_PIXEL, TYPE_COORD, MIN_IMAGE_SIZE
 from Jovimetrix.sup.util import grid_make
+from Jovimetrix.sup.cache import ResultCache, cache_key, prepare
+from Jovimetrix.sup.palette import palette_apply, palette_build, palette_colormap
+from Jovimetrix.sup.tile import tile_run, tile_wanted
 
 # =============================================================================
 # === ENUM GLOBALS ===
@@ -245,29 +246,188 @@ def sRGB2Linear(image: TYPE_IMAGE) -> TYPE_IMAGE:
     """Convert sRGB to linearRGB, removing the gamma correction.
     Formula taken from Wikipedia https://en.wikipedia.org/wiki/SRGB
     """
-    image = image.astype(float) / 255.
-    gamma = ((image + 0.055) / 1.055) ** 2.4
-    scale = image / 12.92
-    image = np.where (image > 0.04045, gamma, scale)
-    return (image * 255).astype(np.uint8)
+    return image_tone(image, tone_srgb_linear)
 
 def linear2sRGB(image: TYPE_IMAGE) -> TYPE_IMAGE:
     """Convert linearRGB to sRGB, applying the gamma correction.
     Formula taken from Wikipedia https://en.wikipedia.org/wiki/SRGB
     """
-    image = image.astype(float) / 255.
-    cutoff = image < 0.0031308
-    higher = 1.055 * pow(image, 1.0 / 2.4) - 0.055
-    lower = image * 12.92
-    image = np.where (image > cutoff, higher, lower)
-    return (image * 255).astype(np.uint8)
+    return image_tone(image, tone_linear_srgb)
 
 # =============================================================================
 # === IMAGE CONVERSION ===
 # =============================================================================
 
+class JOVImage(torch.Tensor):
+    """IMAGE/MASK tensor that also carries the uint8 CV2 matrix of each frame.
+
+    To ComfyUI it is a plain torch.Tensor; every torch operation on it returns an
+    ordinary tensor. Jovimetrix nodes use the cached BGR(A)/GRAY matrix in
+    tensor2cv instead of converting back from float. Any in-place edit of the
+    tensor bumps its version counter and drops the cache.
+    """
+
+    @staticmethod
+    def __new__(cls, tensor: torch.Tensor, image: Optional[list[TYPE_IMAGE]]=None) -> 'JOVImage':
+        obj = torch.Tensor._make_subclass(cls, tensor)
+        obj.cache(image)
+        return obj
+
+    @classmethod
+    def __torch_function__(cls, func, types, args=(), kwargs=None) -> Any:
+        with torch._C.DisableTorchFunctionSubclass():
+            return func(*args, **(kwargs or {}))
+
+    def __deepcopy__(self, memo) -> 'JOVImage':
+        with torch._C.DisableTorchFunctionSubclass():
+            tensor = self.clone()
+        image = self.cv
+        if image is not None:
+            image = [i.copy() for i in image]
+        return JOVImage(tensor, image)
+
+    def __reduce_ex__(self, proto) -> tuple:
+        with torch._C.DisableTorchFunctionSubclass():
+            tensor = self.clone()
+        return (JOVImage, (tensor, self.cv))
+
+    def cache(self, image: Optional[list[TYPE_IMAGE]]) -> None:
+        """Attach one CV2 matrix per frame; None clears the cache."""
+        if image is not None and len(image) != self.shape[0]:
+            image = None
+        self._jov_image = image
+        self._jov_version = self._version
+
+    @property
+    def cv(self) -> Optional[list[TYPE_IMAGE]]:
+        """The cached per-frame CV2 matrices, or None if missing or stale."""
+        if self._jov_image is None or self._version != self._jov_version:
+            return None
+        return self._jov_image
+
+class JOVLazy(torch.Tensor):
+    """IMAGE/RGB/MASK output that only becomes float data when something reads it.
+
+    It holds the uint8 CV2 matrix and the shape of the tensor it stands in for.
+    Shape, size, dtype and device answer from that alone; any other torch
+    operation builds the float tensor once and runs on it. tensor2cv reads the
+    matrix directly, so an output that feeds another Jovimetrix node, or feeds
+    nothing, is never converted at all.
+    """
+
+    # tensor metadata that does not need the pixels
+    META = {
+        torch.Tensor.shape.__get__, torch.Tensor.ndim.__get__,
+        torch.Tensor.dtype.__get__, torch.Tensor.device.__get__,
+        torch.Tensor.is_cuda.__get__, torch.Tensor.requires_grad.__get__,
+        torch.Tensor._version.__get__, torch.Tensor.size, torch.Tensor.dim,
+        torch.Tensor.numel, torch.Tensor.nelement, torch.Tensor.element_size,
+        torch.Tensor.__len__
+    }
+
+    @staticmethod
+    def __new__(cls, shape: tuple[int, ...], factory: Callable[[], torch.Tensor],
+                image: list[TYPE_IMAGE]) -> 'JOVLazy':
+        obj = torch.Tensor._make_wrapper_subclass(cls, shape, dtype=torch.float32, device='cpu')
+        obj._jov_factory = factory
+        obj._jov_image = image
+        obj._jov_tensor = None
+        obj._jov_lock = threading.Lock()
+        return obj
+
+    @classmethod
+    def __torch_function__(cls, func, types, args=(), kwargs=None) -> Any:
+        if func not in cls.META:
+            args, kwargs = cls.resolve((args, kwargs))
+        with torch._C.DisableTorchFunctionSubclass():
+            return func(*args, **(kwargs or {}))
+
+    @classmethod
+    def __torch_dispatch__(cls, func, types, args=(), kwargs=None) -> Any:
+        # reached when another subclass handled the call and passed us along
+        args, kwargs = cls.resolve((args, kwargs))
+        return func(*args, **(kwargs or {}))
+
+    @classmethod
+    def resolve(cls, data: Any) -> Any:
+        """Swap every JOVLazy inside nested args for its float tensor."""
+        if isinstance(data, JOVLazy):
+            return data.materialize()
+        if isinstance(data, (list, tuple)):
+            return type(data)(cls.resolve(x) for x in data)
+        if isinstance(data, dict):
+            return {k: cls.resolve(v) for k, v in data.items()}
+        return data
+
+    def __deepcopy__(self, memo) -> torch.Tensor:
+        return self.materialize().clone()
+
+    def __reduce_ex__(self, proto) -> tuple:
+        return self.materialize().clone().__reduce_ex__(proto)
+
+    @property
+    def ready(self) -> bool:
+        """True once the float tensor exists."""
+        return self._jov_tensor is not None
+
+    def materialize(self) -> torch.Tensor:
+        """The float tensor, built on first use."""
+        with self._jov_lock:
+            if self._jov_tensor is None:
+                self._jov_tensor = self._jov_factory()
+                self._jov_factory = None
+            return self._jov_tensor
+
+    @property
+    def cv(self) -> list[TYPE_IMAGE]:
+        """The per-frame CV2 matrices; they are never stale."""
+        return self._jov_image
+
+class BatchWriter:
+    """Collects the frames of a batch in one contiguous BGRA block.
+
+    The block is sized on the first put: N slots of that frame's size. Every
+    frame of the same size is composited straight into the next free slot and
+    its IMAGE, RGB and MASK outputs are JOVLazy views over it, so the batch is
+    one allocation instead of one per frame. A frame of any other size gets its
+    own buffer, as with cv2tensor_full. Safe to share across the batch pool.
+    """
+    def __init__(self, count: int) -> None:
+        self.__count = max(1, count)
+        self.__block = None
+        self.__next = 0
+        self.__lock = threading.Lock()
+
+    def slot(self, height: int, width: int) -> Optional[TYPE_IMAGE]:
+        """Claim the next free slot for a frame, or None if it does not fit."""
+        with self.__lock:
+            if self.__block is None:
+                # pages are only committed as the slots are written
+                self.__block = np.empty((self.__count, height, width, 4), dtype=np.uint8)
+            if self.__next >= self.__count or self.__block.shape[1:3] != (height, width):
+                return None
+            self.__next += 1
+            return self.__block[self.__next - 1]
+
+    def put(self, image: TYPE_IMAGE, matte:TYPE_PIXEL=0) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """cv2tensor_full into the next slot of the block."""
+        slot = None
+        if image.dtype == np.uint8 and not image_constant(image):
+            slot = self.slot(*image.shape[:2])
+        return cv2tensor_full(image, matte, slot)
+
 def batch_extract(batch: torch.Tensor) -> list[torch.Tensor]:
-    return [img[i:i+1] for img in batch for i in range(img.shape[0])]
+    frames = []
+    for img in batch:
+        cache = img.cv if isinstance(img, (JOVImage, JOVLazy)) else None
+        if cache is None:
+            frames.extend([img[i:i+1] for i in range(img.shape[0])])
+            continue
+        if len(cache) == 1:
+            frames.append(img)
+            continue
+        frames.extend([JOVImage(img[i:i+1], [cache[i]]) for i in range(img.shape[0])])
+    return frames
 
 def bgr2hsv(bgr_color: TYPE_PIXEL) -> TYPE_PIXEL:
     return cv2.cvtColor(np.uint8([[bgr_color]]), cv2.COLOR_BGR2HSV)[0, 0]
@@ -275,7 +435,7 @@ def bgr2hsv(bgr_color: TYPE_PIXEL) -> TYPE_PIXEL:
 def bgr2image(image: TYPE_IMAGE, alpha: TYPE_IMAGE=None, gray: bool=False) -> TYPE_IMAGE:
     """Restore image with alpha, if any, and converting to grayscale (optional)."""
     if gray:
-        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return image_batch_apply(image, cv2.cvtColor, cv2.COLOR_BGR2GRAY)
     return image_mask_add(image, alpha)
 
 def b64_2_tensor(base64str: str) -> torch.Tensor:
@@ -296,23 +456,86 @@ def cv2pil(image: TYPE_IMAGE, chan:EnumImageType=EnumImageType.RGBA) -> Image.Im
     return Image.fromarray(image)
 
 def cv2tensor(image: TYPE_IMAGE) -> torch.Tensor:
-    """Convert a CV2 Matrix to a Torch Tensor."""
-    cc = 1 if len(image.shape) < 3 else image.shape[2]
-    match cc:
-        case 3:
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        case 4:
-            image = cv2.cvtColor(image, cv2.COLOR_BGRA2RGBA)
-        case 1:
-            if len(image.shape) > 2:
-                image = image.squeeze()
-    return torch.from_numpy(image.astype(np.float32) / 255).unsqueeze(0)
+    """Convert a CV2 Matrix to a Torch Tensor.
 
-def cv2tensor_full(image: TYPE_IMAGE, matte:TYPE_PIXEL=0) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
-    mask = image_mask(image)
-    image = image_matte(image, matte)
-    rgb = image_convert(image, 3)
-    return cv2tensor(image), cv2tensor(rgb), cv2tensor(mask)
+    The matrix is kept on the returned JOVImage, so it must not be modified afterwards.
+    A constant matrix (see channel_constant) becomes one pixel expanded over the frame.
+    """
+    cc, w, h = channel_count(image)[:3]
+    if image_constant(image):
+        pixel = cv2tensor(np.ascontiguousarray(image[:1, :1])).as_subclass(torch.Tensor)
+        tensor = pixel.expand((1, h, w) if cc == 1 else (1, h, w, cc))
+        return JOVImage(tensor, [image] if image.dtype == np.uint8 else None)
+
+    image = np.ascontiguousarray(image)
+    if cc == 1:
+        tensor = np.empty((1, h, w), dtype=np.float32)
+        _normalize(image.reshape(h, w), tensor[0])
+    else:
+        tensor = np.empty((1, h, w, cc), dtype=np.float32)
+        _normalize(image, tensor[0], cv2.COLOR_BGRA2RGBA if cc == 4 else cv2.COLOR_BGR2RGB)
+    tensor = torch.from_numpy(tensor)
+    return JOVImage(tensor, [image] if image.dtype == np.uint8 else None)
+
+def cv2tensor_full(image: TYPE_IMAGE, matte:TYPE_PIXEL=0,
+                   out: Optional[TYPE_IMAGE]=None) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """Convert a CV2 Matrix into the IMAGE, RGB and MASK outputs.
+
+    The image is placed atop the matte color and keeps its own alpha. The
+    outputs are JOVLazy: only the ones something reads are converted. Once
+    IMAGE exists, RGB and MASK are views into it; before that each builds
+    just its own channels. out, a BGRA matrix the size of the image, receives
+    the composited frame instead of a new buffer (see BatchWriter). A constant
+    image composites its one pixel and its outputs stay constant.
+    """
+    cc, w, h = channel_count(image)[:3]
+    if image_constant(image):
+        pixel = cv2tensor_full(np.ascontiguousarray(image[:1, :1]), matte)[0].cv[0]
+        image = np.broadcast_to(pixel, (h, w, 4))
+    elif cc != 4:
+        if out is None:
+            image = image_convert(image, 4)
+        else:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGRA if cc == 1 else cv2.COLOR_BGR2BGRA, dst=out)
+    elif image[:,:,3].min() < 255:
+        image = cv2tensor_matte(image, matte, out)
+    elif out is not None:
+        np.copyto(out, image)
+        image = out
+
+    def rgb() -> torch.Tensor:
+        if tensor.ready:
+            return tensor.materialize()[..., :3]
+        return cv2tensor(image[:,:,:3])
+
+    def mask() -> torch.Tensor:
+        if tensor.ready:
+            return tensor.materialize()[..., 3]
+        return cv2tensor(image[:,:,3])
+
+    tensor = JOVLazy((1, h, w, 4), lambda: cv2tensor(image), [image])
+    return tensor, JOVLazy((1, h, w, 3), rgb, [image[:,:,:3]]), \
+        JOVLazy((1, h, w), mask, [image[:,:,3]])
+
+def cv2tensor_matte(image: TYPE_IMAGE, matte:TYPE_PIXEL=0, out: Optional[TYPE_IMAGE]=None) -> TYPE_IMAGE:
+    """Composite a BGRA image atop a solid matte color, keeping the original alpha."""
+    color = channel_solid(1, 1, matte, EnumImageType.BGRA)[0, 0, :3]
+    color = tuple(float(c) for c in color) + (0.,)
+    if out is None:
+        out = np.empty_like(image)
+    h, w = image.shape[:2]
+    step = max(1, CONVERT_CHUNK // w)
+    for y in range(0, h, step):
+        src = image[y:y+step]
+        alpha = cv2.mixChannels([src], [np.empty(src.shape[:2] + (3,), np.uint8)], [3, 0, 3, 1, 3, 2])[0]
+        # alpha / 255 as float32, the same values numpy gives
+        alpha = cv2.LUT(alpha, _MATTE_UNIT)
+        buf = cv2.subtract(cv2.cvtColor(src, cv2.COLOR_BGRA2BGR), color, dtype=cv2.CV_32F)
+        cv2.multiply(buf, alpha, dst=buf)
+        cv2.add(buf, color, dst=buf)
+        # rounds half to even like np.rint; the blend stays inside 0..255
+        cv2.mixChannels([cv2.convertScaleAbs(buf), src], [out[y:y+step]], [0, 0, 1, 1, 2, 2, 6, 3])
+    return out
 
 def hsv2bgr(hsl_color: TYPE_PIXEL) -> TYPE_PIXEL:
     return cv2.cvtColor(np.uint8([[hsl_color]]), cv2.COLOR_HSV2BGR)[0, 0]
@@ -323,9 +546,9 @@ def image2bgr(image: TYPE_IMAGE) -> tuple[int, TYPE_IMAGE, TYPE_IMAGE]:
     """
     alpha = image_mask(image)
     if (cc := channel_count(image)[0]) == 1:
-        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
-    elif (cc := channel_count(image)[0]) == 4:
-        image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+        image = image_batch_apply(image, cv2.cvtColor, cv2.COLOR_GRAY2BGR)
+    elif cc == 4:
+        image = image_batch_apply(image, cv2.cvtColor, cv2.COLOR_BGRA2BGR)
     return image, alpha, cc
 
 def pil2cv(image: Image.Image, chan:EnumImageType=EnumImageType.BGRA) -> TYPE_IMAGE:
@@ -357,39 +580,112 @@ def pil2tensor(image: Image.Image) -> torch.Tensor:
     """Convert a PIL Image to a Torch Tensor."""
     return torch.from_numpy(np.array(image).astype(np.float32) / 255).unsqueeze(0)
 
+def cv_cached(image: TYPE_IMAGE, chan:EnumImageType=EnumImageType.BGRA) -> TYPE_IMAGE:
+    """Convert a cached BGR(A)/GRAY CV2 matrix into a new matrix of the chosen type."""
+    cc = 1 if len(image.shape) < 3 else image.shape[2]
+    if cc == 1 and len(image.shape) > 2:
+        image = image[:,:,0]
+    match chan:
+        case EnumImageType.BGRA:
+            mode = {1: cv2.COLOR_GRAY2BGRA, 3: cv2.COLOR_BGR2BGRA}.get(cc)
+        case EnumImageType.RGBA:
+            mode = {1: cv2.COLOR_GRAY2RGBA, 3: cv2.COLOR_BGR2RGBA, 4: cv2.COLOR_BGRA2RGBA}[cc]
+        case EnumImageType.BGR:
+            mode = {1: cv2.COLOR_GRAY2BGR, 4: cv2.COLOR_BGRA2BGR}.get(cc)
+        case EnumImageType.RGB:
+            mode = {1: cv2.COLOR_GRAY2RGB, 3: cv2.COLOR_BGR2RGB, 4: cv2.COLOR_BGRA2RGB}[cc]
+        case _:
+            mode = {3: cv2.COLOR_BGR2GRAY, 4: cv2.COLOR_BGRA2GRAY}.get(cc)
+            image = image.copy() if mode is None else cv2.cvtColor(np.ascontiguousarray(image), mode)
+            return np.expand_dims(image, -1)
+    if mode is None:
+        return image.copy()
+    return cv2.cvtColor(np.ascontiguousarray(image), mode)
+
+# pixels converted per step through the per-thread scratch buffers
+CONVERT_CHUNK = 65536
+_CONVERT_SCRATCH = threading.local()
+
+# alpha byte to its float32 weight, for cv2tensor_matte
+_MATTE_UNIT = np.arange(256, dtype=np.float32) / np.float32(255)
+
+def _scratch(name: str, shape: tuple[int, ...], dtype=np.float32) -> np.ndarray:
+    """Per-thread scratch buffer, grown as needed and reused between frames."""
+    size = int(np.prod(shape))
+    buf = getattr(_CONVERT_SCRATCH, name, None)
+    if buf is None or buf.size < size:
+        buf = np.empty(size, dtype=dtype)
+        setattr(_CONVERT_SCRATCH, name, buf)
+    return buf[:size].reshape(shape)
+
+def _quantize(src: np.ndarray, dst: np.ndarray, code:int=None) -> None:
+    """Scale float [0..1] into uint8 [0..255] (clip + truncate) straight into dst.
+
+    The channel swap (code) is done by cv2 per chunk into the destination rows, so
+    only a small per-thread scratch is used, never a full intermediate frame.
+    """
+    h, w = src.shape[:2]
+    step = max(1, CONVERT_CHUNK // w)
+    for y in range(0, h, step):
+        s = src[y:y+step]
+        buf = _scratch('float', s.shape)
+        np.multiply(s, np.float32(255), out=buf)
+        np.clip(buf, 0, 255, out=buf)
+        if code is None:
+            np.copyto(dst[y:y+step], buf, casting='unsafe')
+            continue
+        chunk = _scratch('uint8', s.shape, np.uint8)
+        np.copyto(chunk, buf, casting='unsafe')
+        cv2.cvtColor(chunk, code, dst=dst[y:y+step])
+
+def _normalize(src: np.ndarray, dst: np.ndarray, code:int=None) -> None:
+    """Scale uint8 [0..255] into float [0..1] straight into dst, see _quantize."""
+    if code is None:
+        np.divide(src, np.float32(255), out=dst)
+        return
+    h, w = src.shape[:2]
+    step = max(1, CONVERT_CHUNK // w)
+    for y in range(0, h, step):
+        s = src[y:y+step]
+        chunk = _scratch('uint8', dst[y:y+step].shape, np.uint8)
+        cv2.cvtColor(s, code, dst=chunk)
+        np.divide(chunk, np.float32(255), out=dst[y:y+step])
+
+# cv2 conversion (RGB(A) source channels -> target) used by tensor2cv
+_TENSOR2CV = {
+    EnumImageType.BGRA: (4, {1: cv2.COLOR_GRAY2BGRA, 3: cv2.COLOR_RGB2BGRA, 4: cv2.COLOR_RGBA2BGRA}),
+    EnumImageType.RGBA: (4, {1: cv2.COLOR_GRAY2RGBA, 3: cv2.COLOR_RGB2RGBA}),
+    EnumImageType.BGR: (3, {1: cv2.COLOR_GRAY2BGR, 3: cv2.COLOR_RGB2BGR, 4: cv2.COLOR_RGBA2BGR}),
+    EnumImageType.RGB: (3, {1: cv2.COLOR_GRAY2RGB, 4: cv2.COLOR_RGBA2RGB}),
+    EnumImageType.GRAYSCALE: (1, {3: cv2.COLOR_RGB2GRAY, 4: cv2.COLOR_RGBA2GRAY}),
+}
+
 def tensor2cv(tensor: torch.Tensor, chan:EnumImageType=EnumImageType.BGRA) -> TYPE_IMAGE:
     if not isinstance(tensor, (torch.Tensor,)):
         return channel_solid(MIN_IMAGE_SIZE, MIN_IMAGE_SIZE, (0, 0, 0, 255))
-    image = np.clip(tensor.squeeze().cpu().numpy() * 255, 0, 255).astype(np.uint8)
-    cc = 1 if len(image.shape) < 3 else image.shape[2]
-    if chan == EnumImageType.BGRA:
-        if cc == 4:
-            return cv2.cvtColor(image, cv2.COLOR_RGBA2BGRA)
-        elif cc == 3:
-            return cv2.cvtColor(image, cv2.COLOR_RGB2BGRA)
-        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGRA)
-    elif chan == EnumImageType.RGBA:
-        if cc == 3:
-            return cv2.cvtColor(image, cv2.COLOR_RGB2RGBA)
-        elif cc == 1:
-            return cv2.cvtColor(image, cv2.COLOR_GRAY2RGBA)
-    elif chan == EnumImageType.BGR:
-        if cc == 4:
-            return cv2.cvtColor(image, cv2.COLOR_RGBA2BGR)
-        elif cc == 3:
-            return cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
-    elif chan == EnumImageType.RGB:
-        if cc == 4:
-            return cv2.cvtColor(image, cv2.COLOR_RGBA2RGB)
-        elif cc == 1:
-            return cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
-    elif chan == EnumImageType.GRAYSCALE:
-        if cc == 4:
-            image = cv2.cvtColor(image, cv2.COLOR_RGBA2GRAY)
-        elif cc == 3:
-            image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-    return np.expand_dims(image, -1)
+    if isinstance(tensor, JOVLazy) and len(tensor.cv) == 1:
+        return cv_cached(tensor.cv[0], chan)
+    if isinstance(tensor, JOVImage):
+        if (cache := tensor.cv) is not None and len(cache) == 1:
+            return cv_cached(cache[0], chan)
+        if tensor.shape[0] == 1:
+            image = tensor2cv(tensor.as_subclass(torch.Tensor), EnumImageType.BGRA)
+            tensor.cache([image])
+            return cv_cached(image, chan)
+
+    tensor = tensor.detach().cpu()
+    if tensor.dtype != torch.float32:
+        tensor = tensor.float()
+    # the float data is read in place, not copied
+    frame = np.squeeze(tensor.numpy())
+    cc = 1 if frame.ndim < 3 else frame.shape[2]
+    h, w = frame.shape[:2]
+    if cc == 1:
+        frame = frame.reshape(h, w)
+    size, codes = _TENSOR2CV.get(chan, _TENSOR2CV[EnumImageType.GRAYSCALE])
+    image = np.empty((h, w, size) if size > 1 else (h, w), dtype=np.uint8)
+    _quantize(frame, image, codes.get(cc))
+    return image if size > 1 else np.expand_dims(image, -1)
 
 def tensor2pil(tensor: torch.Tensor) -> Image.Image:
     """Convert a torch Tensor to a PIL Image."""
@@ -405,6 +701,7 @@ def tensor2pil(tensor: torch.Tensor) -> Image.Image:
 # === PIXEL ===
 # =============================================================================
 
+@prepare
 def pixel_eval(color: TYPE_PIXEL,
             target: EnumImageType=EnumImageType.BGR,
             precision:EnumIntFloat=EnumIntFloat.INT,
@@ -489,9 +786,16 @@ def pixel_convert(color:TYPE_PIXEL, size:int=4, alpha:int=255) -> TYPE_PIXEL:
 # === CHANNEL ===
 # =============================================================================
 
+def image_constant(image:TYPE_IMAGE) -> bool:
+    """True for a frame that is one pixel broadcast over its width and height."""
+    if image.ndim not in (2, 3) or image.shape[0] * image.shape[1] < 2:
+        return False
+    return all(n == 1 or step == 0 for n, step in zip(image.shape[:2], image.strides[:2]))
+
 def channel_count(image:TYPE_IMAGE) -> tuple[int, int, int, EnumImageType]:
-    h, w = image.shape[:2]
-    size = image.shape[2] if len(image.shape) > 2 else 1
+    """Channels, width, height and mode of a frame or a (N,H,W,C) batch."""
+    h, w = image.shape[1:3] if image.ndim == 4 else image.shape[:2]
+    size = image.shape[-1] if len(image.shape) > 2 else 1
     if size == 4:
         mode = EnumImageType.BGRA
         if type(image) == Image:
@@ -510,36 +814,48 @@ def channel_add(image:TYPE_IMAGE, color:TYPE_PIXEL=255) -> TYPE_IMAGE:
     new = channel_solid(w, h, color, EnumImageType.GRAYSCALE)
     return np.concatenate([image, new], axis=-1)
 
-def channel_solid(width:int, height:int, color:TYPE_PIXEL=(0, 0, 0, 0),
-                  chan:EnumImageType=EnumImageType.BGR) -> TYPE_IMAGE:
+def channel_constant(width:int, height:int, color:TYPE_PIXEL=(0, 0, 0, 0),
+                     chan:EnumImageType=EnumImageType.BGR) -> TYPE_IMAGE:
+    """A solid color frame that holds one pixel.
 
+    The frame is a read-only broadcast view of a 1x1 pixel, so it costs no
+    memory however large it is. cv2 and numpy read it like any other matrix,
+    and cv2tensor_full keeps it constant all the way to the output tensors.
+    Writing to it raises; draw on channel_solid or a copy instead.
+    """
     if chan == EnumImageType.GRAYSCALE:
         color = pixel_eval(color, EnumImageType.GRAYSCALE)
-        return np.full((height, width, 1), color, dtype=np.uint8)
+        return np.broadcast_to(np.uint8(color), (height, width, 1))
 
     if not type(color) in [list, set, tuple]:
         color = [color]
+    color = tuple(color)
     if len(color) < 3:
         color += (0,) * (3 - len(color))
     if chan in [EnumImageType.BGR, EnumImageType.RGB]:
         if chan == EnumImageType.RGB:
             color = color[2::-1]
-        return np.full((height, width, 3), color[:3], dtype=np.uint8)
+        return np.broadcast_to(np.array(color[:3], dtype=np.uint8), (height, width, 3))
 
     if len(color) < 4:
         color += (255,)
 
     if chan == EnumImageType.RGBA:
-        color = color[2::-1]
-    return np.full((height, width, 4), color, dtype=np.uint8)
+        color = color[2::-1] + color[3:4]
+    return np.broadcast_to(np.array(color[:4], dtype=np.uint8), (height, width, 4))
+
+def channel_solid(width:int, height:int, color:TYPE_PIXEL=(0, 0, 0, 0),
+                  chan:EnumImageType=EnumImageType.BGR) -> TYPE_IMAGE:
+    """A writable solid color frame, see channel_constant."""
+    return channel_constant(width, height, color, chan).copy()
 
 def channel_merge(channel:list[TYPE_IMAGE]) -> TYPE_IMAGE:
     ch = [c.shape[:2] if c is not None else (0, 0) for c in channel[:3]]
     w = max([c[1] for c in ch])
     h = max([c[0] for c in ch])
-    ch = [np.zeros((h, w), dtype=np.uint8) if c is None else c for c in channel[:3]]
+    ch = [channel_constant(w, h, 0, EnumImageType.GRAYSCALE)[:,:,0] if c is None else c for c in channel[:3]]
     if len(channel) == 4:
-        a = channel[3] if len(channel) == 4 else np.full((h, w), 255, dtype=np.uint8)
+        a = channel[3] if len(channel) == 4 else channel_constant(w, h, 255, EnumImageType.GRAYSCALE)[:,:,0]
         ch.append(a)
     return cv2.merge(ch)
 
@@ -555,7 +871,123 @@ def channel_swap(image:TYPE_IMAGE, swap:EnumPixelSwap, matte:TYPE_PIXEL=0) -> TY
             return image[:,:,3]
         case EnumPixelSwap.SOLID:
             h, w = image.shape[:2]
-            return channel_solid(w, h, matte, EnumImageType.GRAYSCALE)[:,:,0]
+            return channel_constant(w, h, matte, EnumImageType.GRAYSCALE)[:,:,0]
+
+# =============================================================================
+# === BATCH ===
+# =============================================================================
+
+# pixels per batched kernel call, to bound the working set of a frame stack
+IMAGE_BATCH_CHUNK = 2 ** 24
+
+def image_batch_param(value: Any, image: TYPE_IMAGE, dims: int=3,
+                      dtype=np.float64) -> np.ndarray:
+    """Shape a scalar, or a per-frame list of scalars, to broadcast over an image.
+
+    Single frames (H,W,C) use the first value, shaped (1,). Batches (N,H,W,C)
+    get one value per frame shaped (N,) + (1,) * dims. Use dims=2 against a
+    single channel slice such as image[..., 0].
+    """
+    value = np.asarray(value, dtype=dtype).ravel()
+    if image.ndim < 4:
+        return value[:1]
+    value = np.broadcast_to(value, (image.shape[0],))
+    return value.reshape((-1,) + (1,) * dims)
+
+def image_batch_apply(image: TYPE_IMAGE, func: Callable, *arg, **kw) -> TYPE_IMAGE:
+    """Run a per-pixel CV2 call on a frame, or once on a (N,H,W,C) batch.
+
+    A batch is handed to the call as one tall (N*H,W,C) mosaic so the whole
+    stack costs a single call. Only use this with functions that do not look
+    at neighbouring pixels. Single channel batch results come back (N,H,W,1).
+    """
+    if image.ndim < 4:
+        return func(image, *arg, **kw)
+    count, height = image.shape[:2]
+    mosaic = np.ascontiguousarray(image).reshape((count * height,) + image.shape[2:])
+    result = func(mosaic, *arg, **kw)
+    result = result.reshape((count, height) + result.shape[1:])
+    if result.ndim == 3:
+        result = np.expand_dims(result, -1)
+    return result
+
+# =============================================================================
+# === TONE ===
+# =============================================================================
+
+# Tone curves map each channel value on its own: they take the values (uint8
+# codes or float32 on the same 0..255 scale) and return the new ones unclipped.
+
+def tone_contrast(x: np.ndarray, mean: float, value: float) -> np.ndarray:
+    return (x - mean) * value + mean
+
+def tone_exposure(x: np.ndarray, value: float) -> np.ndarray:
+    return x * value
+
+def tone_gamma(x: np.ndarray, value: float) -> np.ndarray:
+    if value <= 0:
+        return x * 0.
+    return cv2.pow(x / 255, 1.0 / max(0.000001, value)) * 255
+
+def tone_levels(x: np.ndarray, black: float, white: float, gamma: float) -> np.ndarray:
+    black, white, gamma = np.float32(black), np.float32(white), np.float32(gamma)
+    x = np.clip((x - black) / (white - black), 0, 255)
+    return x ** (1 / gamma) * np.float32(255)
+
+def tone_posterize(x: np.ndarray, levels: float) -> np.ndarray:
+    divisor = 256 / min(256, max(2, levels))
+    return np.floor(x / divisor) * math.trunc(divisor)
+
+def tone_srgb_linear(x: np.ndarray) -> np.ndarray:
+    x = x / 255.
+    return np.where(x > 0.04045, ((x + 0.055) / 1.055) ** 2.4, x / 12.92) * 255
+
+def tone_linear_srgb(x: np.ndarray) -> np.ndarray:
+    x = x / 255.
+    return np.where(x > 0.0031308, 1.055 * x ** (1.0 / 2.4) - 0.055, x * 12.92) * 255
+
+@prepare
+def tone_table(curve: Callable, *param) -> np.ndarray:
+    """256 entry uint8 lookup of a tone curve for one parameter set.
+
+    The curve runs over the uint8 codes themselves, so every entry is exactly
+    what the per-pixel math would give (clip, then truncate).
+    """
+    table = curve(np.arange(256, dtype=np.uint8), *param)
+    return np.clip(table, 0, 255).astype(np.uint8)
+
+def image_tone(image: TYPE_IMAGE, curve: Callable, *param) -> TYPE_IMAGE:
+    """Run a tone curve over every channel of a frame or (N,H,W,C) batch.
+
+    Parameters are scalars or per-frame lists. uint8 frames cost one cv2.LUT
+    each through tone_table; a batch sharing its parameters is one call. Float
+    frames (0..1) come back as a new float32 array, CONVERT_CHUNK pixels of
+    curve math at a time; the source is only read, so read-only and
+    broadcast frames work too.
+    """
+    param = [image_batch_param(p, image).ravel().tolist() for p in param]
+    if image.dtype != np.uint8:
+        out = np.empty(image.shape, dtype=np.float32)
+        frames = zip([image], [out]) if image.ndim < 4 else zip(image, out)
+        for idx, (frame, dst) in enumerate(frames):
+            arg = [p[idx] for p in param]
+            step = max(1, CONVERT_CHUNK // frame.shape[1])
+            for y in range(0, frame.shape[0], step):
+                rows = dst[y:y+step]
+                np.multiply(frame[y:y+step], 255, out=rows)
+                rows[:] = curve(rows, *arg)
+                np.clip(rows, 0, 255, out=rows)
+                rows /= 255
+        return out
+
+    if image.ndim < 4 or all(len(set(p)) == 1 for p in param):
+        table = tone_table(curve, *[p[0] for p in param])
+        return image_batch_apply(image, cv2.LUT, table).reshape(image.shape)
+    out = np.empty_like(image)
+    for idx, frame in enumerate(image):
+        table = tone_table(curve, *[p[idx] for p in param])
+        out[idx] = cv2.LUT(frame, table).reshape(frame.shape)
+    return out
 
 # =============================================================================
 # === EXPLICIT SHAPE FUNCTIONS ===
@@ -586,6 +1018,155 @@ def shape_polygon(width: int, height: int, size: float=1., sides: int=3, fill:TY
     d.regular_polygon(xy, sides, fill=fill)
     return image
 
+# =============================================================================
+# === BLEND ===
+# =============================================================================
+
+# luminosity weights for the non-separable modes in BGR (CV2) and RGB order
+BLEND_LUM_BGR = (0.114, 0.587, 0.299)
+BLEND_LUM_RGB = (0.299, 0.587, 0.114)
+
+# pixels blended per call for batches, to bound the float32 working set
+BLEND_CHUNK = 2 ** 24
+
+def _blend_lum(color: np.ndarray, weight: tuple[float, float, float]) -> np.ndarray:
+    return color[..., 0] * weight[0] + color[..., 1] * weight[1] + color[..., 2] * weight[2]
+
+def _blend_min(color: np.ndarray) -> np.ndarray:
+    return np.minimum(np.minimum(color[..., 0], color[..., 1]), color[..., 2])[..., None]
+
+def _blend_max(color: np.ndarray) -> np.ndarray:
+    return np.maximum(np.maximum(color[..., 0], color[..., 1]), color[..., 2])[..., None]
+
+def _blend_sat(color: np.ndarray) -> np.ndarray:
+    return (_blend_max(color) - _blend_min(color))[..., 0]
+
+def _blend_set_lum(color: np.ndarray, lum: np.ndarray, weight: tuple[float, float, float]) -> np.ndarray:
+    color = color + (lum - _blend_lum(color, weight))[..., None]
+    lum = _blend_lum(color, weight)[..., None]
+    low = _blend_min(color)
+    high = _blend_max(color)
+    color = np.where(low < 0, lum + (color - lum) * lum / (lum - low), color)
+    return np.where(high > 1, lum + (color - lum) * (1 - lum) / (high - lum), color)
+
+def _blend_set_sat(color: np.ndarray, sat: np.ndarray) -> np.ndarray:
+    low = _blend_min(color)
+    size = _blend_max(color) - low
+    return np.where(size > 0, (color - low) * sat[..., None] / size, 0)
+
+def _blend_burn(b: np.ndarray, f: np.ndarray) -> np.ndarray:
+    return np.where(f != 0, np.maximum(1 - (1 - b) / f, 0), 0)
+
+def _blend_dodge(b: np.ndarray, f: np.ndarray) -> np.ndarray:
+    return np.where(f != 1, np.minimum(b / (1 - f), 1), 1)
+
+def _blend_xor(b: np.ndarray, f: np.ndarray) -> np.ndarray:
+    b = np.clip(np.rint(b * 255), 0, 255).astype(np.uint8)
+    f = np.clip(np.rint(f * 255), 0, 255).astype(np.uint8)
+    return (b ^ f).astype(np.float32) / 255
+
+# separable and non-separable color modes: (background, foreground, lum weights)
+_BLEND_OP = {
+    BlendType.NORMAL: lambda b, f, w: f,
+    BlendType.MULTIPLY: lambda b, f, w: np.clip(f * b, 0, 1),
+    BlendType.ADDITIVE: lambda b, f, w: np.minimum(b + f, 1),
+    BlendType.COLOURBURN: lambda b, f, w: _blend_burn(b, f),
+    BlendType.COLOURDODGE: lambda b, f, w: _blend_dodge(b, f),
+    BlendType.REFLECT: lambda b, f, w: np.where(f != 1, np.minimum(b * b / (1 - f), 1), 1),
+    BlendType.GLOW: lambda b, f, w: np.where(b != 1, np.minimum(f * f / (1 - b), 1), 1),
+    BlendType.OVERLAY: lambda b, f, w: np.where(b < 0.5, 2 * b * f, 1 - 2 * (1 - b) * (1 - f)),
+    BlendType.DIFFERENCE: lambda b, f, w: np.abs(b - f),
+    BlendType.NEGATION: lambda b, f, w: np.maximum(b - f, 0),
+    BlendType.LIGHTEN: lambda b, f, w: np.maximum(b, f),
+    BlendType.DARKEN: lambda b, f, w: np.minimum(b, f),
+    BlendType.SCREEN: lambda b, f, w: b + f - b * f,
+    BlendType.XOR: lambda b, f, w: _blend_xor(b, f),
+    BlendType.SOFTLIGHT: lambda b, f, w: (1 - b) * b * f + b * (1 - (1 - b) * (1 - f)),
+    BlendType.HARDLIGHT: lambda b, f, w: np.where(f < 0.5, np.minimum(b * 2 * f, 1),
+                                                  np.minimum(1 - (1 - b) * (1 - (f - 0.5) * 2), 1)),
+    BlendType.GRAINEXTRACT: lambda b, f, w: np.clip(b - f + 0.5, 0, 1),
+    BlendType.GRAINMERGE: lambda b, f, w: np.clip(b + f - 0.5, 0, 1),
+    BlendType.DIVIDE: lambda b, f, w: np.minimum((256. / 255. * b) / (1. / 255. + f), 1),
+    BlendType.PINLIGHT: lambda b, f, w: np.where(f < 0.5, np.minimum(b, 2 * f), np.maximum(b, 2 * (f - 0.5))),
+    BlendType.VIVIDLIGHT: lambda b, f, w: np.where(f < 0.5, _blend_burn(b, f * 2), _blend_dodge(b, 2 * (f - 0.5))),
+    BlendType.EXCLUSION: lambda b, f, w: b + f - 2 * b * f,
+    BlendType.HUE: lambda b, f, w: _blend_set_lum(_blend_set_sat(f, _blend_sat(b)), _blend_lum(b, w), w),
+    BlendType.SATURATION: lambda b, f, w: _blend_set_lum(_blend_set_sat(b, _blend_sat(f)), _blend_lum(b, w), w),
+    BlendType.COLOUR: lambda b, f, w: _blend_set_lum(f, _blend_lum(b, w), w),
+    BlendType.LUMINOSITY: lambda b, f, w: _blend_set_lum(b, _blend_lum(f, w), w),
+}
+
+def _blend_chunk(lower: np.ndarray, upper: np.ndarray, blendOp:BlendType, alpha:float,
+                 weight:tuple[float, float, float], out: np.ndarray) -> None:
+    """Blend one (P,4) float32 run of pixels into out."""
+    la = lower[:, 3]
+    ua = upper[:, 3] * alpha
+    b = lower[:, :3]
+    f = upper[:, :3]
+    match blendOp:
+        case BlendType.DESTIN:
+            top = la * ua
+            rgb = b * (top / top)[:, None]
+        case BlendType.DESTOUT:
+            top = la * (1 - ua)
+            rgb = b * (top / top)[:, None]
+        case BlendType.SRCATOP:
+            top = la
+            rgb = ((ua * la)[:, None] * f + (la * (1 - ua))[:, None] * b) / top[:, None]
+        case BlendType.DESTATOP:
+            top = ua
+            rgb = ((ua * (1 - la))[:, None] * f + (la * ua)[:, None] * b) / top[:, None]
+        case _:
+            top = ua + la - ua * la
+            func = _BLEND_OP.get(blendOp, _BLEND_OP[BlendType.NORMAL])
+            rgb = func(b, f, weight) * (la * ua)[:, None]
+            rgb += ((1 - ua) * la)[:, None] * b
+            rgb += ((1 - la) * ua)[:, None] * f
+            rgb /= top[:, None]
+    out[:, :3] = rgb
+    out[:, 3] = top
+
+def blend_array(lower: np.ndarray, upper: np.ndarray, blendOp:BlendType=BlendType.NORMAL,
+                alpha:float|list[float]=1., weight:tuple[float, float, float]=BLEND_LUM_BGR) -> np.ndarray:
+    """Blend upper atop lower, both (..., 4) with straight alpha.
+
+    Works on single frames (H,W,4) or whole batches (N,H,W,4); alpha is the
+    opacity of upper, a scalar or one value per frame. uint8 input returns uint8,
+    float input (0..1) returns float32. Mirrors blendmodes.blendLayers.
+    """
+    if isinstance(blendOp, EnumBlendType):
+        blendOp = blendOp.value
+    blendOp = BlendType(blendOp)
+    dtype = lower.dtype
+    shape = lower.shape
+    count = int(np.prod(shape[:-3])) if len(shape) > 3 else 1
+    lower = np.ascontiguousarray(lower).reshape(count, -1, 4)
+    upper = np.ascontiguousarray(upper).reshape(count, -1, 4)
+    alpha = np.broadcast_to(np.clip(np.asarray(alpha, dtype=np.float32), 0, 1).ravel(), (count,))
+    image = np.empty(lower.shape, dtype=dtype if dtype == np.uint8 else np.float32)
+    size = lower.shape[1]
+    step = CONVERT_CHUNK
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for idx in range(count):
+            for start in range(0, size, step):
+                lo = lower[idx, start:start+step]
+                up = upper[idx, start:start+step]
+                if dtype == np.uint8:
+                    lo = lo.astype(np.float32) / 255
+                    up = up.astype(np.float32) / 255
+                else:
+                    lo = lo.astype(np.float32, copy=False)
+                    up = up.astype(np.float32, copy=False)
+                out = _scratch('blend', lo.shape)
+                _blend_chunk(lo, up, blendOp, alpha[idx], weight, out)
+                np.nan_to_num(out, copy=False, nan=0, posinf=0, neginf=0)
+                np.clip(out, 0, 1, out=out)
+                if dtype == np.uint8:
+                    out *= 255
+                    np.rint(out, out=out)
+                np.copyto(image[idx, start:start+step], out, casting='unsafe')
+    return image.reshape(shape)
+
 # =============================================================================
 # === IMAGE ===
 # =============================================================================
@@ -598,12 +1179,87 @@ def image_affine_edge(image: TYPE_IMAGE, callback: object, edge: EnumEdge=EnumEd
     image = image_crop_center(image, width, height)
     return image
 
-def image_blend(imageA: TYPE_IMAGE, imageB: TYPE_IMAGE, mask:Optional[TYPE_IMAGE]=None,
-                blendOp:BlendType=BlendType.NORMAL, alpha:float=1) -> TYPE_IMAGE:
+def image_affine_matrix(width: int, height: int, offset:TYPE_COORD=(0.0, 0.0), angle:float=0,
+                        scale:TYPE_COORD=(1.0, 1.0), edge:EnumEdge=EnumEdge.CLIP) -> tuple[np.ndarray, tuple[int, int]]:
+    """The flip, scale, rotate and translate of image_transform as one 2x3 matrix.
 
+    Negative scales flip. A CLIP frame takes the scaled size, as a resize
+    would; wrapped frames keep their size and scale about the center. The
+    rotation is about the center of the result and the offset is a fraction
+    of its size. Returns the matrix and the (width, height) to warp into.
+    """
+    sX, sY = scale
+    M = np.eye(3)
+    if sX < 0:
+        M = np.array([[-1, 0, width - 1], [0, 1, 0], [0, 0, 1]]) @ M
+        sX = -sX
+    if sY < 0:
+        M = np.array([[1, 0, 0], [0, -1, height - 1], [0, 0, 1]]) @ M
+        sY = -sY
+    if edge == EnumEdge.CLIP:
+        w, h = max(1, int(width * sX)), max(1, int(height * sY))
+        # pixel centers line up the way cv2.resize lines them up
+        sX, sY = w / width, h / height
+        S = np.array([[sX, 0, (sX - 1) / 2], [0, sY, (sY - 1) / 2], [0, 0, 1]])
+    else:
+        w, h = width, height
+        cx, cy = (width - 1) / 2, (height - 1) / 2
+        S = np.array([[sX, 0, cx * (1 - sX)], [0, sY, cy * (1 - sY)], [0, 0, 1]])
+    M = S @ M
+    if angle != 0:
+        R = cv2.getRotationMatrix2D((int(w * 0.5), int(h * 0.5)), -angle, 1.0)
+        M = np.vstack([R, [0, 0, 1]]) @ M
+    M[0, 2] += offset[0] * w
+    M[1, 2] += offset[1] * h
+    return M[:2], (w, h)
+
+# warpAffine has no area or exact variants, and its Lanczos is a full 8x8
+# kernel at several times the cost of a separable resize; one cubic pass
+# stays sharper than the resize then linear rotate it replaces
+_WARP_SAMPLE = {
+    EnumInterpolation.LANCZOS4: EnumInterpolation.CUBIC,
+    EnumInterpolation.AREA: EnumInterpolation.LINEAR,
+    EnumInterpolation.LINEAR_EXACT: EnumInterpolation.LINEAR,
+    EnumInterpolation.NEAREST_EXACT: EnumInterpolation.NEAREST,
+}
+
+def image_affine_warp(image: TYPE_IMAGE, matrix: np.ndarray, size: tuple[int, int],
+                      sample:EnumInterpolation=EnumInterpolation.LINEAR,
+                      edge:EnumEdge=EnumEdge.CLIP) -> TYPE_IMAGE:
+    """Resample a frame once through a 2x3 matrix into size (width, height).
+
+    Outside the source is black for CLIP and tiles for WRAP, straight from the
+    warp's border mode, so nothing is padded. WRAPX and WRAPY tile along one
+    axis and black out what falls off the other. A (N,H,W,C) batch takes one
+    shared matrix or an (N,2,3) stack, one per frame.
+    """
+    if image.ndim == 4:
+        matrix = np.broadcast_to(matrix, (len(image), 2, 3))
+        return np.stack([image_affine_warp(frame, m, size, sample, edge)
+                         for frame, m in zip(image, matrix)])
+
+    flags = _WARP_SAMPLE.get(sample, sample).value
+    if edge == EnumEdge.CLIP:
+        return cv2.warpAffine(image, matrix, size, flags=flags, borderMode=cv2.BORDER_CONSTANT)
+    image_out = cv2.warpAffine(image, matrix, size, flags=flags, borderMode=cv2.BORDER_WRAP)
+    if edge == EnumEdge.WRAP:
+        return image_out
+
+    # where each output pixel reads from, along the axis that does not tile
+    height, width = image.shape[:2]
+    axis, limit = (1, height) if edge == EnumEdge.WRAPX else (0, width)
+    inv = cv2.invertAffineTransform(np.asarray(matrix, dtype=np.float64))[axis]
+    x = np.arange(size[0], dtype=np.float32)
+    y = np.arange(size[1], dtype=np.float32)[:, None]
+    src = inv[0] * x + inv[1] * y + inv[2]
+    image_out[(src < -0.5) | (src > limit - 0.5)] = 0
+    return image_out
+
+def image_blend_prep(imageA: TYPE_IMAGE, imageB: TYPE_IMAGE,
+                     mask:Optional[TYPE_IMAGE]=None) -> tuple[TYPE_IMAGE, TYPE_IMAGE]:
+    """Fit B (and the mask) to A, both BGRA, ready for blend_array."""
     h, w = imageA.shape[:2]
     imageA = image_convert(imageA, 4)
-    imageA = cv2pil(imageA)
     imageB = image_convert(imageB, 4)
     imageB = image_crop_center(imageB, w, h)
     imageB = image_matte(imageB, (0,0,0,0), w, h)
@@ -614,45 +1270,216 @@ def image_blend(imageA: TYPE_IMAGE, imageB: TYPE_IMAGE, mask:Optional[TYPE_IMAGE
         mask = image_convert(mask, 1)
         old_mask = cv2.bitwise_and(mask, old_mask)
     imageB[:,:,3] = old_mask
-    imageB = cv2pil(imageB)
-    image = blendLayers(imageA, imageB, blendOp.value, np.clip(alpha, 0, 1))
-    image = pil2cv(image)
-    return image_crop_center(image, w, h)
+    return imageA, imageB
 
-def image_color_blind(image: TYPE_IMAGE, deficiency:EnumCBDefiency,
-                      simulator:EnumCBSimulator=EnumCBSimulator.AUTOSELECT,
-                      severity:float=1.0) -> TYPE_IMAGE:
+def image_blend(imageA: TYPE_IMAGE, imageB: TYPE_IMAGE, mask:Optional[TYPE_IMAGE]=None,
+                blendOp:BlendType=BlendType.NORMAL, alpha:float=1) -> TYPE_IMAGE:
 
-    if (cc := channel_count(image)[0]) == 4:
-        mask = image_mask(image)
-    image = image_convert(image, 3)
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    imageA, imageB = image_blend_prep(imageA, imageB, mask)
+    return blend_array(imageA, imageB, blendOp, alpha)
+
+def image_composite(layers: list[tuple[TYPE_IMAGE, Optional[TYPE_IMAGE], BlendType, float, TYPE_COORD]],
+                    width: int, height: int, matte:TYPE_PIXEL=(0,0,0,0),
+                    premultiply:bool=False) -> TYPE_IMAGE:
+    """Composite layers, bottom to top, into a single BGRA canvas.
+
+    Each layer is (image, mask, blend operation, opacity, offset). Layers are
+    centered on the canvas and then moved by offset, a fraction of the canvas size.
+    All layers accumulate into one float32 canvas that is converted once at the end.
+    In premultiplied mode NORMAL layers are a plain "over" with no per pixel division.
+    """
+    canvas = np.empty((height, width, 4), dtype=np.float32)
+    canvas[:] = channel_solid(1, 1, matte, EnumImageType.BGRA)[0, 0] / 255.
+    if premultiply:
+        canvas[:,:,:3] *= canvas[:,:,3:]
+
+    for image, mask, blendOp, alpha, offset in layers:
+        if isinstance(blendOp, EnumBlendType):
+            blendOp = blendOp.value
+        blendOp = BlendType(blendOp)
+        alpha = float(np.clip(alpha, 0, 1))
+        image = image_convert(image, 4)
+        h, w = image.shape[:2]
+        if mask is not None:
+            mask = image_convert(mask, 1)
+            if mask.shape[:2] != (h, w):
+                mask = cv2.resize(mask, (w, h), interpolation=cv2.INTER_LINEAR)
+            mask = mask.reshape(h, w)
+
+        # clip the layer placement to the canvas
+        x = (width - w) // 2 + int(round(offset[0] * width))
+        y = (height - h) // 2 + int(round(offset[1] * height))
+        x1, y1 = max(0, x), max(0, y)
+        x2, y2 = min(width, x + w), min(height, y + h)
+        if x1 >= x2 or y1 >= y2 or alpha == 0:
+            continue
+
+        source = image[y1-y:y2-y, x1-x:x2-x]
+        target = canvas[y1:y2, x1:x2]
+        if mask is not None:
+            mask = mask[y1-y:y2-y, x1-x:x2-x]
+        step = max(1, CONVERT_CHUNK // (x2 - x1))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for row in range(0, y2 - y1, step):
+                upper = source[row:row+step]
+                rows = upper.shape[0]
+                upper = upper.reshape(-1, 4).astype(np.float32) / 255
+                if mask is not None:
+                    upper[:, 3] *= mask[row:row+step].reshape(-1) / np.float32(255)
+                lower = target[row:row+step].reshape(-1, 4)
+                out = _scratch('composite', lower.shape)
+                if premultiply and blendOp == BlendType.NORMAL:
+                    ua = upper[:, 3] * alpha
+                    np.multiply(lower, (1 - ua)[:, None], out=out)
+                    out[:, :3] += upper[:, :3] * ua[:, None]
+                    out[:, 3] += ua
+                else:
+                    if premultiply:
+                        # straight color to blend on; nothing shows where alpha is 0
+                        straight = np.zeros_like(lower)
+                        np.divide(lower[:, :3], lower[:, 3:], out=straight[:, :3], where=lower[:, 3:] > 0)
+                        straight[:, 3] = lower[:, 3]
+                        lower = straight
+                    _blend_chunk(lower, upper, blendOp, alpha, BLEND_LUM_BGR, out)
+                    np.nan_to_num(out, copy=False, nan=0, posinf=0, neginf=0)
+                    np.clip(out, 0, 1, out=out)
+                    if premultiply:
+                        out[:, :3] *= out[:, 3:]
+                target[row:row+rows] = out.reshape(rows, -1, 4)
+
+    if premultiply:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            canvas[:,:,:3] /= canvas[:,:,3:]
+        np.nan_to_num(canvas, copy=False, nan=0, posinf=0, neginf=0)
+    canvas *= 255
+    np.rint(canvas, out=canvas)
+    np.clip(canvas, 0, 255, out=canvas)
+    return canvas.astype(np.uint8)
+
+@prepare
+def color_blind_simulator(simulator:EnumCBSimulator) -> Any:
+    """One daltonlens simulator per type, shared by every frame."""
     match simulator:
         case EnumCBSimulator.AUTOSELECT:
-            simulator = simulate.Simulator_AutoSelect()
+            return simulate.Simulator_AutoSelect()
         case EnumCBSimulator.BRETTEL1997:
-            simulator = simulate.Simulator_Brettel1997()
+            return simulate.Simulator_Brettel1997()
         case EnumCBSimulator.COBLISV1:
-            simulator = simulate.Simulator_CoblisV1()
+            return simulate.Simulator_CoblisV1()
         case EnumCBSimulator.COBLISV2:
-            simulator = simulate.Simulator_CoblisV2()
+            return simulate.Simulator_CoblisV2()
         case EnumCBSimulator.MACHADO2009:
-            simulator = simulate.Simulator_Machado2009()
+            return simulate.Simulator_Machado2009()
         case EnumCBSimulator.VIENOT1999:
-            simulator = simulate.Simulator_Vienot1999()
+            return simulate.Simulator_Vienot1999()
         case EnumCBSimulator.VISCHECK:
-            simulator = simulate.Simulator_Vischeck()
-    image = simulator.simulate_cvd(image, deficiency.value, severity=severity)
-    image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+            return simulate.Simulator_Vischeck()
+    return simulator
+
+def color_blind_simulate(image: TYPE_IMAGE, deficiency:EnumCBDefiency,
+                         simulator:EnumCBSimulator=EnumCBSimulator.AUTOSELECT,
+                         severity:float=1.0) -> TYPE_IMAGE:
+    """The daltonlens reference path on one BGR frame; slow, so only for models no matrix can stand in for."""
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    image = color_blind_simulator(simulator).simulate_cvd(image, deficiency.value, severity=severity)
+    return cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+
+@prepare
+def color_blind_transform(deficiency:EnumCBDefiency,
+                          simulator:EnumCBSimulator=EnumCBSimulator.AUTOSELECT,
+                          severity:float=1.0) -> Optional[tuple[np.ndarray, np.ndarray, Optional[np.ndarray], np.ndarray]]:
+    """The simulator as BGR matrices between two lookup tables, if it is piecewise linear.
+
+    Returns the uint8 -> working space float table, the (K,3,3) matrices,
+    the normal of the plane that picks the second matrix where a color is
+    on its negative side (None when K is 1) and a 16-bit working space ->
+    uint8 table. Brettel1997, Vischeck and AUTOSELECT for tritans are two
+    matrices split by a plane; CoblisV2 is neither and gets None.
+    """
+    sim = color_blind_simulator(simulator)
+    func = lambda x: sim._simulate_cvd_linear_rgb(x.reshape(1, -1, 3), deficiency.value, severity)[0]
+    # a primary and its negative land on opposite sides of the plane, so
+    # between them they read one column off each matrix; their sum is the
+    # rank one difference of the two matrices scaled by |normal|
+    eye = np.eye(3, dtype=np.float32)
+    pos, neg = func(eye), -func(-eye)
+    size = np.linalg.norm(pos - neg, axis=1)
+    probe = np.random.default_rng(0).random((256, 3), dtype=np.float32)
+    expect = func(probe)
+    if size.max() < 1e-6:
+        candidates = [(pos.T[None], None)]
+    else:
+        candidates = []
+        for sign in itertools.product((1, -1), repeat=3):
+            sign = np.float32(sign)
+            first = np.where(sign[:, None] > 0, pos, neg).T
+            second = np.where(sign[:, None] > 0, neg, pos).T
+            candidates.append((np.stack([first, second]), sign * size))
+
+    for matrix, normal in candidates:
+        result = probe @ matrix[0].T
+        if normal is not None:
+            result = np.where((probe @ normal < 0)[:, None], probe @ matrix[1].T, result)
+        if np.allclose(expect, result, atol=1e-5):
+            break
+    else:
+        return None
+
+    match sim.imageEncoding:
+        case convert.ImageEncoding.SRGB:
+            encode, decode = convert.linearRGB_from_sRGB, convert.sRGB_from_linearRGB
+        case convert.ImageEncoding.GAMMA_22:
+            encode, decode = convert.linearRGB_from_gamma22, convert.gamma22_from_linearRGB
+        case _:
+            encode = decode = lambda x: x
+    encode = encode(np.arange(256, dtype=np.float32) / 255)
+    decode = convert.as_uint8(decode(np.arange(65536, dtype=np.float32) / 65535))
+    # RGB to BGR on both sides
+    matrix = np.ascontiguousarray(matrix[:, ::-1, ::-1], dtype=np.float32)
+    if normal is not None:
+        normal = np.ascontiguousarray(normal[::-1], dtype=np.float32).reshape(1, 3)
+    return encode, matrix, normal, decode
+
+def image_color_blind(image: TYPE_IMAGE, deficiency:EnumCBDefiency,
+                      simulator:EnumCBSimulator=EnumCBSimulator.AUTOSELECT,
+                      severity:float=1.0) -> TYPE_IMAGE:
+    """Simulate a color vision deficiency over a frame or (N,H,W,C) batch.
+
+    Piecewise linear models run as a lookup, a cv2.transform per matrix and
+    a lookup back; CoblisV2 runs the daltonlens simulator itself. Alpha
+    passes through.
+    """
+    if image.ndim == 2:
+        image = image[..., None]
+    if (cc := image.shape[-1]) == 1:
+        image = np.repeat(image, 3, axis=-1)
+    # frames stacked as rows so each call takes the whole batch
+    frames = image.reshape(-1, image.shape[-2], image.shape[-1])
+    bgr = cv2.cvtColor(frames, cv2.COLOR_BGRA2BGR) if cc == 4 else frames
+    if (transform := color_blind_transform(deficiency, simulator, severity)) is None:
+        out = color_blind_simulate(bgr, deficiency, simulator, severity)
+    else:
+        encode, matrix, normal, decode = transform
+        source = cv2.LUT(bgr, encode)
+        linear = cv2.transform(source, matrix[0])
+        if normal is not None:
+            side = cv2.transform(source, normal) < 0
+            np.copyto(linear, cv2.transform(source, matrix[1]), where=side[..., None])
+        # saturates into [0, 1] on the way to the 16-bit index
+        index = cv2.multiply(linear, 65535, dtype=cv2.CV_16U)
+        out = np.take(decode, index)
     if cc == 4:
-        image = image_mask_add(image, mask)
-    return image
+        out = cv2.cvtColor(out, cv2.COLOR_BGR2BGRA)
+        cv2.mixChannels([frames], [out], [3, 3])
+    return out.reshape(image.shape[:-1] + (out.shape[-1],))
 
 def image_contrast(image: TYPE_IMAGE, value: float) -> TYPE_IMAGE:
     image, alpha, cc = image2bgr(image)
-    mean_value = np.mean(image)
-    image = (image - mean_value) * value + mean_value
-    image = np.clip(image, 0, 255).astype(np.uint8)
+    # the pivot is the mean of each frame over all of its channels
+    scale = 1 if image.dtype == np.uint8 else 255
+    mean = [sum(cv2.mean(frame)[:3]) / 3 * scale
+            for frame in ([image] if image.ndim < 4 else image)]
+    image = image_tone(image, tone_contrast, mean, value)
     return bgr2image(image, alpha, cc == 1)
 
 def image_convert(image: TYPE_IMAGE, channels: int) -> TYPE_IMAGE:
@@ -665,11 +1492,11 @@ def image_convert(image: TYPE_IMAGE, channels: int) -> TYPE_IMAGE:
         return image
     elif ncc == 3:
         if cc == 1:
-            return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
-        return cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+            return image_batch_apply(image, cv2.cvtColor, cv2.COLOR_GRAY2BGR)
+        return image_batch_apply(image, cv2.cvtColor, cv2.COLOR_BGRA2BGR)
     if cc == 1:
-        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGRA)
-    return cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+        return image_batch_apply(image, cv2.cvtColor, cv2.COLOR_GRAY2BGRA)
+    return image_batch_apply(image, cv2.cvtColor, cv2.COLOR_BGR2BGRA)
 
 def image_crop_polygonal(image: TYPE_IMAGE, points: list[TYPE_COORD]) -> TYPE_IMAGE:
     cc, w, h = channel_count(image)[:3]
@@ -718,46 +1545,99 @@ def image_crop_center(image: TYPE_IMAGE, width:int=None, height:int=None) -> TYP
     points = [(x, y), (x + width - 1, y), (x + width - 1, y + height - 1), (x, y + height - 1)]
     return image_crop_polygonal(image, points)
 
-def image_diff(imageA: TYPE_IMAGE, imageB: TYPE_IMAGE, threshold:int=0, color:TYPE_PIXEL=(255, 0, 0)) -> tuple[TYPE_IMAGE, TYPE_IMAGE, TYPE_IMAGE, TYPE_IMAGE, float]:
+def image_ssim(imageA: TYPE_IMAGE, imageB: TYPE_IMAGE, fast:bool=False,
+               full:bool=True) -> tuple[float, Optional[np.ndarray]]:
+    """Structural similarity of two same sized gray uint8 frames, in float32.
+
+    Matches skimage's defaults: a 7x7 uniform window, sample covariance and
+    the window edge cropped off the mean. fast measures at about 256 pixels
+    on the short side, the usual scale for SSIM. full also returns the SSIM
+    map at the input size.
+    """
+    h, w = imageA.shape[:2]
+    scale = max(1, round(min(h, w) / 256)) if fast else 1
+    if scale > 1:
+        size = (max(7, w // scale), max(7, h // scale))
+        imageA = cv2.resize(imageA, size, interpolation=cv2.INTER_AREA)
+        imageB = cv2.resize(imageB, size, interpolation=cv2.INTER_AREA)
+
+    x = imageA.astype(np.float32)
+    y = imageB.astype(np.float32)
+    win = (7, 7)
+    border = cv2.BORDER_REFLECT
+    ux = cv2.boxFilter(x, -1, win, borderType=border)
+    uy = cv2.boxFilter(y, -1, win, borderType=border)
+    uxy = cv2.boxFilter(cv2.multiply(x, y), -1, win, borderType=border)
+    # only vx + vy is needed, so the squares share one filter
+    uxx = cv2.multiply(x, x)
+    uxx += cv2.multiply(y, y)
+    uxx = cv2.boxFilter(uxx, -1, win, borderType=border)
+    uxuy = cv2.multiply(ux, uy)
+    cv2.multiply(ux, ux, dst=ux)
+    ux += cv2.multiply(uy, uy)
+    # uxx is now vx + vy and uxy is vxy, short of the sample covariance
+    uxx -= ux
+    uxy -= uxuy
+    cov = 49 / 48
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+    # (2 ux uy + c1)(2 vxy + c2) / (ux^2 + uy^2 + c1)(vx + vy + c2)
+    uxuy *= 2
+    uxuy += c1
+    uxy *= 2 * cov
+    uxy += c2
+    uxuy *= uxy
+    ux += c1
+    uxx *= cov
+    uxx += c2
+    ux *= uxx
+    smap = cv2.divide(uxuy, ux, dst=uxuy)
+    score = float(smap[3:-3, 3:-3].mean())
+    if not full:
+        return score, None
+    if scale > 1:
+        smap = cv2.resize(smap, (w, h), interpolation=cv2.INTER_LINEAR)
+    return score, smap
+
+def image_diff(imageA: TYPE_IMAGE, imageB: TYPE_IMAGE, threshold:int=0, color:TYPE_PIXEL=(255, 0, 0),
+               fast:bool=False, score:bool=False) -> tuple[TYPE_IMAGE, TYPE_IMAGE, TYPE_IMAGE, TYPE_IMAGE, float]:
+    """SSIM of two frames, their differences filled in color on both, the map and its Otsu mask.
+
+    score only measures; the frames come back as they went in and the map
+    and mask are None.
+    """
     _, w1, h1 = channel_count(imageA)[:3]
     _, w2, h2 = channel_count(imageB)[:3]
     w1 = max(w1, w2)
     h1 = max(h1, h2)
-    imageA = image_matte(imageA, (0, 0, 0, 0), w1, h1)
+    sourceA, sourceB = imageA, imageB
+    # the matte only changes frames that are smaller or carry alpha
+    if channel_count(imageA)[0] == 4 or (w1, h1) != imageA.shape[1::-1]:
+        imageA = image_matte(imageA, (0, 0, 0, 0), w1, h1)
     imageA = image_convert(imageA, 3)
-    imageB = image_matte(imageB, (0, 0, 0, 0), w1, h1)
+    if channel_count(imageB)[0] == 4 or (w1, h1) != imageB.shape[1::-1]:
+        imageB = image_matte(imageB, (0, 0, 0, 0), w1, h1)
     imageB = image_convert(imageB, 3)
+    # the contours are drawn in place, so never into the caller's frames
+    if np.may_share_memory(imageA, sourceA) or not imageA.flags.writeable:
+        imageA = np.ascontiguousarray(imageA).copy()
+    if np.may_share_memory(imageB, sourceB) or not imageB.flags.writeable:
+        imageB = np.ascontiguousarray(imageB).copy()
     grayA = image_grayscale(imageA)
     grayB = image_grayscale(imageB)
-    (score, diff) = ssim(grayA, grayB, full=True)
-    diff = (diff * 255).astype("uint8")
-    diff_box = cv2.merge([diff, diff, diff])
+    value, diff = image_ssim(grayA, grayB, fast, not score)
+    if score:
+        return imageA, imageB, None, None, value
 
+    # negative similarity is as different as it gets
+    diff *= 255
+    diff = np.clip(diff, 0, 255, out=diff).astype(np.uint8)
     _, thresh = cv2.threshold(diff, threshold, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
     contours = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     contours = contours[0] if len(contours) == 2 else contours[1]
-
-    # h, w = imageA.shape[:2]
-    high_a = imageA.copy()
-    high_a = image_convert(high_a, 3)
-    # h, w = imageB.shape[:2]
-    # high_b = np.zeros((h, w, 3), dtype=np.uint8)
-    high_b = imageB.copy()
-    high_b = image_convert(high_b, 3)
-    for c in contours:
-        area = cv2.contourArea(c)
-        if area > 40:
-            x,y,w,h = cv2.boundingRect(c)
-            cv2.rectangle(imageA, (x, y), (x + w, y + h), (36,255,12), 2)
-            cv2.rectangle(imageB, (x, y), (x + w, y + h), (36,255,12), 2)
-            cv2.rectangle(diff_box, (x, y), (x + w, y + h), (36,255,12), 2)
-        cv2.drawContours(high_a, [c], 0, color[::-1], -1)
-        cv2.drawContours(high_b, [c], 0, color[::-1], -1)
-        cv2.drawContours(diff_box, [c], 0, color[::-1], -1)
-
-    imageA = cv2.addWeighted(imageA, 0.0, high_a, 1, 0)
-    imageB = cv2.addWeighted(imageB, 0.0, high_b, 1, 0)
-    return imageA, imageB, diff, thresh, score
+    cv2.drawContours(imageA, contours, -1, color[::-1], -1)
+    cv2.drawContours(imageB, contours, -1, color[::-1], -1)
+    return imageA, imageB, diff, thresh, value
 
 def image_edge_wrap(image: TYPE_IMAGE, tileX: float=1., tileY: float=1., edge:EnumEdge=EnumEdge.WRAP) -> TYPE_IMAGE:
     """TILING."""
@@ -775,24 +1655,25 @@ def image_equalize(image:TYPE_IMAGE) -> TYPE_IMAGE:
 
 def image_exposure(image: TYPE_IMAGE, value: float) -> TYPE_IMAGE:
     image, alpha, cc = image2bgr(image)
-    image = np.clip(image * value, 0, 255).astype(np.uint8)
+    image = image_tone(image, tone_exposure, value)
     return bgr2image(image, alpha, cc == 1)
 
 def image_filter(image:TYPE_IMAGE, matrix:list[float|int]) -> TYPE_IMAGE:
     """Apply a scalar matrix of numbers to each channel of an image.
 
     The matrix should be formed such that all the R scalars are first, G then B.
+    Alpha, if any, passes through.
     """
-    if channel_count(image)[0] < 3:
+    if (cc := channel_count(image)[0]) < 3:
         image = image_convert(image, 3)
-    image = image.astype(float)
+        cc = 3
     r = matrix[:3]
     g = matrix[3:6]
     b = matrix[6:]
-    image[:,:,2] = (image[:,:,2] * r[0] + image[:,:,1] * r[1] + image[:,:,0] * r[2])
-    image[:,:,1] = (image[:,:,2] * g[0] + image[:,:,1] * g[1] + image[:,:,0] * g[2])
-    image[:,:,0] = (image[:,:,2] * b[0] + image[:,:,1] * b[1] + image[:,:,0] * b[2])
-    return image.astype(np.uint8)
+    # rows are the BGR outputs, columns the BGR(A) inputs
+    m = np.eye(cc, dtype=np.float32)
+    m[:3, :3] = [b[::-1], g[::-1], r[::-1]]
+    return cv2.transform(image, m)
 
 def image_formats() -> list[str]:
     exts = Image.registered_extensions()
@@ -801,14 +1682,8 @@ def image_formats() -> list[str]:
 def image_gamma(image: TYPE_IMAGE, value: float) -> TYPE_IMAGE:
     # preserve original format
     image, alpha, cc = image2bgr(image)
-    if value <= 0:
-        image = (image * 0).astype(np.uint8)
-    else:
-        invGamma = 1.0 / max(0.000001, value)
-        table = cv2.pow(np.arange(256) / 255, invGamma) * 255
-        lookUpTable = np.clip(table, 0, 255).astype(np.uint8)
-        image = cv2.LUT(image, lookUpTable)
-        # now back to the original "format"
+    image = image_tone(image, tone_gamma, value)
+    # now back to the original "format"
     return bgr2image(image, alpha, cc == 1)
 
 def image_grayscale(image: TYPE_IMAGE) -> TYPE_IMAGE:
@@ -819,9 +1694,12 @@ def image_grayscale(image: TYPE_IMAGE) -> TYPE_IMAGE:
         if len(image.shape) == 2:
             image = np.expand_dims(image, -1)
         return image
-    if cc == 4:
-        image = image[:,:,:3]
-    return cv2.cvtColor(image, cv2.COLOR_BGR2HSV)[:,:,2]
+    # the V of HSV, without converting the other two channels
+    gray = np.maximum(image[..., 0], image[..., 1])
+    np.maximum(gray, image[..., 2], out=gray)
+    if image.ndim == 4:
+        return np.expand_dims(gray, -1)
+    return gray
 
 def image_grid(data: list[TYPE_IMAGE], width: int, height: int) -> TYPE_IMAGE:
     #@TODO: makes poor assumption all images are the same dimensions.
@@ -839,51 +1717,104 @@ def image_grid(data: list[TYPE_IMAGE], width: int, height: int) -> TYPE_IMAGE:
 
     return frame
 
-def image_histogram(image:TYPE_IMAGE, bins=256) -> TYPE_IMAGE:
-    bins = max(image.max(), bins) + 1
-    flatImage = image.flatten()
-    histogram = np.zeros(bins)
-    for pixel in flatImage:
-        histogram[pixel] += 1
+def image_histogram(image:TYPE_IMAGE, bins=256) -> np.ndarray:
+    """Per-channel counts of a uint8 frame (C, bins) or (N,H,W,C) batch (N, C, bins)."""
+    if image.ndim == 2:
+        image = np.expand_dims(image, -1)
+    frames = image.reshape((-1,) + image.shape[-3:])
+    cc = frames.shape[-1]
+    histogram = np.empty((len(frames), cc, bins), dtype=np.int64)
+    for idx, frame in enumerate(frames):
+        for c in range(cc):
+            histogram[idx, c] = cv2.calcHist([frame], [c], None, [bins], [0, 256]).ravel()
+    return histogram.reshape(image.shape[:-3] + (cc, bins))
+
+def image_histogram_accumulate(histogram: np.ndarray, start: np.ndarray=None) -> np.ndarray:
+    """Running totals of a (N, C, bins) sequence of histograms, carried on from start."""
+    histogram = np.cumsum(histogram, axis=0)
+    if start is not None:
+        histogram += start
     return histogram
 
 def image_histogram_normalize(image:TYPE_IMAGE)-> TYPE_IMAGE:
-    L = image.max()
-    nonEqualizedHistogram = image_histogram(image, bins=L)
-    sumPixels = np.sum(nonEqualizedHistogram)
-    nonEqualizedHistogram = nonEqualizedHistogram/sumPixels
-    cfdHistogram = np.cumsum(nonEqualizedHistogram)
-    transformMap = np.floor((L-1) * cfdHistogram)
-    flatNonEqualizedImage = list(image.flatten())
-    flatEqualizedImage = [transformMap[p] for p in flatNonEqualizedImage]
-    return np.reshape(flatEqualizedImage, image.shape)
+    """Equalize each color channel of a frame or (N,H,W,C) batch through its CDF.
+
+    Alpha passes through.
+    """
+    cdf = np.cumsum(image_histogram(image), axis=-1)
+    lut = np.floor(255 * cdf / np.maximum(1, cdf[..., -1:])).astype(np.uint8)
+    cc = lut.shape[-2]
+    if cc == 4:
+        lut[..., 3, :] = np.arange(256)
+    # cv2.LUT takes one (256, 1, C) table for all the channels of a frame
+    lut = np.swapaxes(lut, -1, -2).reshape(lut.shape[:-2] + (256, 1, cc))
+    if image.ndim < 4:
+        return cv2.LUT(image, lut).reshape(image.shape)
+    return np.stack([cv2.LUT(frame, table).reshape(frame.shape)
+                     for frame, table in zip(image, lut)])
+
+def image_histogram_render(histogram: np.ndarray, width: int=512, height: int=512) -> TYPE_IMAGE:
+    """Draw a (C, bins) histogram as filled BGR curves, summed where they overlap.
+
+    Three or four channels draw in blue, green and red (alpha is skipped), one
+    channel draws in white. All curves share the tallest bin as their scale.
+    """
+    histogram = np.asarray(histogram, dtype=np.float64)
+    if len(histogram) > 1:
+        histogram = histogram[:3]
+    bins = histogram.shape[-1]
+    top = max(1, histogram.max())
+    x = np.linspace(0, width - 1, bins)
+    colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255)] if len(histogram) > 1 else [(255, 255, 255)]
+    canvas = np.zeros((height, width, 3), dtype=np.uint8)
+    for channel, color in zip(histogram, colors):
+        y = (height - 1) * (1 - channel / top)
+        points = np.stack([np.r_[0, x, width - 1], np.r_[height - 1, y, height - 1]], axis=-1)
+        layer = np.zeros_like(canvas)
+        cv2.fillPoly(layer, [np.rint(points).astype(np.int32)], color)
+        cv2.add(canvas, layer, dst=canvas)
+    return canvas
 
 def image_histogram_statistics(histogram:np.ndarray, L=256)-> TYPE_IMAGE:
-    sumPixels = np.sum(histogram)
-    normalizedHistogram = histogram/sumPixels
-    mean = 0
-    for i in range(L):
-        mean += i * normalizedHistogram[i]
-    variance = 0
-    for i in range(L):
-        variance += (i-mean)**2 * normalizedHistogram[i]
+    """Mean, variance and standard deviation of the bins along the last axis."""
+    histogram = np.asarray(histogram, dtype=np.float64)[..., :L]
+    normalizedHistogram = histogram / np.maximum(1, histogram.sum(axis=-1, keepdims=True))
+    i = np.arange(histogram.shape[-1])
+    mean = (normalizedHistogram * i).sum(axis=-1)
+    variance = (normalizedHistogram * (i - mean[..., None]) ** 2).sum(axis=-1)
     std = np.sqrt(variance)
     return mean, variance, std
 
 def image_hsv(image: TYPE_IMAGE, hue: float, saturation: float, value: float) -> TYPE_IMAGE:
     image, alpha, cc = image2bgr(image)
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-    hue *= 255
-    image[:, :, 0] = (image[:, :, 0] + hue) % 180
-    image[:, :, 1] = np.clip(image[:, :, 1] * saturation, 0, 255)
-    image[:, :, 2] = np.clip(image[:, :, 2] * value, 0, 255)
-    image = cv2.cvtColor(image, cv2.COLOR_HSV2BGR)
+    image = image_batch_apply(image, cv2.cvtColor, cv2.COLOR_BGR2HSV)
+    hue = image_batch_param(hue, image, 2) * 255
+    saturation = image_batch_param(saturation, image, 2)
+    value = image_batch_param(value, image, 2)
+    if all(len(np.unique(p)) == 1 for p in (hue, saturation, value)):
+        # one shift and two scales for every frame: a lookup table per channel
+        index = np.arange(256, dtype=np.uint8)
+        lut = np.empty((256, 1, 3), dtype=np.uint8)
+        lut[:, 0, 0] = (index + float(hue.ravel()[0])) % 180
+        lut[:, 0, 1] = np.clip(index * float(saturation.ravel()[0]), 0, 255)
+        lut[:, 0, 2] = np.clip(index * float(value.ravel()[0]), 0, 255)
+        image = image_batch_apply(image, cv2.LUT, lut)
+    else:
+        image[..., 0] = (image[..., 0] + hue) % 180
+        image[..., 1] = np.clip(image[..., 1] * saturation, 0, 255)
+        image[..., 2] = np.clip(image[..., 2] * value, 0, 255)
+    image = image_batch_apply(image, cv2.cvtColor, cv2.COLOR_HSV2BGR)
     return bgr2image(image, alpha, cc == 1)
 
 def image_invert(image: TYPE_IMAGE, value: float) -> TYPE_IMAGE:
-    value = np.clip(value, 0, 1)
     image, alpha, cc = image2bgr(image)
-    image = cv2.addWeighted(image, 1 - value, 255 - image, value, 0)
+    value = np.clip(image_batch_param(value, image), 0, 1)
+    if len(np.unique(value)) == 1:
+        value = float(value.ravel()[0])
+        image = image_batch_apply(image, lambda x: cv2.addWeighted(x, 1 - value, 255 - x, value, 0))
+    else:
+        image = image * (1 - value) + (255 - image) * value
+        image = np.clip(np.rint(image), 0, 255).astype(np.uint8)
     return bgr2image(image, alpha, cc == 1)
 
 def image_lerp(imageA:TYPE_IMAGE,
@@ -891,38 +1822,25 @@ def image_lerp(imageA:TYPE_IMAGE,
               mask:TYPE_IMAGE=None,
               alpha:float=1.) -> TYPE_IMAGE:
 
-    imageA = imageA.astype(np.float32)
-    imageB = imageB.astype(np.float32)
-
     # normalize alpha and establish mask
-    alpha = np.clip(alpha, 0, 1)
+    alpha = float(np.clip(alpha, 0, 1))
     if mask is None:
-        height, width = imageA.shape[:2]
-        mask = cv2.empty((height, width, 1), dtype=cv2.uint8)
-    else:
-        # normalize the mask
-        info = np.iinfo(mask.dtype)
-        mask = mask.astype(np.float32) / info.max * alpha
+        return cv2.addWeighted(imageA, 1. - alpha, imageB, alpha, 0)
+
+    # normalize the mask
+    info = np.iinfo(mask.dtype)
+    if mask.ndim > 2:
+        mask = mask[:,:,0]
+    weight = cv2.multiply(mask, alpha / info.max, dtype=cv2.CV_32F)
 
     # LERP
-    imageA = cv2.multiply(1. - mask, imageA)
-    imageB = cv2.multiply(mask, imageB)
-    imageA = cv2.add(imageA, imageB)
-    return imageA.astype(np.uint8)
+    return cv2.blendLinear(imageA, imageB, 1 - weight, weight)
 
 def image_levels(image:torch.Tensor, black_point:int=0, white_point=255,
         mid_point=128, gamma=1.0) -> TYPE_IMAGE:
 
     image, alpha, cc = image2bgr(image)
-    black  = np.array([black_point] * 3, dtype=np.float32)
-    white  = np.array([white_point] * 3, dtype=np.float32)
-    mid  = np.array([mid_point] * 3, dtype=np.float32)
-    inGamma  = np.array([gamma] * 3, dtype=np.float32)
-    outBlack = np.array([0, 0, 0], dtype=np.float32)
-    outWhite = np.array([255, 255, 255], dtype=np.float32)
-    image = np.clip( (image - black) / (white - black), 0, 255 )
-    image = (image ** (1/inGamma) ) *  (outWhite - outBlack) + outBlack
-    image = np.clip(image, 0, 255).astype(np.uint8)
+    image = image_tone(image, tone_levels, black_point, white_point, gamma)
     return bgr2image(image, alpha, cc == 1)
 
 def image_load(url: str) -> tuple[TYPE_IMAGE, TYPE_IMAGE]:
@@ -989,8 +1907,11 @@ def image_mask(image:TYPE_IMAGE, color:TYPE_PIXEL=255) -> TYPE_IMAGE:
     """Returns a mask from an image or a default mask with the color."""
     cc, width, height = channel_count(image)[:3]
     if cc == 4:
-        return np.expand_dims(image[:,:,3], -1)
-    return channel_solid(width, height, color, EnumImageType.GRAYSCALE)
+        return np.expand_dims(image[...,3], -1)
+    if image.ndim == 4:
+        color = pixel_eval(color, EnumImageType.GRAYSCALE)
+        return np.broadcast_to(np.uint8(color), image.shape[:3] + (1,))
+    return channel_constant(width, height, color, EnumImageType.GRAYSCALE)
 
 def image_mask_add(image:TYPE_IMAGE, mask:TYPE_IMAGE=None) -> TYPE_IMAGE:
     """Places a default or custom mask into an image.
@@ -999,6 +1920,11 @@ def image_mask_add(image:TYPE_IMAGE, mask:TYPE_IMAGE=None) -> TYPE_IMAGE:
     """
     h, w = image.shape[:2]
     image = image_convert(image, 4)
+    if image.ndim == 4:
+        # batches carry their own (N,H,W,1) alpha from image2bgr
+        if mask is not None:
+            image[...,3] = mask.reshape(image.shape[:3])
+        return image
     if mask is None:
         mask = image_mask(image)
     else:
@@ -1021,16 +1947,13 @@ def image_matte(image:TYPE_IMAGE, color:TYPE_PIXEL=(0,0,0,255), width:int=None,
     x2 = min(width, x1 + w)
     if cc != 4:
         image = image_convert(image, 4)
-    # save the old alpha channel
-    mask = image_mask(image)
     matte = channel_solid(width, height, color, EnumImageType.BGRA)
-    alpha = mask[:,:,0]
-    matte[y1:y2, x1:x2, 3] = alpha
-    alpha = cv2.bitwise_not(alpha)
-    alpha = cv2.cvtColor(alpha, cv2.COLOR_GRAY2BGRA) / 255.0
-    matte[y1:y2, x1:x2] = cv2.convertScaleAbs(image * (1 - alpha) + matte[y1:y2, x1:x2] * alpha)
-    if cc == 4:
-        matte[y1:y2, x1:x2,3] = mask[:,:,0]
+    region = matte[y1:y2, x1:x2]
+    # the image alpha weights it over the matte, then becomes the result alpha
+    alpha = image[:,:,3]
+    weight = cv2.multiply(alpha, 1 / 255., dtype=cv2.CV_32F)
+    region[:] = cv2.blendLinear(image, np.ascontiguousarray(region), weight, 1 - weight)
+    region[:,:,3] = alpha
     return matte
 
 def image_merge(imageA: TYPE_IMAGE, imageB: TYPE_IMAGE, axis: int=0, flip: bool=False) -> TYPE_IMAGE:
@@ -1080,8 +2003,13 @@ def image_mirror(image: TYPE_IMAGE, mode:EnumMirrorMode, x:float=0.5, y:float=0.
     return image
 
 def image_pixelate(image: TYPE_IMAGE, amount:float=1.)-> TYPE_IMAGE:
+    """Replace blocks of a frame, or each frame of a (N,H,W,C) batch, by their mean.
 
-    h, w = image.shape[:2]
+    The blocks tile the frame whole; the few rows and columns left over at the
+    bottom and right keep their pixels. Means are exact integer sums over the
+    block, truncated back to uint8.
+    """
+    h, w = image.shape[-3:-1] if image.ndim == 4 else image.shape[:2]
     amount = max(0, min(1, amount))
     block_size_h = max(1, (h * amount))
     block_size_w = max(1, (w * amount))
@@ -1089,46 +2017,51 @@ def image_pixelate(image: TYPE_IMAGE, amount:float=1.)-> TYPE_IMAGE:
     num_blocks_w = int(np.ceil(w / block_size_w))
     block_size_h = h // num_blocks_h
     block_size_w = w // num_blocks_w
-    pixelated_image = image.copy()
-
-    for i in range(num_blocks_h):
-        for j in range(num_blocks_w):
-            # Calculate block boundaries
-            y_start = i * block_size_h
-            y_end = min((i + 1) * block_size_h, h)
-            x_start = j * block_size_w
-            x_end = min((j + 1) * block_size_w, w)
+    y2 = num_blocks_h * block_size_h
+    x2 = num_blocks_w * block_size_w
 
-            # Average color values within the block
-            block_average = np.mean(image[y_start:y_end, x_start:x_end], axis=(0, 1))
-
-            # Fill the block with the average color
-            pixelated_image[y_start:y_end, x_start:x_end] = block_average
-
-    return pixelated_image.astype(np.uint8)
+    pixelated_image = image.copy()
+    view = pixelated_image if image.ndim > 2 else pixelated_image[..., None]
+    lead = view.shape[:-3]
+    cc = view.shape[-1]
+    blocks = view[..., :y2, :x2, :].reshape(lead + (num_blocks_h, block_size_h,
+                                                   num_blocks_w, block_size_w, cc))
+    size = block_size_h * block_size_w
+    # block rows first, while the reads are still whole contiguous lines
+    total = blocks.sum(axis=-4, dtype=np.uint32 if size < 2 ** 24 else np.uint64).sum(axis=-2)
+    block_average = (total / size).astype(image.dtype)
+    block_average = np.repeat(block_average, block_size_h, axis=-3)
+    view[..., :y2, :x2, :] = np.repeat(block_average, block_size_w, axis=-2)
+    return pixelated_image
 
 def image_posterize(image: TYPE_IMAGE, levels:int=256) -> TYPE_IMAGE:
-    divisor = 256 / max(2, min(256, levels))
-    return (np.floor(image / divisor) * int(divisor)).astype(np.uint8)
+    return image_tone(image, tone_posterize, levels)
+
+def image_quantize(image:TYPE_IMAGE, levels:int=256, iterations:int=10, epsilon:float=0.2,
+                   palette:Optional[np.ndarray]=None) -> TYPE_IMAGE:
+    """Reduce a frame or batch to a palette of levels colors, fit to it unless one is given.
 
-def image_quantize(image:TYPE_IMAGE, levels:int=256, iterations:int=10, epsilon:float=0.2) -> TYPE_IMAGE:
+    Pass a palette from palette_build over the whole sequence for colors
+    that hold steady from frame to frame.
+    """
     levels = int(max(2, min(256, levels)))
-    pixels = np.float32(image)
-    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, iterations, epsilon)
-    _, labels, centers = cv2.kmeans(pixels, levels, None, criteria, 5, cv2.KMEANS_RANDOM_CENTERS)
-    centers = np.uint8(centers)
-    return centers[labels.flatten()].reshape(image.shape)
+    if palette is None:
+        palette = palette_build(image, levels, iterations=iterations, epsilon=epsilon)
+    batch = image.ndim == 4
+    if image.ndim == 2:
+        image = image[..., None]
+    if (cc := image.shape[-1]) == 1:
+        image = np.repeat(image, 3, axis=-1)
+    image = palette_apply(image, palette)
+    if cc == 1:
+        image = image[..., :1] if batch else image[..., 0]
+    return image
 
 def image_rotate(image: TYPE_IMAGE, angle: float, center:TYPE_COORD=(0.5, 0.5), edge:EnumEdge=EnumEdge.CLIP) -> TYPE_IMAGE:
-
-    def func_rotate(img: TYPE_IMAGE) -> TYPE_IMAGE:
-        height, width = img.shape[:2]
-        c = (int(width * center[0]), int(height * center[1]))
-        M = cv2.getRotationMatrix2D(c, -angle, 1.0)
-        return cv2.warpAffine(img, M, (width, height), flags=cv2.INTER_LINEAR)
-
-    image = image_affine_edge(image, func_rotate, edge)
-    return image
+    height, width = image.shape[:2]
+    c = (int(width * center[0]), int(height * center[1]))
+    M = cv2.getRotationMatrix2D(c, -angle, 1.0)
+    return image_affine_warp(image, M, (width, height), EnumInterpolation.LINEAR, edge)
 
 def image_save_gif(fpath:str, images: list[Image.Image], fps: int=0,
                 loop:int=0, optimize:bool=False) -> None:
@@ -1144,16 +2077,13 @@ def image_save_gif(fpath:str, images: list[Image.Image], fps: int=0,
     )
 
 def image_scale(image: TYPE_IMAGE, scale:TYPE_COORD=(1.0, 1.0), sample:EnumInterpolation=EnumInterpolation.LANCZOS4, edge:EnumEdge=EnumEdge.CLIP) -> TYPE_IMAGE:
-
-    def scale_func(img: TYPE_IMAGE) -> TYPE_IMAGE:
-        height, width = img.shape[:2]
+    height, width = image.shape[:2]
+    if edge == EnumEdge.CLIP:
         width = int(width * scale[0])
         height = int(height * scale[1])
-        return cv2.resize(img, (width, height), interpolation=sample.value)
-
-    if edge == EnumEdge.CLIP:
-        return scale_func(image)
-    return image_affine_edge(image, scale_func, edge)
+        return cv2.resize(image, (width, height), interpolation=sample.value)
+    M, size = image_affine_matrix(width, height, scale=scale, edge=edge)
+    return image_affine_warp(image, M, size, sample, edge)
 
 def image_scalefit(image: TYPE_IMAGE, width: int, height:int,
                  mode:EnumScaleMode=EnumScaleMode.NONE,
@@ -1190,12 +2120,10 @@ def image_sharpen(image:TYPE_IMAGE, kernel_size=None, sigma:float=1.0,
 
     kernel_size = (kernel_size, kernel_size) if kernel_size else (5, 5)
     blurred = cv2.GaussianBlur(image, kernel_size, sigma)
-    sharpened = float(amount + 1) * image - float(amount) * blurred
-    sharpened = np.maximum(sharpened, np.zeros(sharpened.shape))
-    sharpened = np.minimum(sharpened, 255 * np.ones(sharpened.shape))
-    sharpened = sharpened.round().astype(np.uint8)
+    # saturating weighted sum, rounded straight back to uint8
+    sharpened = cv2.addWeighted(image, float(amount + 1), blurred, -float(amount), 0)
     if threshold > 0:
-        low_contrast_mask = np.absolute(image - blurred) < threshold
+        low_contrast_mask = cv2.absdiff(image, blurred) < threshold
         np.copyto(sharpened, image, where=low_contrast_mask)
     return sharpened
 
@@ -1256,8 +2184,21 @@ def image_stack(images: list[TYPE_IMAGE], axis:EnumOrientation=EnumOrientation.H
     return image
 
 def image_stereogram(image: TYPE_IMAGE, depth: TYPE_IMAGE, divisions:int=8, mix:float=0.33, gamma:float=0.33, shift:float=1.) -> TYPE_IMAGE:
+    """Autostereogram of a depth map, tiled from a noisy copy of the image.
+
+    Past the first pattern strip every pixel copies the one a pattern width
+    (less its depth shift) to the left. Each pixel is first pointed at the
+    pixel it copies and the pointers are doubled until they all land in the
+    first strip, so every row resolves in a few whole frame gathers. Pointers
+    at a pixel not yet drawn, or off the row, give black. A (N,H,W,C) depth
+    stack gives one stereogram per frame.
+    """
+    if depth.ndim == 4:
+        frames = image if image.ndim == 4 else [image] * len(depth)
+        return np.stack([image_stereogram(img, d, divisions, mix, gamma, shift)
+                         for img, d in zip(frames, depth)])
+
     height, width = depth.shape[:2]
-    out = np.zeros((height, width, 3), dtype=np.uint8)
     image = cv2.resize(image, (width, height))
     image = image_convert(image, 3)
     depth = image_convert(depth, 3)
@@ -1266,18 +2207,22 @@ def image_stereogram(image: TYPE_IMAGE, depth: TYPE_IMAGE, divisions:int=8, mix:
     image = cv2.addWeighted(image, 1. - mix, noise, mix, 0)
 
     pattern_width = width // divisions
-    # shift -= 1
-    for y in range(height):
-        for x in range(width):
-            if x < pattern_width:
-                out[y, x] = image[y, x]
-            else:
-                # out[y, x] = out[y, x - pattern_width + int(shift * invert)]
-                offset = depth[y, x][0] // divisions
-                pos = x - pattern_width + int(shift * offset)
-                # pos = max(-pattern_width, min(pattern_width, pos))
-                out[y, x] = out[y, pos]
-    return out
+    x = np.arange(width)
+    offset = depth[:,:,0] // divisions
+    pos = x - pattern_width + np.trunc(shift * offset).astype(np.intp)
+    # negative positions count back from the end of the row
+    pos = np.where(pos < 0, pos + width, pos)
+    # column `width` is a black sentinel that points at itself
+    src = np.where((pos >= 0) & (pos < x), pos, width)
+    src[:, :pattern_width] = x[:pattern_width]
+    src = np.concatenate([src, np.full((height, 1), width, dtype=src.dtype)], axis=1)
+    while True:
+        nxt = np.take_along_axis(src, src, axis=1)
+        if np.array_equal(nxt, src):
+            break
+        src = nxt
+    image = np.concatenate([image, np.zeros((height, 1, 3), dtype=np.uint8)], axis=1)
+    return np.take_along_axis(image, src[:, :width, None], axis=1)
 
 def image_threshold(image:TYPE_IMAGE, threshold:float=0.5,
                      mode:EnumThreshold=EnumThreshold.BINARY,
@@ -1288,43 +2233,52 @@ def image_threshold(image:TYPE_IMAGE, threshold:float=0.5,
     block = max(3, block if block % 2 == 1 else block + 1)
     image, alpha, cc = image2bgr(image)
     if adapt != EnumThresholdAdapt.ADAPT_NONE:
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        gray = cv2.adaptiveThreshold(gray, 255, adapt.value, cv2.THRESH_BINARY, block, const)
-        gray = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
-        # gray = np.stack([gray, gray, gray], axis=-1)
-        image = cv2.bitwise_and(image, gray)
+        def adaptive(img: TYPE_IMAGE) -> TYPE_IMAGE:
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            gray = cv2.adaptiveThreshold(gray, 255, adapt.value, cv2.THRESH_BINARY, block, const)
+            gray = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+            return cv2.bitwise_and(img, gray)
+
+        # the block neighbourhood would bleed across frames in a mosaic
+        if image.ndim == 4:
+            image = np.stack([adaptive(img) for img in image])
+        else:
+            image = adaptive(image)
     else:
-        threshold = int(threshold * 255)
-        _, image = cv2.threshold(image, threshold, 255, mode.value)
+        threshold = image_batch_param(threshold, image).ravel()
+        threshold = (threshold * 255).astype(int)
+        if image.ndim < 4:
+            _, image = cv2.threshold(image, int(threshold[0]), 255, mode.value)
+        else:
+            # frames sharing a threshold go through as one mosaic
+            out = np.empty_like(image)
+            for value in np.unique(threshold):
+                idx = np.flatnonzero(threshold == value)
+                out[idx] = image_batch_apply(image[idx],
+                    lambda x: cv2.threshold(x, int(value), 255, mode.value)[1])
+            image = out
     return bgr2image(image, alpha, cc == 1)
 
 def image_translate(image: TYPE_IMAGE, offset:TYPE_COORD=(0.0, 0.0), edge:EnumEdge=EnumEdge.CLIP) -> TYPE_IMAGE:
-
-    def translate(img: TYPE_IMAGE) -> TYPE_IMAGE:
-        height, width = img.shape[:2]
-        scalarX = 0.333 if edge in [EnumEdge.WRAP, EnumEdge.WRAPX] else 1.
-        scalarY = 0.333 if edge in [EnumEdge.WRAP, EnumEdge.WRAPY] else 1.
-
-        M = np.float32([[1, 0, offset[0] * width * scalarX], [0, 1, offset[1] * height * scalarY]])
-        return cv2.warpAffine(img, M, (width, height), flags=cv2.INTER_LINEAR)
-
-    return image_affine_edge(image, translate, edge)
+    height, width = image.shape[:2]
+    M = np.float32([[1, 0, offset[0] * width], [0, 1, offset[1] * height]])
+    return image_affine_warp(image, M, (width, height), EnumInterpolation.LINEAR, edge)
 
 def image_transform(image: TYPE_IMAGE, offset:TYPE_COORD=(0.0, 0.0), angle:float=0, scale:TYPE_COORD=(1.0, 1.0), sample:EnumInterpolation=EnumInterpolation.LANCZOS4, edge:EnumEdge=EnumEdge.CLIP) -> TYPE_IMAGE:
-    sX, sY = scale
-    if sX < 0:
-        image = cv2.flip(image, 1)
-        sX = -sX
-    if sY < 0:
-        image = cv2.flip(image, 0)
-        sY = -sY
-    if sX != 1. or sY != 1.:
-        image = image_scale(image, (sX, sY), sample, edge)
-    if angle != 0:
-        image = image_rotate(image, angle, edge=edge)
-    if offset[0] != 0. or offset[1] != 0.:
-        image = image_translate(image, offset, edge)
-    return image
+    """Flip, scale, rotate and translate a frame, or a (N,H,W,C) batch, in one resample."""
+    if angle == 0 and offset[0] == 0. and offset[1] == 0.:
+        if tuple(scale) == (1., 1.):
+            return image
+        if edge == EnumEdge.CLIP and image.ndim < 4:
+            # a plain flip and resize is separable, cheaper than any warp
+            if scale[0] < 0:
+                image = cv2.flip(image, 1)
+            if scale[1] < 0:
+                image = cv2.flip(image, 0)
+            return image_scale(image, (abs(scale[0]), abs(scale[1])), sample)
+    height, width = image.shape[-3:-1] if image.ndim == 4 else image.shape[:2]
+    M, size = image_affine_matrix(width, height, offset, angle, scale, edge)
+    return image_affine_warp(image, M, size, sample, edge)
 
 # MORPHOLOGY
 
@@ -1339,13 +2293,17 @@ def morph_edge_detect(image: TYPE_IMAGE,
     # Perform Canny edge detection
     return cv2.Canny(image, int(low * 255), int(high * 255))
 
-def morph_emboss(image: TYPE_IMAGE, amount: float=1., kernel: int=2) -> TYPE_IMAGE:
+@prepare
+def morph_emboss_kernel(amount: float=1., kernel: int=2) -> np.ndarray:
     kernel = max(2, kernel)
-    kernel = np.array([
+    return np.array([
         [-kernel,    -kernel+1,     0],
         [-kernel+1,    kernel-1,      1],
         [kernel-2,     kernel-1,      2]
     ]) * amount
+
+def morph_emboss(image: TYPE_IMAGE, amount: float=1., kernel: int=2) -> TYPE_IMAGE:
+    kernel = morph_emboss_kernel(amount, kernel)
     return cv2.filter2D(src=image, ddepth=-1, kernel=kernel)
 
 # KERNELS
@@ -1408,43 +2366,92 @@ def kernel(stride: int) -> TYPE_IMAGE:
 # =============================================================================
 
 def color_image2lut(image: TYPE_IMAGE, num_colors:int=256) -> np.ndarray[np.uint8]:
-    """Create X sized LUT from an RGB image."""
-    image = image_convert(image, 3)
-    lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
-    pixels = lab.reshape(-1, 3)
-    kmeans = MiniBatchKMeans(n_clusters=num_colors)
-    kmeans.fit(pixels)
-    colors = kmeans.cluster_centers_.astype(np.uint8)
-    lut = np.zeros((256, 1, 3), dtype=np.uint8)
-    for i, color in enumerate(colors):
-        lut[i] = color
+    """Create a 256 entry colormap from the palette of an RGB image, dark to light."""
+    return palette_colormap(palette_build(image, num_colors))
+
+def color_lab(image: TYPE_IMAGE) -> TYPE_IMAGE:
+    """8-bit LAB of a BGR(A) or gray frame or (N,H,W,C) stack, one cvtColor for the lot."""
+    if image.ndim == 2:
+        image = image[..., None]
+    if image.shape[-1] == 1:
+        image = np.repeat(image, 3, axis=-1)
+    h, w, cc = image.shape[-3:]
+    lab = cv2.cvtColor(image.reshape(-1, w, cc), cv2.COLOR_BGR2LAB)
+    return lab.reshape(image.shape[:-1] + (3,))
+
+def color_lab_stats(lab: TYPE_IMAGE) -> np.ndarray:
+    """Mean and standard deviation of each channel of a LAB frame as one (2,3) array."""
+    mean, std = cv2.meanStdDev(lab)
+    return np.stack([mean.ravel(), std.ravel()])
+
+def color_lab_cdf(lab: TYPE_IMAGE) -> np.ndarray:
+    """Cumulative histogram of each channel of a LAB frame as (3,256) quantiles."""
+    return np.cumsum(image_histogram(lab), axis=-1) / (lab.shape[0] * lab.shape[1])
+
+@prepare
+def color_target_stats(target: TYPE_IMAGE) -> np.ndarray:
+    return color_lab_stats(color_lab(target))
+
+@prepare
+def color_target_cdf(target: TYPE_IMAGE) -> np.ndarray:
+    return color_lab_cdf(color_lab(target))
+
+def color_lut_reinhard(source: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """LAB lookup table that moves the source mean and deviation onto the target's."""
+    mean_ori, std_ori = source[0], np.maximum(source[1], 1e-6)
+    mean_tar, std_tar = target
+    ratio = std_tar / std_ori
+    offset = mean_tar - mean_ori * std_tar / std_ori
+    lut = np.abs(np.arange(256, dtype=np.float64).reshape(256, 1) * ratio + offset)
+    return np.clip(np.rint(lut), 0, 255).astype(np.uint8).reshape(256, 1, 3)
+
+def color_lut_histogram(source: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """LAB lookup table that maps the source quantiles onto the target's."""
+    lut = np.empty((256, 1, 3), dtype=np.uint8)
+    for c in range(3):
+        # only the codes the target uses, as skimage match_histograms does
+        values = np.flatnonzero(np.diff(target[c], prepend=0))
+        lut[:, 0, c] = np.interp(source[c], target[c][values], values)
     return lut
 
-def color_match_histogram(image: TYPE_IMAGE, usermap: TYPE_IMAGE) -> TYPE_IMAGE:
-    """Colorize one input based on the histogram matches."""
-    if (cc := channel_count(image)[0]) == 4:
-        alpha = image_mask(image)[:,:,0]
-    image = image_convert(image, 3)
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
-    beta = cv2.cvtColor(usermap, cv2.COLOR_BGR2LAB)
-    image = exposure.match_histograms(image, beta, channel_axis=2)
-    image = cv2.cvtColor(image, cv2.COLOR_LAB2BGR)
-    image = image_blend(usermap, image, blendOp=BlendType.LUMINOSITY)
-    image = image_convert(image, cc)
+def color_match_lab(image: TYPE_IMAGE, target: np.ndarray, stats: Callable, lut: Callable,
+                    source: Optional[list[np.ndarray]]=None) -> TYPE_IMAGE:
+    """Run a LAB matching LUT over a frame or (N,H,W,C) stack.
+
+    stats measures a LAB frame and lut turns (source, target) statistics into
+    a table. source overrides the statistics of each frame, one per frame,
+    for instance smoothed over a sequence. Alpha passes through.
+    """
+    cc = 1 if image.ndim == 2 else image.shape[-1]
+    lab = color_lab(image)
+    frames = lab.reshape((-1,) + lab.shape[-3:])
+    if source is None:
+        source = [stats(frame) for frame in frames]
+    for frame, src in zip(frames, source):
+        cv2.LUT(frame, lut(src, target), dst=frame)
+    h, w = frames.shape[1:3]
+    out = cv2.cvtColor(frames.reshape(-1, w, 3), cv2.COLOR_LAB2BGR).reshape(lab.shape)
     if cc == 4:
-        image[:,:,3] = alpha
-    return image
+        out = np.concatenate([out, image[..., 3:]], axis=-1)
+    elif cc == 1:
+        out = cv2.cvtColor(out.reshape(-1, w, 3), cv2.COLOR_BGR2GRAY).reshape(image.shape)
+    return out
+
+def color_match_histogram(image: TYPE_IMAGE, usermap: TYPE_IMAGE,
+                          source: Optional[list[np.ndarray]]=None) -> TYPE_IMAGE:
+    """Match the LAB histograms of a frame or stack to those of the usermap.
+
+    The usermap CDFs are cached, so a still target is measured once.
+    """
+    return color_match_lab(image, color_target_cdf(usermap), color_lab_cdf, color_lut_histogram, source)
 
-def color_match_reinhard(image: TYPE_IMAGE, target: TYPE_IMAGE) -> TYPE_IMAGE:
-    """Reinhard Color matching based on https://www.cs.tau.ac.il/~turkel/imagepapers/ColorTransfer."""
-    lab_tar = cv2.cvtColor(target, cv2.COLOR_BGR2Lab)
-    lab_ori = cv2.cvtColor(image, cv2.COLOR_BGR2Lab)
-    mean_tar, std_tar = cv2.meanStdDev(lab_tar)
-    mean_ori, std_ori = cv2.meanStdDev(lab_ori)
-    ratio = (std_tar/std_ori).reshape(-1)
-    offset = (mean_tar - mean_ori*std_tar/std_ori).reshape(-1)
-    lab_tar = cv2.convertScaleAbs(lab_ori*ratio + offset)
-    return cv2.cvtColor(lab_tar, cv2.COLOR_Lab2BGR)
+def color_match_reinhard(image: TYPE_IMAGE, target: TYPE_IMAGE,
+                         source: Optional[list[np.ndarray]]=None) -> TYPE_IMAGE:
+    """Reinhard Color matching based on https://www.cs.tau.ac.il/~turkel/imagepapers/ColorTransfer.
+
+    The target statistics are cached, so a still target is measured once.
+    """
+    return color_match_lab(image, color_target_stats(target), color_lab_stats, color_lut_reinhard, source)
 
 def color_match_lut(image: TYPE_IMAGE, colormap:int=cv2.COLORMAP_JET,
                       usermap:TYPE_IMAGE=None, num_colors:int=255) -> TYPE_IMAGE:
@@ -1457,7 +2464,6 @@ def color_match_lut(image: TYPE_IMAGE, colormap:int=cv2.COLORMAP_JET,
         usermap = image_convert(usermap, 3)
     colormap = colormap if usermap is None else color_image2lut(usermap, num_colors)
     image = cv2.applyColorMap(image, colormap)
-    image = cv2.addWeighted(image, 0.5, image, 0.5, 0)
     image = image_convert(image, cc)
     if cc == 4:
         image[:,:,3] = alpha
@@ -1565,13 +2571,7 @@ def color_theory(image: TYPE_IMAGE, custom:int=0, scheme: EnumColorTheory=EnumCo
             a, b, c, d = color_theory_tetrad_custom(color, custom)
 
     h, w = image.shape[:2]
-    return (
-        np.full((h, w, 3), color, dtype=np.uint8),
-        np.full((h, w, 3), a, dtype=np.uint8),
-        np.full((h, w, 3), b, dtype=np.uint8),
-        np.full((h, w, 3), c, dtype=np.uint8),
-        np.full((h, w, 3), d, dtype=np.uint8),
-    )
+    return tuple(channel_constant(w, h, tuple(int(v) for v in x)) for x in (color, a, b, c, d))
 
 # =============================================================================
 
@@ -1588,7 +2588,9 @@ def polar2cart(r, theta) -> tuple:
 # =============================================================================
 
 def coord_sphere(width: int, height: int, radius: float) -> tuple[TYPE_IMAGE, TYPE_IMAGE]:
-    theta, phi = np.meshgrid(np.linspace(0, TAU, width), np.linspace(0, np.pi, height))
+    # theta runs along the rows and phi down the columns, so the trig is only
+    # taken once per row and column and the grid is their outer product
+    theta, phi = np.linspace(0, TAU, width), np.linspace(0, np.pi, height)[:, None]
     x = radius * np.sin(phi) * np.cos(theta)
     y = radius * np.sin(phi) * np.sin(theta)
     # z = radius * np.cos(phi)
@@ -1610,6 +2612,22 @@ def coord_polar(data, origin=None) -> tuple:
     y -= origin_y
     return x, y
 
+def coord_polar_grid(width: int, height: int, origin:tuple[int, int]=None) -> tuple[TYPE_IMAGE, TYPE_IMAGE]:
+    """Source x & y of a polar re-projection about origin (default the center).
+
+    The result is (width, height): radius runs down the rows, angle along the
+    columns, each spanning the range found in the source frame.
+    """
+    if origin is None:
+        origin = (width // 2, height // 2)
+    x, y = coord_polar(np.broadcast_to(0, (height, width)), origin=origin)
+    r, theta = cart2polar(x, y)
+    r_i = np.linspace(r.min(), r.max(), width)
+    theta_i = np.linspace(theta.min(), theta.max(), height)
+    theta_grid, r_grid = np.meshgrid(theta_i, r_i)
+    xi, yi = polar2cart(r_grid, theta_grid)
+    return (xi + origin[0]).astype(np.float32), (yi + origin[1]).astype(np.float32)
+
 def coord_perspective(width: int, height: int, pts: list[TYPE_COORD]) -> TYPE_IMAGE:
     object_pts = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
     pts = np.float32(pts)
@@ -1617,7 +2635,7 @@ def coord_perspective(width: int, height: int, pts: list[TYPE_COORD]) -> TYPE_IM
     return cv2.getPerspectiveTransform(object_pts, pts)
 
 def coord_fisheye(width: int, height: int, distortion: float) -> tuple[TYPE_IMAGE, TYPE_IMAGE]:
-    map_x, map_y = np.meshgrid(np.linspace(0., 1., width), np.linspace(0., 1., height))
+    map_x, map_y = np.linspace(0., 1., width), np.linspace(0., 1., height)[:, None]
     # normalized
     xnd, ynd = (2 * map_x - 1), (2 * map_y - 1)
     rd = np.sqrt(xnd**2 + ynd**2)
@@ -1627,72 +2645,61 @@ def coord_fisheye(width: int, height: int, distortion: float) -> tuple[TYPE_IMAG
     xu, yu = ((xdu + 1) * width) / 2, ((ydu + 1) * height) / 2
     return xu.astype(np.float32), yu.astype(np.float32)
 
-def remap_sphere(image: TYPE_IMAGE, radius: float) -> TYPE_IMAGE:
-    height, width = image.shape[:2]
-    map_x, map_y = coord_sphere(width, height, radius)
-    return cv2.remap(image, map_x, map_y, interpolation=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+# =============================================================================
+# === REMAP ===
+# =============================================================================
 
-def remap_polar(image: TYPE_IMAGE) -> TYPE_IMAGE:
-    height, width = image.shape[:2]
-    map_x, map_y = coord_polar(width, height)
-    map_x = map_x * width
-    map_y = map_y * height
-    return cv2.remap(image, map_x, map_y, interpolation=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+# remap tables kept between frames, in bytes (8 per pixel)
+REMAP_CACHE = ResultCache(256 * 1024 ** 2)
 
-def remap_polar(image: TYPE_IMAGE, origin:tuple[int, int]=None) -> TYPE_IMAGE:
-    """Re-projects a 3D numpy array ("data") into a polar coordinate system.
-    "origin" is a tuple of (x0, y0) and defaults to the center of the image."""
-    cc, nx, ny = channel_count(image)[:3]
-    if cc == 1:
-        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+def remap_maps(coord: Callable, width: int, height: int, *param) -> tuple[np.ndarray, np.ndarray]:
+    """float32 cv2.remap tables of a coord_* projection, cached on its size and parameters.
 
-    if origin is None:
-        origin = (nx // 2, ny // 2)
-
-    # Determine that the min and max r and theta coords will be...
-    x, y = coord_polar(image, origin=origin)
-    r, theta = cart2polar(x, y)
+    A repeat projection costs only the remap itself. The maps stay float:
+    cv2.convertMaps fixed point tables measured slower here and lose precision.
+    """
+    key = (coord, width, height, cache_key(param))
+    if (maps := REMAP_CACHE.get(key)) is None:
+        maps = coord(width, height, *param)
+        for m in maps:
+            m.flags.writeable = False
+        REMAP_CACHE.put(key, maps)
+    return maps
+
+def remap_apply(image: TYPE_IMAGE, maps: tuple[np.ndarray, np.ndarray]) -> TYPE_IMAGE:
+    """One cv2.remap over every channel of a frame, or of each frame of a batch.
+
+    The result takes the size of the maps; single channel frames come back (H,W).
+    """
+    if image.ndim == 4:
+        return np.stack([remap_apply(frame, maps) for frame in image])
+    mx, my = maps
+    if tile_wanted(mx):
+        # every output tile reads what it needs straight from the whole source
+        def tile(x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+            return cv2.remap(image, mx[y0:y1, x0:x1], my[y0:y1, x0:x1],
+                             interpolation=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+        return tile_run(tile, mx.shape[1], mx.shape[0])
+    return cv2.remap(image, mx, my, interpolation=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
 
-    # Make a regular (in polar space) grid based on the min and max r & theta
-    r_i = np.linspace(r.min(), r.max(), nx)
-    theta_i = np.linspace(theta.min(), theta.max(), ny)
-    theta_grid, r_grid = np.meshgrid(theta_i, r_i)
+def remap_sphere(image: TYPE_IMAGE, radius: float) -> TYPE_IMAGE:
+    height, width = image.shape[-3:-1] if image.ndim == 4 else image.shape[:2]
+    return remap_apply(image, remap_maps(coord_sphere, width, height, radius))
 
-    # Project the r and theta grid back into pixel coordinates
-    xi, yi = polar2cart(r_grid, theta_grid)
-    xi += origin[0]
-    yi += origin[1]
-    xi, yi = xi.flatten(), yi.flatten()
-    coords = np.vstack((xi, yi))
-    bands = []
-    for band in image.T:
-        zi = sp.ndimage.map_coordinates(band, coords, order=1)
-        bands.append(zi.reshape((nx, ny)))
-
-    image = np.dstack(bands)
-    if cc == 1:
-        image = image[:,:,0][:,:]
-    return image
+def remap_polar(image: TYPE_IMAGE, origin:tuple[int, int]=None) -> TYPE_IMAGE:
+    """Re-projects a 3D numpy array ("data") into a polar coordinate system.
+    "origin" is a tuple of (x0, y0) and defaults to the center of the image."""
+    height, width = image.shape[-3:-1] if image.ndim == 4 else image.shape[:2]
+    return remap_apply(image, remap_maps(coord_polar_grid, width, height, origin))
 
 def remap_perspective(image: TYPE_IMAGE, pts: list) -> TYPE_IMAGE:
-    cc, width, height = channel_count(image)[:3]
-    if cc == 1:
-        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    width, height = channel_count(image)[1:3]
     pts = coord_perspective(width, height, pts)
-    image = cv2.warpPerspective(image, pts, (width, height))
-    if cc == 1:
-        image = image[:,:,0][:,:]
-    return image
+    return cv2.warpPerspective(image, pts, (width, height))
 
 def remap_fisheye(image: TYPE_IMAGE, distort: float) -> TYPE_IMAGE:
-    cc, width, height = channel_count(image)[:3]
-    if cc == 1:
-        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
-    map_x, map_y = coord_fisheye(width, height, distort)
-    image = cv2.remap(image, map_x, map_y, interpolation=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
-    if cc == 1:
-        image = image[:,:,0][:,:]
-    return image
+    height, width = image.shape[-3:-1] if image.ndim == 4 else image.shape[:2]
+    return remap_apply(image, remap_maps(coord_fisheye, width, height, distort))
 
 def remap_orthographic(image: TYPE_IMAGE, tile2: int=512, p0: float=0., l0: float=0.) -> TYPE_IMAGE:
     """
@@ -1728,4 +2735,143 @@ def remap_orthographic(image: TYPE_IMAGE, tile2: int=512, p0: float=0., l0: floa
     coords[2,:maskLen] = sqrtM1MuStar2 * np.cos(alphaStar)
     pmap = np.full( (2 * tile2, 2 * tile2), -np.inf, dtype='float32')
     pmap[valids[:,0], valids[:,1]] = image[coords[:,2], coords[:, 1]][:maskLen]
-    return pmap
\ No newline at end of file
+    return pmap
+# =============================================================================
+# === TESTING ===
+# =============================================================================
+
+if __name__ == "__main__":
+    import time
+    import tracemalloc
+
+    # the conversion layer before the zero-copy rewrite, kept as a reference
+
+    def legacy_tensor2cv(tensor: torch.Tensor) -> TYPE_IMAGE:
+        image = np.clip(tensor.squeeze().cpu().numpy() * 255, 0, 255).astype(np.uint8)
+        return cv2.cvtColor(image, cv2.COLOR_RGBA2BGRA)
+
+    def legacy_cv2tensor(image: TYPE_IMAGE) -> torch.Tensor:
+        cc = 1 if len(image.shape) < 3 else image.shape[2]
+        if cc == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        elif cc == 4:
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2RGBA)
+        elif len(image.shape) > 2:
+            image = image.squeeze()
+        return torch.from_numpy(image.astype(np.float32) / 255).unsqueeze(0)
+
+    def legacy_cv2tensor_full(image: TYPE_IMAGE, matte:TYPE_PIXEL=0) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        mask = image_mask(image)
+        image = image_matte(image, matte)
+        rgb = image_convert(image, 3)
+        return legacy_cv2tensor(image), legacy_cv2tensor(rgb), legacy_cv2tensor(mask)
+
+    def realize(func, *arg) -> Any:
+        """Call func and build any lazy tensors it returns, so every row does the full conversion."""
+        result = func(*arg)
+        for x in (result if isinstance(result, tuple) else (result,)):
+            if isinstance(x, torch.Tensor):
+                x.contiguous()
+        return result
+
+    def profile(func, *arg, count:int=5) -> tuple[float, float]:
+        """Per call: milliseconds and peak transient memory in bytes."""
+        realize(func, *arg)
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        peak = 0
+        for _ in range(count):
+            tracemalloc.reset_peak()
+            realize(func, *arg)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+        tracemalloc.stop()
+        start = time.perf_counter()
+        for _ in range(count):
+            realize(func, *arg)
+        return (time.perf_counter() - start) * 1000 / count, peak
+
+    for width, height in [(512, 512), (3840, 2160)]:
+        frame = width * height * 4
+        image = (np.random.rand(height, width, 4) * 255).astype(np.uint8)
+        opaque = image.copy()
+        opaque[:,:,3] = 255
+        tensor = legacy_cv2tensor(image)
+        tests = {
+            "tensor2cv": (legacy_tensor2cv, tensor2cv, tensor),
+            "cv2tensor": (legacy_cv2tensor, cv2tensor, image),
+            "cv2tensor_full (alpha)": (legacy_cv2tensor_full, cv2tensor_full, image),
+            "cv2tensor_full (opaque)": (legacy_cv2tensor_full, cv2tensor_full, opaque),
+        }
+        # peak memory is reported in uint8 BGRA frames of the test size
+        print(f"{width}x{height}")
+        for name, (old, new, arg) in tests.items():
+            old_ms, old_peak = profile(old, arg)
+            new_ms, new_peak = profile(new, arg)
+            print(f"{name:>24}: {old_ms:8.2f}ms {old_peak / frame:5.1f} frames -> {new_ms:8.2f}ms {new_peak / frame:5.1f} frames")
+
+    # peak transient memory budgets of the pixel kernels, in uint8 BGRA
+    # frames of the test size; a kernel over its budget fails the run
+    width, height = 1920, 1080
+    frame = width * height * 4
+    image = (np.random.rand(height, width, 4) * 255).astype(np.uint8)
+    other = (np.random.rand(height, width, 4) * 255).astype(np.uint8)
+    mask = (np.random.rand(height, width) * 255).astype(np.uint8)
+    budgets = {
+        "image_sharpen": (2.5, image_sharpen, image, 5, 1., 1.5),
+        "image_sharpen (threshold)": (4.5, image_sharpen, image, 5, 1., 1.5, 8),
+        "image_matte": (4.5, image_matte, image, (40, 80, 120, 255)),
+        "image_matte (padded)": (5.5, image_matte, image, (40, 80, 120, 255), width + 64, height + 64),
+        "image_filter": (1.5, image_filter, image, [.9, .1, 0, .1, .8, .1, 0, .2, .8]),
+        "image_grayscale": (0.5, image_grayscale, image),
+        "image_lerp": (1.5, image_lerp, image, other, None, .3),
+        "image_lerp (mask)": (3.5, image_lerp, image, other, mask, .7),
+    }
+    print(f"{width}x{height} kernel budgets")
+    over = []
+    for name, (budget, func, *arg) in budgets.items():
+        ms, peak = profile(func, *arg)
+        flag = "" if peak <= budget * frame else "  OVER BUDGET"
+        print(f"{name:>26}: {ms:8.2f}ms {peak / frame:5.2f} of {budget:4.1f} frames{flag}")
+        if flag:
+            over.append(name)
+
+    # premultiplied compositing has to agree with straight alpha for every
+    # blend mode, including layers over transparent canvas and masked layers
+    lower = (np.random.rand(40, 50, 4) * 255).astype(np.uint8)
+    lower[::4, :, 3] = 0
+    upper = (np.random.rand(60, 70, 4) * 255).astype(np.uint8)
+    upper[::3, ::2, 3] = 0
+    mask = (np.random.rand(60, 70) * 255).astype(np.uint8)
+    apart = []
+    for op in BlendType:
+        for layer_mask in (None, mask):
+            layers = [(lower, None, BlendType.NORMAL, 1., (0, 0)), (upper, layer_mask, op, 0.6, (0.1, 0))]
+            straight = image_composite(layers, 80, 60).astype(np.int16)
+            premult = image_composite(layers, 80, 60, premultiply=True).astype(np.int16)
+            # color under zero alpha is not kept by premultiplied canvases
+            seen = straight[..., 3] > 0
+            if np.abs(straight - premult)[seen].max() > 1:
+                apart.append(op.name)
+    print(f"premultiplied composite: {len(set(apart))} of {len(BlendType)} blend modes disagree")
+
+    # the color blind matrices have to stay within a code of daltonlens
+    frame = (np.random.rand(60, 80, 3) * 255).astype(np.uint8)
+    drift = []
+    for deficiency in EnumCBDefiency:
+        for simulator in EnumCBSimulator:
+            for severity in (0.8, 1.):
+                quick = image_color_blind(frame, deficiency, simulator, severity).astype(np.int16)
+                exact = color_blind_simulate(frame, deficiency, simulator, severity).astype(np.int16)
+                if np.abs(quick - exact).max() > 1:
+                    drift.append(f"{deficiency.name} {simulator.name} {severity}")
+    print(f"color blind simulation: {len(drift)} settings drift from daltonlens")
+
+    failed = []
+    if over:
+        failed.append(f"peak allocation over budget: {', '.join(over)}")
+    if apart:
+        failed.append(f"premultiplied composite disagrees: {', '.join(sorted(set(apart)))}")
+    if drift:
+        failed.append(f"color blind simulation drifts: {', '.join(drift)}")
+    if failed:
+        raise SystemExit("; ".join(failed))
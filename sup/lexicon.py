@@ -33,6 +33,7 @@ class LexiconMeta(type):
 
 class Lexicon(metaclass=LexiconMeta):
     A = '⬜', "Alpha"
+    ACCUMULATE = 'ACCUMULATE', "Running total over the frames of a sequence"
     ADAPT = '🧬', "X-Men"
     ALIGN = 'ALIGN', "Top, Center or Bottom alignment"
     AMP = '🔊', "Amplitude"
@@ -79,6 +80,7 @@ class Lexicon(metaclass=LexiconMeta):
     EDGE = 'EDGE', "Clip or Wrap the Canvas Edge"
     END = 'END', "End"
     FALSE = '🇫', "False"
+    FAST = 'FAST', "Measure at a reduced size, much quicker on large frames and close to the full score"
     FILEN = '💾', "File Name"
     FILTER = '🔎', "Filter"
     FIXED = 'FIXED', "Fixed"
@@ -110,6 +112,7 @@ class Lexicon(metaclass=LexiconMeta):
     IO = '📋', "File I/O"
     JUSTIFY = 'JUSTIFY', "How to align the text to the side margins of the canvas: Left, Right, or Centered"
     KEY = '🔑', "Key"
+    LAYER = '🧅', "Layer to composite: image with its own blend mode, opacity, mask and offset"
     LEFT = '◀️', "Left"
     LETTER = 'LETTER', "If each letter be generated and output in a batch"
     LINEAR = '🛟', "Linear"
@@ -148,6 +151,7 @@ class Lexicon(metaclass=LexiconMeta):
     PIXEL_A = '👾A', "Pixel Data (RGBA, RGB or Grayscale)"
     PIXEL_B = '👾B', "Pixel Data (RGBA, RGB or Grayscale)"
     PREFIX = 'PREFIX', "Prefix"
+    PREMULTIPLY = 'PREMULT', "Accumulate the layers in premultiplied alpha"
     PRESET = 'PRESET', "Preset"
     PROJECTION = 'PROJ', "Projection"
     QUALITY = 'QUALITY', "Quality"
@@ -169,13 +173,16 @@ class Lexicon(metaclass=LexiconMeta):
     S = '🇸', "Saturation"
     SAMPLE = '🎞️', "Sampling Method to apply when Rescaling"
     SCHEME = 'SCHEME', "Scheme"
+    SCORE = 'SCORE', "Only measure the similarity score and skip the difference map and highlights"
     SEED = 'SEED', "Seed"
     SELECT = 'SELECT', "Select"
     SHAPE = '🇸🇴', "Circle, Square or Polygonal forms"
+    SHARED = 'SHARED', "Fit one palette over the whole sequence so colors hold steady between frames"
     SHIFT = 'SHIFT', "Shift"
     SIDES = '♾️', "Number of sides polygon has (3-100)"
     SIMULATOR = 'SIMULATOR', "The solver to use when translating color space"
     SIZE = '📏', "Scale"
+    SMOOTH = 'SMOOTH', "Carry this much of the running source statistics into each frame to stop flicker"
     SOURCE = 'SRC', "Source"
     SPACING = 'SPACING', "Line Spacing between Text Lines"
     START = 'START', "Start"
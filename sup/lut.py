@@ -0,0 +1,169 @@
+"""
+Jovimetrix - http://www.github.com/amorano/jovimetrix
+Fused color operations through 3D lookup tables
+"""
+
+from pathlib import Path
+from typing import Any, Callable
+
+import cv2
+import numpy as np
+
+from Jovimetrix import TYPE_IMAGE
+from Jovimetrix.sup.cache import cache_key, prepare
+
+# =============================================================================
+
+# lattice points per axis; 51 steps of 5 put every point on a whole uint8 code
+LUT_SIZE = 52
+
+# =============================================================================
+# === LUT ===
+# =============================================================================
+
+@prepare
+def lut_lattice(size: int=LUT_SIZE) -> TYPE_IMAGE:
+    """Every lattice color as one (size*size, size) BGR frame, laid out [b][g][r]."""
+    v = np.rint(np.linspace(0, 255, size)).astype(np.uint8)
+    b, g, r = np.meshgrid(v, v, v, indexing='ij')
+    return np.stack([b, g, r], axis=-1).reshape(size * size, size, 3)
+
+@prepare
+def lut_bake(steps: tuple[tuple[Callable, ...], ...], size: int=LUT_SIZE) -> np.ndarray:
+    """Run each (func, *arg) step over the lattice into a (size, size, size, 3) BGR LUT.
+
+    Steps take and return uint8 BGR(A) frames and must be pure per-pixel maps.
+    """
+    image = lut_lattice(size)
+    for func, *arg in steps:
+        image = func(image, *arg)
+        if image.ndim > 2 and image.shape[2] == 4:
+            image = image[..., :3]
+    return np.ascontiguousarray(image).reshape(size, size, size, 3)
+
+@prepare
+def lut_tables(size: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Per uint8 code: lattice position, blue slice offset and the two blue weights."""
+    pos = np.arange(256, dtype=np.float32) * np.float32((size - 1) / 255)
+    z = np.minimum(np.floor(pos), size - 2)
+    weight = (pos - z).astype(np.float32)
+    return (pos.reshape(256, 1), (z * size).astype(np.float32).reshape(256, 1),
+            (1 - weight).reshape(256, 1), weight.reshape(256, 1))
+
+def lut_apply(image: TYPE_IMAGE, lut: np.ndarray) -> TYPE_IMAGE:
+    """Map the colors of a BGR(A) frame or (N,H,W,C) batch through a 3D LUT.
+
+    The LUT is (size, size, size, 3) uint8 BGR indexed [b][g][r]. Red and green
+    interpolate inside one cv2.remap over the LUT laid out as a strip of blue
+    slices; blue blends the two neighbouring slices. Alpha passes through.
+    """
+    if image.ndim == 4:
+        return np.stack([lut_apply(frame, lut) for frame in image])
+
+    size = lut.shape[0]
+    pos, offset, w_lo, w_hi = lut_tables(size)
+    # atlas[g][b * size + r]
+    atlas = np.ascontiguousarray(lut.transpose(1, 0, 2, 3).reshape(size, size * size, 3))
+    cc = 1 if image.ndim < 3 else image.shape[2]
+    if cc == 1:
+        b = g = r = image.reshape(image.shape[:2])
+    else:
+        b, g, r = cv2.split(image)[:3]
+    map_x = cv2.LUT(r, pos)
+    map_x += cv2.LUT(b, offset)
+    map_y = cv2.LUT(g, pos)
+    lo = cv2.remap(atlas, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    map_x += size
+    hi = cv2.remap(atlas, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    out = cv2.blendLinear(lo, hi, cv2.LUT(b, w_lo), cv2.LUT(b, w_hi))
+    if cc == 4:
+        out = np.concatenate([out, image[:,:,3:]], axis=-1)
+    return out
+
+def lut_load_cube(path: str|Path) -> np.ndarray:
+    """Read a 3D .cube file into a uint8 BGR LUT."""
+    size = 0
+    domain = (np.zeros(3), np.ones(3))
+    rows = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            key, *value = line.split()
+            if key == 'LUT_3D_SIZE':
+                size = int(value[0])
+            elif key == 'DOMAIN_MIN':
+                domain = (np.array(value, dtype=np.float32), domain[1])
+            elif key == 'DOMAIN_MAX':
+                domain = (domain[0], np.array(value, dtype=np.float32))
+            elif key[0].isdigit() or key[0] in '-.':
+                rows.append([float(key)] + [float(x) for x in value])
+
+    if size < 2 or len(rows) != size ** 3:
+        raise ValueError(f"not a 3D cube LUT: {path}")
+    # red runs fastest, so the rows fall out [b][g][r]; values are RGB
+    lut = (np.array(rows, dtype=np.float32) - domain[0]) / (domain[1] - domain[0])
+    lut = np.clip(np.rint(lut[:, ::-1] * 255), 0, 255).astype(np.uint8)
+    return lut.reshape(size, size, size, 3)
+
+def lut_save_cube(path: str|Path, lut: np.ndarray, title: str="Jovimetrix") -> None:
+    """Write a uint8 BGR LUT as a 3D .cube file."""
+    size = lut.shape[0]
+    data = lut.reshape(-1, 3)[:, ::-1] / 255.
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f'TITLE "{title}"\nLUT_3D_SIZE {size}\n')
+        f.writelines(f"{r:.6f} {g:.6f} {b:.6f}\n" for r, g, b in data)
+
+# =============================================================================
+# === PIPELINE ===
+# =============================================================================
+
+class ColorPipeline:
+    """A chain of per-pixel color operations run as one 3D LUT pass.
+
+    Steps are recorded with add and baked together over the lattice, once per
+    unique chain, so a frame pays for one lookup however many steps there are.
+    Only operations that map each color on its own belong here; anything that
+    reads the frame (a mean, a histogram) has to run outside.
+    """
+    def __init__(self, size: int=LUT_SIZE) -> None:
+        self.__size = size
+        self.__steps = []
+
+    def __len__(self) -> int:
+        return len(self.__steps)
+
+    def add(self, func: Callable, *arg) -> 'ColorPipeline':
+        self.__steps.append((func, *arg))
+        return self
+
+    @property
+    def key(self) -> Any:
+        return cache_key((self.__size, self.__steps))
+
+    def bake(self) -> np.ndarray:
+        return lut_bake(tuple(self.__steps), self.__size)
+
+    def apply(self, image: TYPE_IMAGE) -> TYPE_IMAGE:
+        if len(self.__steps) == 0:
+            return image
+        return lut_apply(image, self.bake())
+
+    def save(self, path: str|Path, title: str="Jovimetrix") -> None:
+        lut_save_cube(path, self.bake(), title)
+
+def pipeline_apply(stack: TYPE_IMAGE, pipelines: list[ColorPipeline]) -> TYPE_IMAGE:
+    """Apply one pipeline per frame of an (N,H,W,C) stack; equal chains share a pass."""
+    groups = {}
+    for idx, pipe in enumerate(pipelines):
+        groups.setdefault(pipe.key, (pipe, []))[1].append(idx)
+    if len(groups) == 1:
+        return pipelines[0].apply(stack)
+    out = None
+    for pipe, idx in groups.values():
+        result = pipe.apply(stack[idx])
+        if out is None:
+            out = np.empty((len(stack),) + result.shape[1:], dtype=result.dtype)
+        out[idx] = result
+    return out
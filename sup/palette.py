@@ -0,0 +1,146 @@
+"""
+Jovimetrix - http://www.github.com/amorano/jovimetrix
+Color palettes and nearest palette color assignment
+"""
+
+from enum import Enum
+
+import cv2
+import numpy as np
+
+from Jovimetrix import TYPE_IMAGE
+from Jovimetrix.sup.cache import prepare
+
+# =============================================================================
+
+# pixels a palette is fit on, however large the source
+PALETTE_SAMPLE = 65536
+
+# bits per axis of the nearest color grid; 6 is 64 cells of 4 codes each
+PALETTE_BITS = 6
+
+class EnumPaletteMethod(Enum):
+    KMEANS = 0
+    MEDIAN_CUT = 10
+
+# =============================================================================
+# === PALETTE ===
+# =============================================================================
+
+def palette_pixels(image: TYPE_IMAGE|list[TYPE_IMAGE], count: int=PALETTE_SAMPLE) -> np.ndarray:
+    """An (N,3) uint8 BGR sample of at most count pixels over a frame, batch or list of frames.
+
+    The sample is drawn with a fixed seed so the same source always fits
+    the same palette.
+    """
+    if isinstance(image, np.ndarray) and image.ndim < 4:
+        image = [image]
+    pixels = []
+    for frame in image:
+        if frame.ndim < 3 or frame.shape[-1] == 1:
+            pixels.append(np.repeat(frame.reshape(-1, 1), 3, axis=-1))
+        else:
+            pixels.append(frame[..., :3].reshape(-1, 3))
+    total = sum(len(p) for p in pixels)
+    rng = np.random.default_rng(0)
+    sample = []
+    for p in pixels:
+        take = len(p) * count // total if total > count else len(p)
+        sample.append(p if take == len(p) else p[rng.integers(0, len(p), take)])
+    return np.concatenate(sample)
+
+def palette_median_cut(pixels: np.ndarray, count: int) -> tuple[np.ndarray, np.ndarray]:
+    """Split the widest box at its median until there are count boxes.
+
+    Returns the (K,3) uint8 box means and the box label of every pixel.
+    """
+    boxes = [np.arange(len(pixels))]
+    spans = [np.ptp(pixels, axis=0)]
+    while len(boxes) < count:
+        widest = [s.max() for s in spans]
+        idx = int(np.argmax(widest))
+        if widest[idx] == 0:
+            break
+        box = boxes.pop(idx)
+        axis = int(np.argmax(spans.pop(idx)))
+        half = len(box) // 2
+        order = np.argpartition(pixels[box, axis], half)
+        for part in (box[order[:half]], box[order[half:]]):
+            boxes.append(part)
+            spans.append(np.ptp(pixels[part], axis=0))
+
+    labels = np.empty(len(pixels), dtype=np.int32)
+    palette = np.empty((len(boxes), 3), dtype=np.float32)
+    for idx, box in enumerate(boxes):
+        labels[box] = idx
+        palette[idx] = pixels[box].mean(axis=0)
+    return np.clip(np.rint(palette), 0, 255).astype(np.uint8), labels
+
+@prepare
+def palette_build(image: TYPE_IMAGE|list[TYPE_IMAGE], count: int=256,
+                  method: EnumPaletteMethod=EnumPaletteMethod.KMEANS,
+                  iterations: int=10, epsilon: float=0.2) -> np.ndarray:
+    """Fit a (K,3) uint8 BGR palette of at most count colors to a frame or sequence.
+
+    Pass a batch or a list of frames for one palette shared by the whole
+    sequence. The fit runs on a pixel sample and is cached on the content
+    of the source, so a map reused across a batch is fit once. KMEANS
+    refines the median cut boxes instead of starting from random centers.
+    """
+    count = int(max(1, min(256, count)))
+    pixels = palette_pixels(image)
+    palette, labels = palette_median_cut(pixels, count)
+    if method == EnumPaletteMethod.MEDIAN_CUT or len(palette) < 2:
+        return palette
+
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, iterations, epsilon)
+    _, _, centers = cv2.kmeans(pixels.astype(np.float32), len(palette), labels.reshape(-1, 1),
+                               criteria, 1, cv2.KMEANS_USE_INITIAL_LABELS)
+    return np.clip(np.rint(centers), 0, 255).astype(np.uint8)
+
+@prepare
+def palette_grid(palette: np.ndarray, bits: int=PALETTE_BITS) -> np.ndarray:
+    """Nearest palette color for the center of every cell of a (2**bits)**3 BGR grid.
+
+    Cells are laid out [b][g][r]; each color is packed BGRx into one uint32
+    so the lookup is a single gather.
+    """
+    size = 1 << bits
+    step = 256 // size
+    v = np.arange(size, dtype=np.float32) * step + (step - 1) * .5
+    b, g, r = np.meshgrid(v, v, v, indexing='ij')
+    cells = np.stack([b.ravel(), g.ravel(), r.ravel()], axis=-1)
+    color = palette.astype(np.float32)
+    norm = (color * color).sum(axis=1)
+    index = np.empty(len(cells), dtype=np.intp)
+    # |c - p|^2 less the |c|^2 every palette entry shares
+    for start in range(0, len(cells), 16384):
+        chunk = cells[start:start+16384]
+        index[start:start+16384] = np.argmin(norm - 2 * chunk @ color.T, axis=1)
+    grid = np.zeros((len(cells), 4), dtype=np.uint8)
+    grid[:, :3] = palette[index]
+    return grid.view(np.uint32).ravel()
+
+def palette_apply(image: TYPE_IMAGE, palette: np.ndarray, bits: int=PALETTE_BITS) -> TYPE_IMAGE:
+    """Swap every pixel of a BGR(A) frame or (N,H,W,C) batch for its nearest palette color.
+
+    Nearest is looked up in the cached grid, one gather per pixel; alpha
+    passes through.
+    """
+    grid = palette_grid(palette, bits)
+    shift = 8 - bits
+    key = (image[..., 0] >> shift).astype(np.int32) << (2 * bits)
+    key |= (image[..., 1] >> shift).astype(np.int32) << bits
+    key |= image[..., 2] >> shift
+    out = np.take(grid, key).view(np.uint8).reshape(image.shape[:-1] + (4,))
+    if image.shape[-1] == 4:
+        out[..., 3] = image[..., 3]
+        return out
+    return np.ascontiguousarray(out[..., :3])
+
+def palette_colormap(palette: np.ndarray) -> np.ndarray:
+    """A (256,1,3) cv2 colormap that runs through the palette from dark to light."""
+    luma = palette.astype(np.float32) @ np.float32([0.114, 0.587, 0.299])
+    palette = palette[np.argsort(luma, kind='stable')]
+    index = np.arange(256) * len(palette) // 256
+    return np.ascontiguousarray(palette[index].reshape(256, 1, 3))
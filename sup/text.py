@@ -12,6 +12,7 @@ from PIL import Image, ImageFont, ImageDraw
 from loguru import logger
 
 from Jovimetrix import TYPE_IMAGE, TYPE_PIXEL
+from Jovimetrix.sup.cache import prepare
 from Jovimetrix.sup.image import pil2cv
 
 # =============================================================================
@@ -135,6 +136,12 @@ def wrap_text_and_calculate_height(self, text, font, max_width, line_height):
     return wrapped_text, total_height
 """
 
+@prepare
+def text_font(font: str, font_size: int) -> ImageFont.FreeTypeFont:
+    """Load a font face once per name and size."""
+    return ImageFont.truetype(font, font_size)
+
+@prepare
 def text_autosize(text:str, font:str, width:int, height:int, columns:int=0) -> tuple[str, int, int, int]:
     img = Image.new("L", (width, height))
     draw = ImageDraw.Draw(img)
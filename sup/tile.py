@@ -0,0 +1,121 @@
+"""
+Jovimetrix - http://www.github.com/amorano/jovimetrix
+Tiled execution of neighbourhood operations over very large frames
+"""
+
+import os
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from Jovimetrix import JOV_WORKERS, TYPE_IMAGE, JOVBatchPool
+
+# =============================================================================
+
+# pixels per side of a tile, before its halo
+JOV_TILE_SIZE = 1024
+try: JOV_TILE_SIZE = int(os.getenv("JOV_TILE_SIZE", JOV_TILE_SIZE))
+except: pass
+JOV_TILE_SIZE = max(64, JOV_TILE_SIZE)
+
+# frames under this many tiles run whole; 0 tiles everything
+TILE_MIN = 4
+
+# =============================================================================
+# === TILE ===
+# =============================================================================
+
+def tile_edges(length: int, size: int=JOV_TILE_SIZE) -> list[int]:
+    """Tile starts along one axis plus the end; a sliver under a quarter tile joins its neighbour."""
+    edges = list(range(0, length, size))
+    if len(edges) > 1 and length - edges[-1] < size // 4:
+        edges.pop()
+    return edges + [length]
+
+def tile_grid(width: int, height: int, size: int=JOV_TILE_SIZE) -> list[tuple[int, int, int, int]]:
+    """(x0, y0, x1, y1) of each tile that covers the frame, row by row."""
+    xs, ys = tile_edges(width, size), tile_edges(height, size)
+    return [(x0, y0, x1, y1) for y0, y1 in zip(ys, ys[1:]) for x0, x1 in zip(xs, xs[1:])]
+
+def tile_wanted(image: TYPE_IMAGE, size: int=JOV_TILE_SIZE) -> bool:
+    """True when a frame is large enough to be worth splitting, or lives on disk."""
+    if isinstance(image, np.memmap):
+        return True
+    h, w = image.shape[:2]
+    return w * h > TILE_MIN * size * size
+
+def tile_run(func: Callable, width: int, height: int, out: Optional[np.ndarray]=None,
+             size: int=JOV_TILE_SIZE) -> np.ndarray:
+    """Fill an output frame tile by tile from func(x0, y0, x1, y1) on the shared pool.
+
+    func returns the finished pixels of its tile. Tiles are written straight
+    into out, allocated from the first tile when not given, so only a few
+    tiles are alive at once and out may be a memmap. Inside a pool task the
+    tiles run inline instead of queueing behind the task itself.
+    """
+    grid = tile_grid(width, height, size)
+
+    def put(box: tuple[int, int, int, int], tile: np.ndarray) -> None:
+        nonlocal out
+        if out is None:
+            out = np.empty((height, width) + tile.shape[2:], dtype=tile.dtype)
+        x0, y0, x1, y1 = box
+        out[y0:y1, x0:x1] = tile.reshape(out[y0:y1, x0:x1].shape)
+
+    workers = min(JOV_WORKERS, len(grid))
+    if workers < 2 or JOVBatchPool.worker():
+        for box in grid:
+            put(box, func(*box))
+    else:
+        # one cv2 thread per tile; the tiles are the parallelism
+        JOVBatchPool.enter(1)
+        pool = JOVBatchPool.pool()
+        pending = deque()
+        try:
+            for box in grid:
+                pending.append((box, pool.submit(JOVBatchPool.call, func, box)))
+                if len(pending) >= workers * 2:
+                    box, future = pending.popleft()
+                    put(box, future.result())
+            while len(pending):
+                box, future = pending.popleft()
+                put(box, future.result())
+        finally:
+            for _, future in pending:
+                future.cancel()
+            JOVBatchPool.leave()
+
+    if isinstance(out, np.memmap):
+        out.flush()
+    return out
+
+def tile_apply(image: TYPE_IMAGE, func: Callable, halo: int, *arg, out: Optional[np.ndarray]=None,
+               size: int=JOV_TILE_SIZE, **kw) -> TYPE_IMAGE:
+    """Run a same sized neighbourhood op func(tile, *arg, **kw) over a frame in tiles.
+
+    Each tile is cut with halo extra pixels on every side, clamped to the
+    frame, and only its middle is kept. With a halo of at least the op's
+    reach the seams vanish and the result matches the whole frame run, as
+    the frame edges still see the op's own border handling.
+    """
+    height, width = image.shape[:2]
+
+    def tile(x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+        hx0, hy0 = max(0, x0 - halo), max(0, y0 - halo)
+        hx1, hy1 = min(width, x1 + halo), min(height, y1 + halo)
+        # a copy, so a memmap only reads this tile and the op gets a plain array
+        region = np.array(image[hy0:hy1, hx0:hx1])
+        result = func(region, *arg, **kw)
+        return result[y0-hy0:y1-hy0, x0-hx0:x1-hx0]
+
+    return tile_run(tile, width, height, out, size)
+
+def tile_open(path: str|Path, mode: str='r') -> np.memmap:
+    """Map an .npy frame on disk without reading it in."""
+    return np.lib.format.open_memmap(path, mode=mode)
+
+def tile_create(path: str|Path, shape: tuple[int, ...], dtype: Any=np.uint8) -> np.memmap:
+    """Make an .npy frame on disk for tile_run or tile_apply to write into."""
+    return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)